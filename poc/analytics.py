@@ -0,0 +1,188 @@
+"""Columnar progress analytics over one user's attempt history.
+
+Attempts are held in growable NumPy columns (score, the five dimension
+scores, timer, time used, words, topic code) instead of a list of dicts.
+Appending a scored attempt is O(1) amortized; the aggregates (per-topic and
+per-dimension means and trends, time used vs budget, words per second) are
+computed with vectorized group-bys and memoized until the next change, so a
+rerun costs nothing and a new attempt costs one pass over the columns.
+"""
+import numpy as np
+
+from streaming import DIMENSIONS
+
+MIN_CAPACITY = 256
+
+
+def _least_squares(groups: np.ndarray, n_groups: int, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-group (mean of y, slope of y over x), ignoring NaN y. NaN where undefined."""
+    ok = ~np.isnan(y)
+    g, x, y = groups[ok], x[ok], y[ok]
+    n = np.bincount(g, minlength=n_groups).astype(np.float64)
+    sx = np.bincount(g, weights=x, minlength=n_groups)
+    sy = np.bincount(g, weights=y, minlength=n_groups)
+    sxx = np.bincount(g, weights=x * x, minlength=n_groups)
+    sxy = np.bincount(g, weights=x * y, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sy / n
+        var = sxx - sx * sx / n
+        slope = np.where(var > 0, (sxy - sx * sy / n) / var, np.nan)
+    return mean, slope
+
+
+def _nanmean(values: np.ndarray) -> np.ndarray:
+    """Column means ignoring NaN; NaN (without numpy's empty-slice warning) for all-NaN columns."""
+    ok = ~np.isnan(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ok, values, 0).sum(axis=0) / ok.sum(axis=0)
+
+
+class ProgressAnalytics:
+    """Append-only columns for one user's attempts, oldest first, plus memoized aggregates."""
+
+    _COLUMNS = ("scores", "timer", "time_used", "words", "topic")
+
+    def __init__(self, capacity: int = MIN_CAPACITY):
+        capacity = max(capacity, 1)
+        self.n = 0
+        self.scores = np.full((capacity, len(DIMENSIONS) + 1), np.nan, dtype=np.float32)  # overall, dims
+        self.timer = np.zeros(capacity, dtype=np.int32)
+        self.time_used = np.zeros(capacity, dtype=np.int32)
+        self.words = np.zeros(capacity, dtype=np.int32)
+        self.topic = np.zeros(capacity, dtype=np.int32)
+        self.topics: list[str] = []
+        self._topic_codes: dict[str, int] = {}
+        self._rows: dict[int, int] = {}  # attempt id -> row
+        self._memo: dict = {}
+
+    def _grow(self):
+        capacity = len(self.timer) * 2
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.full((capacity, *old.shape[1:]), np.nan if old.dtype.kind == "f" else 0, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @classmethod
+    def from_entries(cls, entries) -> "ProgressAnalytics":
+        """Build from history entries (with blobs), oldest first."""
+        entries = list(entries)
+        analytics = cls(max(MIN_CAPACITY, len(entries) * 2))
+        for entry in entries:
+            analytics.append(entry)
+        return analytics
+
+    @staticmethod
+    def _score_row(entry: dict) -> list[float]:
+        full = entry.get("full_score") or {}
+        overall = full.get("overall", {}).get("score", entry.get("score"))
+        row = [np.nan if overall is None else float(overall)]
+        for dim in DIMENSIONS:
+            score = full.get(dim, {}).get("score")
+            row.append(np.nan if score is None else float(score))
+        return row
+
+    def append(self, entry: dict):
+        """Add one history entry: summary columns plus ``full_score`` and ``words`` or ``explanation``."""
+        if self.n == len(self.timer):
+            self._grow()
+        i = self.n
+        code = self._topic_codes.get(entry["topic"])
+        if code is None:
+            code = self._topic_codes[entry["topic"]] = len(self.topics)
+            self.topics.append(entry["topic"])
+        self.scores[i] = self._score_row(entry)
+        self.timer[i] = entry["timer"]
+        self.time_used[i] = entry["time_used"]
+        words = entry.get("words")
+        self.words[i] = words if words is not None else len(entry.get("explanation", "").split())
+        self.topic[i] = code
+        if entry.get("id") is not None:
+            self._rows[entry["id"]] = i
+        self.n += 1
+        self._memo.clear()
+
+    def update_score(self, attempt_id: int, full_score: dict):
+        """Apply a re-score to an attempt already in the columns."""
+        i = self._rows.get(attempt_id)
+        if i is not None:
+            self.scores[i] = self._score_row({"full_score": full_score})
+            self._memo.clear()
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def overview(self) -> dict:
+        """Overall averages and the change between the last ``10`` attempts and the 10 before."""
+        return self._cached("overview", self._overview)
+
+    def _overview(self) -> dict:
+        n = self.n
+        if not n:
+            return {"attempts": 0}
+        scores = self.scores[:n]
+        used = self.time_used[:n].astype(np.float64)
+        change = _nanmean(scores[-10:, 0]) - _nanmean(scores[-20:-10, 0]) if n > 10 else np.nan
+        means = _nanmean(scores)
+        return {
+            "attempts": n,
+            "score": float(means[0]),
+            "dimensions": {dim: float(v) for dim, v in zip(DIMENSIONS, means[1:])},
+            "recent_change": None if np.isnan(change) else float(change),
+            "time_used_ratio": float(np.mean(used / self.timer[:n])),
+            "words_per_s": float(self.words[:n].sum() / used.sum()) if used.sum() else None,
+        }
+
+    def by_topic(self) -> dict[str, list]:
+        """Per-topic columns: attempts, mean and trend (points per attempt) of the overall score
+        and each dimension, time used vs budget, and words per second."""
+        return self._cached("by_topic", self._by_topic)
+
+    def _by_topic(self) -> dict[str, list]:
+        n, k = self.n, len(self.topics)
+        codes = self.topic[:n]
+        # Position of each attempt within its topic, so trends are per attempt at that topic
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        ordinal = np.empty(n, dtype=np.float64)
+        ordinal[order] = np.arange(n) - np.searchsorted(sorted_codes, sorted_codes, side="left")
+        columns = {"topic": list(self.topics), "attempts": np.bincount(codes, minlength=k).tolist()}
+        for j, name in enumerate(["score", *DIMENSIONS]):
+            mean, slope = _least_squares(codes, k, ordinal, self.scores[:n, j].astype(np.float64))
+            columns[name] = np.round(mean, 2).tolist()
+            columns[f"{name}_trend"] = np.round(slope, 3).tolist()
+        used = np.bincount(codes, weights=self.time_used[:n], minlength=k)
+        budget = np.bincount(codes, weights=self.timer[:n], minlength=k)
+        words = np.bincount(codes, weights=self.words[:n], minlength=k)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns["time_used_ratio"] = np.round(used / budget, 2).tolist()
+            columns["words_per_s"] = np.round(np.where(used > 0, words / used, np.nan), 2).tolist()
+        return columns
+
+    def trend(self, window: int = 10, max_points: int = 300) -> dict[str, list]:
+        """Moving averages of the overall and dimension scores over the last ``window`` attempts,
+        thinned to at most ``max_points`` points for charting."""
+        return self._cached(("trend", window, max_points), lambda: self._trend(window, max_points))
+
+    def _trend(self, window: int, max_points: int) -> dict[str, list]:
+        n = self.n
+        if not n:
+            return {}
+        scores = self.scores[:n].astype(np.float64)
+        ok = ~np.isnan(scores)
+        sums = np.vstack([np.zeros((1, scores.shape[1])), np.cumsum(np.where(ok, scores, 0), axis=0)])
+        counts = np.vstack([np.zeros((1, scores.shape[1])), np.cumsum(ok, axis=0)])
+        end = np.arange(1, n + 1)
+        start = np.maximum(end - window, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moving = (sums[end] - sums[start]) / (counts[end] - counts[start])
+        rows = np.unique(np.linspace(0, n - 1, min(n, max_points)).astype(np.int64))
+        out = {"attempt": (rows + 1).tolist()}
+        for j, name in enumerate(["score", *DIMENSIONS]):
+            out[name] = np.round(moving[rows, j], 2).tolist()
+        return out
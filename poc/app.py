@@ -1,13 +1,41 @@
 import streamlit as st
-import anthropic
-import json
+import io
 import time
-import random
 import os
+import uuid
 from datetime import datetime
 
+import dedup
+import metrics
+import prescore
+import routing
+import scoring
+from analytics import ProgressAnalytics
+from app_resources import countdown, start_reference_warmup, warm_dedup_index
+from client_pool import get_client, key_fingerprint
+from concept_index import ConceptIndex
+from history_archive import export_history, import_file
+from history_store import get_history_store
+from scheduler import ConceptScheduler, get_review_store
+from prefetch import Prefetcher
+from reference_cache import get_reference_cache
+from prompts import (
+    AUDIENCE_LABELS, MAX_PERSONA_LENGTH, TIMER_OPTIONS, default_presets, generate_prompt, sanitize_persona,
+)
+from job_queue import get_job_queue
+from score_cache import get_score_cache
+from score_executor import get_score_executor
+from streaming import DIMENSIONS
+
 DEPLOY_MODE = os.environ.get("DEPLOY_MODE", "").lower() in ("1", "true", "yes")
 ENV_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+# "client": countdown and auto-submit run in the browser, the server only reruns
+# on Submit, Cancel or expiry. "rerun": legacy one-second full-script rerun loop.
+TIMER_MODE = os.environ.get("TIMER_MODE", "client").lower()
+# "inline": score in this process. "worker": submit to the job queue drained by
+# scoring_worker.py (used only with the deployment's own ANTHROPIC_API_KEY).
+SCORING_MODE = os.environ.get("SCORING_MODE", "inline").lower()
+SCORE_POLL_S = float(os.environ.get("SCORE_POLL_S", "0.5"))
 
 # --- Config ---
 st.set_page_config(
@@ -23,310 +51,158 @@ if DEPLOY_MODE:
         unsafe_allow_html=True,
     )
 
-# --- Preset Topics & Concepts ---
-TOPIC_CONCEPTS = {
-    "JavaScript": [
-        "closures", "promises", "the event loop", "prototypal inheritance",
-        "async/await", "hoisting", "higher-order functions", "the DOM",
-        "arrow functions vs regular functions", "the this keyword", "destructuring",
-        "spread and rest operators", "template literals", "modules (import/export)",
-        "classes and inheritance", "callbacks", "promise chaining", "try/catch and error handling",
-        "the fetch API", "map, filter, and reduce", "variable scoping (var, let, const)",
-        "immediately invoked function expressions (IIFE)", "currying", "debouncing and throttling",
-        "web workers", "service workers", "local storage vs session storage", "cookies",
-        "regular expressions", "object vs Map", "array vs Set", "WeakMap and WeakSet",
-        "symbols", "proxies and reflect", "generators and iterators",
-        "garbage collection in JavaScript",
-    ],
-    "Python": [
-        "decorators", "generators", "list comprehensions", "the GIL",
-        "duck typing", "context managers", "virtual environments", "dunder methods",
-        "metaclasses", "iterators vs iterables", "the descriptor protocol",
-        "multiple inheritance and MRO", "lambda functions", "map, filter, and reduce",
-        "class methods vs static methods", "property decorators", "the *args and **kwargs syntax",
-        "dictionary comprehensions", "set comprehensions", "the walrus operator",
-        "asyncio and async/await", "the with statement", "exception handling and custom exceptions",
-        "modules and packages", "the import system", "pip and package management",
-        "type hints and annotations", "dataclasses", "named tuples", "function closures",
-        "mutable vs immutable types", "shallow vs deep copy", "the is vs == operators",
-        "pass by reference vs pass by value", "Python's memory management", "slots",
-    ],
-    "Machine Learning": [
-        "gradient descent", "overfitting", "neural networks",
-        "supervised vs unsupervised learning", "backpropagation",
-        "bias-variance tradeoff", "decision trees", "cross-validation",
-        "regularization (L1/L2)", "feature engineering",
-        "ensemble methods (bagging vs boosting)", "precision vs recall",
-        "ROC curves", "k-nearest neighbors", "dimensionality reduction (PCA)", "transfer learning",
-        "transformer architecture and self-attention",
-        "vanishing and exploding gradients",
-        "BatchNorm vs LayerNorm",
-        "training, validation, and test data splits",
-        "batch vs mini-batch vs stochastic gradient descent",
-        "generative vs discriminative models",
-        "CNNs vs traditional neural networks",
-        "concept drift in production models",
-        "F1-score and when to optimize for precision vs recall",
-        "feature scaling (normalization vs standardization)",
-        "classification vs regression",
-    ],
-    "Web Development": [
-        "REST APIs", "CORS", "cookies vs sessions", "DNS resolution",
-        "HTTPS/TLS", "caching strategies", "WebSockets", "responsive design",
-        "the critical rendering path", "server-side rendering vs client-side rendering",
-        "OAuth and authentication flows", "Content Security Policy",
-        "progressive web apps", "service workers", "web accessibility (WCAG)", "GraphQL vs REST",
-        "rate limiting (token bucket, sliding window)",
-        "web crawlers (deduplication, politeness, distributed crawling)",
-        "real-time fraud detection in web systems",
-    ],
-    "Databases": [
-        "SQL joins", "indexing (in databases)", "ACID properties", "normalization",
-        "NoSQL vs SQL", "transactions (in databases)", "connection pooling", "sharding",
-        "database replication", "CAP theorem", "query optimization", "stored procedures",
-        "database migrations", "eventual consistency", "write-ahead logging", "materialized views",
-    ],
-    "Operating Systems": [
-        "processes vs threads", "virtual memory (in OS)", "deadlocks", "file systems",
-        "context switching", "scheduling algorithms (in OS)", "system calls", "page replacement (in OS)",
-        "the heap (OS memory management)", "the stack (OS call stack)",
-        "inter-process communication", "semaphores and mutexes",
-        "memory-mapped I/O", "kernel space vs user space", "paging vs segmentation",
-        "interrupts and interrupt handling",
-        "concurrency patterns (producer-consumer problem)",
-        "kernel optimization (loop unrolling, memory coalescing)",
-    ],
-    "Networking": [
-        "TCP vs UDP", "HTTP/2", "load balancing (in networking)", "CDNs",
-        "the OSI model", "subnetting", "packet routing", "firewalls",
-        "NAT (Network Address Translation)", "ARP (Address Resolution Protocol)",
-        "BGP routing", "DHCP", "TCP three-way handshake",
-        "HTTP status codes", "TLS handshake", "DNS records (A, CNAME, MX)",
-    ],
-    "Data Structures": [
-        "hash tables", "binary search trees", "linked lists vs arrays",
-        "graphs (in data structures)", "stacks and queues",
-        "heaps (priority queue data structure)", "tries (prefix trees)", "B-trees",
-        "red-black trees", "bloom filters", "skip lists",
-        "adjacency list vs adjacency matrix", "disjoint set (union-find)",
-        "circular buffers", "LRU cache implementation", "amortized time complexity",
-        "SnapshotArray implementation", "KV store with versioning and transactions",
-    ],
-    "Generative AI": [
-        "RAG (retrieval-augmented generation)",
-        "vector databases and ANN search",
-        "LLM inference serving and optimization",
-        "PagedAttention and KV cache management",
-        "quantization (4-bit/8-bit) for model compression",
-        "agentic AI systems (Plan-Act-Observe loop)",
-        "tool calling and safety in AI agents",
-        "memory in multi-agent workflows",
-        "human-in-the-loop design for AI agents",
-        "prompt engineering techniques",
-        "RLHF (reinforcement learning from human feedback)",
-        "constitutional AI",
-        "embeddings and semantic search",
-        "text-to-image generation (diffusion models)",
-        "fine-tuning vs pre-training",
-        "knowledge distillation",
-        "tokenization in LLMs",
-        "context windows and attention limits",
-        "chain-of-thought prompting",
-        "few-shot vs zero-shot learning",
-        "hallucination in LLMs and mitigation strategies",
-        "guardrails for LLM outputs",
-        "model evaluation metrics (perplexity, BLEU, ROUGE)",
-        "ReAct prompting pattern",
-        "chunking strategies for RAG pipelines",
-        "cross-encoder reranking for retrieval",
-        "hybrid search (vector + BM25)",
-        "AI safety and alignment",
-        "model monitoring and drift detection",
-        "distributed training (data parallelism vs model parallelism)",
-    ],
-    "Physics": [
-        "gravity", "quantum entanglement", "thermodynamics",
-        "special relativity", "electromagnetic waves", "entropy (in physics)",
-        "Heisenberg's uncertainty principle", "wave-particle duality",
-        "conservation of energy", "Schrödinger's equation", "the photoelectric effect",
-        "nuclear fission vs fusion", "the Doppler effect", "Ohm's law",
-        "centripetal vs centrifugal force", "the Standard Model of particle physics",
-    ],
-    "Economics": [
-        "supply and demand", "inflation", "opportunity cost",
-        "game theory", "monetary policy", "comparative advantage",
-        "market equilibrium", "externalities",
-        "GDP and how it's measured", "the Phillips curve", "moral hazard",
-        "adverse selection", "fiscal policy vs monetary policy",
-        "the tragedy of the commons", "price elasticity", "Keynesian vs classical economics",
-    ],
-}
-
-AUDIENCES = {
-    "a 10-year-old child": "child",
-    "a non-technical adult": "non-technical",
-    "a peer with similar expertise": "peer",
-    "a job interviewer": "interviewer",
-    "a business executive": "executive",
-}
-
-MAX_PERSONA_LENGTH = 50  # Character limit for custom persona to prevent prompt injection
-
-PROMPT_TEMPLATES = [
-    "[{topic}] Explain {concept} to {audience}.",
-    "[{topic}] What is {concept} and why does it matter? Explain for {audience}.",
-    "[{topic}] Describe how {concept} works to {audience}.",
-    "[{topic}] Summarize {concept} in a way that {audience} would understand.",
-    "[{topic}] What are the most important things to know about {concept}? Explain for {audience}.",
-    "[{topic}] Walk through {concept} step by step for {audience}.",
-]
-
-TIMER_OPTIONS = {
-    "30 seconds": 30,
-    "60 seconds": 60,
-    "90 seconds": 90,
-    "120 seconds": 120,
-    "3 minutes": 180,
-    "5 minutes": 300,
-}
-
-
-def sanitize_persona(persona: str) -> str:
-    """Sanitize and validate custom persona input to prevent prompt injection."""
-    if not persona:
-        return ""
-
-    # Trim to max length
-    persona = persona[:MAX_PERSONA_LENGTH].strip()
-
-    # Remove special characters that could be used for injection
-    # Allow only letters, numbers, spaces, hyphens, and basic punctuation
-    allowed_chars = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 -,.'")
-    persona = "".join(c for c in persona if c in allowed_chars)
-
-    # Remove any newlines or control characters
-    persona = " ".join(persona.split())
-
-    return persona
-
-
-def generate_prompt(topic: str, custom_concept: str | None = None, custom_persona: str | None = None, custom_concepts: dict | None = None) -> tuple[str, str, str]:
-    """Generate a practice prompt. Returns (full_prompt, concept, audience_label)."""
-    if custom_concept:
-        concept = custom_concept
-    else:
-        preset = TOPIC_CONCEPTS.get(topic, [])
-        extra = (custom_concepts or {}).get(topic, [])
-        all_concepts = preset + extra
-        if all_concepts:
-            concept = random.choice(all_concepts)
-        else:
-            concept = f"a key concept from {topic}"
-
-    # Use custom persona if provided and valid, otherwise random
-    if custom_persona:
-        sanitized = sanitize_persona(custom_persona)
-        if sanitized:
-            audience_label = sanitized
-        else:
-            audience_label = random.choice(list(AUDIENCES.keys()))
-    else:
-        audience_label = random.choice(list(AUDIENCES.keys()))
-
-    template = random.choice(PROMPT_TEMPLATES)
-    prompt = template.format(topic=topic, concept=concept, audience=audience_label)
-    return prompt, concept, audience_label
-
-
-def score_explanation(
-    prompt: str,
-    explanation: str,
-    topic: str,
-    audience: str,
-    timer_duration: int,
-    time_used: int,
-) -> dict | None:
-    """Send explanation to Claude for scoring."""
+HISTORY_PAGE_SIZE = 10
+
+
+def progress_analytics(history, history_total: int) -> ProgressAnalytics:
+    """This user's progress columns: loaded from history once per session, then appended to as attempts are scored."""
+    progress = st.session_state.progress
+    # Rebuilt if another tab or process added attempts for this user
+    if progress is None or len(progress) != history_total:
+        progress = ProgressAnalytics.from_entries(history.iter_attempts(st.session_state.user_id))
+        st.session_state.progress = progress
+    return progress
+
+
+def render_partial_score(events: list):
+    """Draw the part of a score streamed so far, from a job's buffered ``streaming`` events."""
+    fields, model_text = {}, []
+    for kind, key, value in events:
+        if kind == "field":
+            if key != "model_explanation" and (model_text or "model_explanation" in fields):
+                # A second response (escalation or repair) is streaming; drop the first one's text
+                model_text = []
+                fields.pop("model_explanation", None)
+            fields[key] = value
+        elif kind == "text" and key == "model_explanation":
+            model_text.append(value)
+    overall = fields.get("overall")
+    if isinstance(overall, dict):
+        st.markdown(f"**Overall**: **{overall.get('score')}/10** ({overall.get('grade', '')})")
+    for dim in DIMENSIONS:
+        value = fields.get(dim)
+        if isinstance(value, dict) and "score" in value:
+            render_score_bar(dim.capitalize(), value["score"], value.get("feedback", ""))
+    model = "".join(model_text) or fields.get("model_explanation")
+    if isinstance(model, str) and model:
+        st.markdown("**Model explanation**\n\n" + model)
+
+
+def poll_inline_score() -> dict | None:
+    """Score the current attempt on the background executor and return the result once it's ready.
+
+    The job is keyed by ``score_job``, so reruns while it's pending reattach to
+    it instead of calling the model again. Each run redraws the partial score,
+    waits up to ``SCORE_POLL_S`` and reruns. Returns None on failure.
+    """
     api_key = st.session_state.get("api_key", "")
     if not api_key:
         st.error("Please enter your Anthropic API key in the sidebar.")
         return None
 
-    client = anthropic.Anthropic(api_key=api_key)
-    word_count = len(explanation.split())
-
-    # Determine time-based expectations
-    if timer_duration <= 60:
-        time_context = "very short time (≤60s) - expect bullet points or a brief paragraph covering key ideas only"
-        completeness_note = "For this short timeframe, completeness means hitting 2-3 key points, not exhaustive coverage"
-    elif timer_duration <= 120:
-        time_context = "moderate time (60-120s) - expect 1-2 paragraphs with main concepts and an example"
-        completeness_note = "Should cover main concepts with at least one concrete example or analogy"
-    else:
-        time_context = "extended time (>120s) - expect well-developed explanation with examples, nuance, and structure"
-        completeness_note = "Should provide thorough coverage with examples, context, and possibly counterexamples"
-
-    scoring_prompt = f"""You are an expert communication coach. Evaluate how well someone explained a concept under time pressure.
-
-## Context
-- **Prompt given**: "{prompt}"
-- **Topic**: {topic}
-- **Target audience**: {audience}
-  ⚠️ IMPORTANT: The explanation must be tailored specifically for "{audience}". Evaluate clarity and appropriateness based on this exact audience persona.
-- **Total time budget**: {timer_duration} seconds ({time_context})
-- **Time the user actually spent**: {time_used} seconds out of {timer_duration} seconds ({timer_duration - time_used} seconds remaining when submitted)
-- **Word count**: {word_count} words
-
-## The Explanation
-\"\"\"
-{explanation}
-\"\"\"
-
-## Evaluation Guidelines
-
-**Time-Adjusted Expectations**:
-- {completeness_note}
-- Minor typos, grammar issues, or abrupt endings are acceptable given time pressure
-- Prioritize clarity and accuracy over polish
-- Judge completeness relative to the time constraint - shorter times should NOT be penalized for brevity
-
-**Scoring Dimensions**:
-1. **Clarity**: Is it understandable specifically for "{audience}"? Consider the vocabulary, examples, and analogies appropriate for this exact persona.
-2. **Accuracy**: Are the core concepts technically correct?
-3. **Structure**: Is there logical flow (even if brief)?
-4. **Completeness**: Does it cover what's reasonable given {timer_duration} seconds?
-5. **Conciseness**: Efficient use of limited time?
-
-Respond with ONLY this JSON (no markdown fences, no preamble):
-
-{{
-  "clarity": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
-  "accuracy": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
-  "structure": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
-  "completeness": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
-  "conciseness": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
-  "overall": {{
-    "score": <1-10 weighted: clarity 25%, accuracy 25%, structure 20%, completeness 15%, conciseness 15%>,
-    "grade": "<A+ to F>",
-    "summary": "<2-3 sentence overall assessment>",
-    "strengths": ["<strength 1>", "<strength 2>"],
-    "improvements": ["<improvement 1>", "<improvement 2>"]
-  }},
-  "model_explanation": "<A concise, well-structured explanation that could realistically be typed within {timer_duration} seconds. This should demonstrate ideal clarity, accuracy, and structure for the given audience while respecting the time constraint.>"
-}}"""
-
+    if st.session_state.score_job is None:
+        st.session_state.score_job = uuid.uuid4().hex
+    job = get_score_executor().submit(
+        st.session_state.score_job, scoring.score_explanation, get_client(api_key),
+        **scoring_job_payload()["attempt"],
+    )
+    if not job.done():
+        render_partial_score(job.events())
+        st.caption("Claude is evaluating your explanation..." if job.running() else "Waiting for a free scoring slot...")
+        if not job.wait(SCORE_POLL_S):
+            st.rerun()
     try:
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=2000,
-            messages=[{"role": "user", "content": scoring_prompt}],
-        )
-        text = message.content[0].text
-        json_match = text[text.index("{"):text.rindex("}") + 1]
-        return json.loads(json_match)
+        result, timing = job.result()
     except Exception as e:
         st.error(f"Scoring failed: {e}")
         return None
+    st.session_state.score_timing = timing
+    return result
+
+
+def use_worker() -> bool:
+    """Whether this session scores through the worker queue. Workers never see user-entered keys."""
+    return SCORING_MODE == "worker" and bool(ENV_API_KEY) and st.session_state.api_key == ENV_API_KEY
+
+
+def scoring_job_payload() -> dict:
+    """Everything a worker needs to score the current attempt, and the app needs to restore it."""
+    return {
+        "attempt": {
+            "prompt": st.session_state.prompt,
+            "explanation": st.session_state.explanation,
+            "topic": st.session_state.current_topic,
+            "audience": st.session_state.audience,
+            "timer_duration": st.session_state.timer_duration,
+            "time_used": st.session_state.time_used,
+            "use_cache": not st.session_state.rescore,
+            "concept": st.session_state.concept,
+            "user": st.session_state.user_id,
+        },
+        "session": {
+            "user_id": st.session_state.user_id,
+            "rescore": st.session_state.rescore,
+            "attempt_id": st.session_state.attempt_id,
+        },
+    }
+
+
+def restore_score_job(job_id: str) -> bool:
+    """Put a fresh session back in the submitted phase for an unfinished job from the URL."""
+    job = get_job_queue().get(job_id)
+    if job is None or job["acked"]:
+        return False
+    attempt, session = job["payload"]["attempt"], job["payload"]["session"]
+    st.session_state.prompt = attempt["prompt"]
+    st.session_state.explanation = attempt["explanation"]
+    st.session_state.current_topic = attempt["topic"]
+    st.session_state.audience = attempt["audience"]
+    st.session_state.timer_duration = attempt["timer_duration"]
+    st.session_state.time_used = attempt["time_used"]
+    st.session_state.concept = attempt["concept"]
+    st.session_state.rescore = session["rescore"]
+    st.session_state.attempt_id = session["attempt_id"]
+    st.session_state.score_job = job_id
+    st.session_state.phase = "submitted"
+    return True
+
+
+def poll_worker_score() -> dict | None:
+    """Submit the current attempt to the workers (once) and return its result when it's ready.
+
+    While the job is pending this sleeps ``SCORE_POLL_S`` and reruns the script,
+    so each run holds the script thread only briefly. Returns None on failure.
+    """
+    queue = get_job_queue()
+    job_id = st.session_state.score_job
+    if job_id is None:
+        job_id = uuid.uuid4().hex
+        queue.submit(job_id, scoring_job_payload())
+        st.session_state.score_job = job_id
+        st.query_params["job"] = job_id
+    job = queue.get(job_id)
+    if job is None or job["status"] == "failed":
+        st.error(f"Scoring failed: {job['error'] if job else 'the job was lost'}")
+        return None
+    if job["status"] != "done":
+        ahead = queue.position(job_id)
+        st.caption(f"Waiting for a scoring worker ({ahead} ahead of you)" if ahead else "Claude is evaluating your explanation...")
+        time.sleep(SCORE_POLL_S)
+        st.rerun()
+    st.session_state.score_timing = job["result"]["timing"]
+    return job["result"]["result"]
+
+
+def clear_score_job():
+    """Forget the current scoring job once its outcome has been handled."""
+    if st.session_state.score_job is not None:
+        if use_worker():
+            get_job_queue().ack(st.session_state.score_job)
+        else:
+            get_score_executor().discard(st.session_state.score_job)
+        st.session_state.score_job = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
 
 
 def render_score_bar(label: str, score: int, feedback: str):
@@ -337,6 +213,91 @@ def render_score_bar(label: str, score: int, feedback: str):
     st.caption(feedback)
 
 
+def render_countdown(remaining: float, total: int, token: str) -> bool:
+    """Render the browser-side countdown. Returns True once it has expired."""
+    value = countdown(
+        remaining_ms=int(remaining * 1000),
+        total_ms=total * 1000,
+        token=token,
+        key=f"countdown_{token}",
+        default=None,
+    )
+    return bool(value and value.get("token") == token)
+
+
+def record_rerun(phase: str):
+    """Count script runs per phase so reruns per session-minute can be compared across timer modes."""
+    stats = st.session_state.rerun_stats
+    stats["runs"][phase] = stats["runs"].get(phase, 0) + 1
+    metrics.RERUNS.inc(phase=phase)
+
+
+def log_scored_attempt(result: dict):
+    """Write the just-scored attempt to the metrics attempt log: ids, timings and scores, no text."""
+    timing = st.session_state.score_timing
+    metrics.log_attempt({
+        "attempt_id": st.session_state.attempt_id,
+        "user": key_fingerprint(st.session_state.user_id),
+        "topic": st.session_state.current_topic,
+        "timer": st.session_state.timer_duration,
+        "time_used": st.session_state.time_used,
+        "words": len(st.session_state.explanation.split()),
+        "rescore": st.session_state.rescore,
+        "score": result["overall"]["score"],
+        "grade": result["overall"]["grade"],
+        "source": metrics.score_source(timing),
+        "route": timing.get("route"),
+        "escalated": timing.get("escalated"),
+        "repair": timing.get("repair"),
+        "total_s": timing.get("total_s"),
+        "first_score_s": timing.get("first_score_s"),
+        "usage": timing.get("usage", {}),
+        "reruns": sum(st.session_state.rerun_stats["runs"].values()),
+    }, explanation=st.session_state.explanation)
+
+
+def prefetch_context(topics: list[str], timer_duration: int) -> tuple:
+    """What a prefetched prompt depends on besides the scheduler; any change cancels the prefetch."""
+    return (tuple(topics), sanitize_persona(st.session_state.custom_persona), timer_duration,
+            st.session_state.no_repeat)
+
+
+def prefetch_next_prompts(topics: list[str], timer_duration: int):
+    """Pick the prompts "Try Again (Same Topic)" and "Generate Prompt" would start and prepare them."""
+    prefetcher, scheduler, concepts = st.session_state.prefetcher, st.session_state.scheduler, st.session_state.concepts
+    if not prefetcher.depth:
+        return
+    avoid = st.session_state.concept if st.session_state.no_repeat else None
+    same = st.session_state.current_topic
+    wanted = [("same_topic", same, c) for c in scheduler.upcoming(same, concepts, prefetcher.depth, avoid)]
+    if topics:
+        new = scheduler.next_topic(topics, concepts, avoid=st.session_state.concept)
+        wanted += [("new_topic", new, c) for c in scheduler.upcoming(new, concepts, prefetcher.depth, avoid)]
+    api_key = st.session_state.api_key
+    prefetcher.update(
+        prefetch_context(topics, timer_duration), timer_duration, wanted,
+        lambda topic, concept: generate_prompt(topic, custom_concept=concept,
+                                               custom_persona=st.session_state.custom_persona),
+        client=get_client(api_key) if api_key else None,
+    )
+
+
+def start_practice(topic: str, prompt: str, concept: str, audience: str, timer_duration: int):
+    st.session_state.prompt = prompt
+    st.session_state.concept = concept
+    st.session_state.audience = audience
+    st.session_state.current_topic = topic
+    st.session_state.timer_duration = timer_duration
+    st.session_state.explanation = ""
+    st.session_state.start_time = time.time()
+    st.session_state.phase = "practicing"
+
+
+# Once per process; a no-op unless METRICS_PORT or METRICS_FILE is set
+metrics.start_exporters()
+warm_dedup_index()
+start_reference_warmup(ENV_API_KEY)
+
 # --- Session State Init ---
 defaults = {
     "phase": "setup",        # setup | practicing | submitted | scored
@@ -347,16 +308,44 @@ defaults = {
     "start_time": None,
     "time_used": 0,
     "score": None,
-    "history": [],
+    "score_timing": {},
+    "rescore": False,       # bypass the score cache for the next scoring call
+    "attempt_id": None,     # history store id of the attempt being shown
+    "score_job": None,      # id of the background/worker job scoring this attempt
+    "history_page": 0,
+    "history_export": None,  # archive bytes prepared for download
+    "history_import": None,  # file_id of the last imported upload, so a rerun doesn't import it again
     "selected_topics": [],
     "custom_topics": [],
-    "custom_concepts": {},  # {topic_name: [concept1, concept2, ...]}
+    "concepts": None,       # ConceptIndex: shared presets + this session's custom concepts
+    "progress": None,       # ProgressAnalytics over this user's history
+    "scheduler": None,      # ConceptScheduler: spaced-repetition concept selection
+    "prefetcher": None,     # Prefetcher: next prompts prepared while results are shown
+    "no_repeat": True,      # never schedule the same concept back to back
     "custom_persona": "",
     "api_key": ENV_API_KEY,
+    "rerun_stats": None,
 }
 for k, v in defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
+# History is keyed by a per-browser id kept in the URL, so it survives reloads
+if "user_id" not in st.session_state:
+    st.session_state.user_id = st.query_params.get("u") or uuid.uuid4().hex[:16]
+    st.query_params["u"] = st.session_state.user_id
+# A scoring job id in the URL outlives this process: pick it back up after a restart
+if SCORING_MODE == "worker" and st.session_state.phase == "setup" and st.query_params.get("job"):
+    if not restore_score_job(st.query_params["job"]):
+        del st.query_params["job"]
+if st.session_state.concepts is None:
+    st.session_state.concepts = ConceptIndex(default_presets())
+if st.session_state.scheduler is None:
+    st.session_state.scheduler = ConceptScheduler(st.session_state.user_id, get_review_store())
+if st.session_state.prefetcher is None:
+    st.session_state.prefetcher = Prefetcher()
+if st.session_state.rerun_stats is None:
+    st.session_state.rerun_stats = {"started": time.time(), "runs": {}}
+record_rerun(st.session_state.phase)
 
 # --- Sidebar ---
 with st.sidebar:
@@ -377,7 +366,7 @@ with st.sidebar:
     st.subheader("Your Topics")
     selected = st.multiselect(
         "Pick topics you know",
-        options=list(TOPIC_CONCEPTS.keys()),
+        options=default_presets().topics,
         default=st.session_state.selected_topics,
         key="topic_multiselect",
     )
@@ -397,35 +386,37 @@ with st.sidebar:
     st.divider()
     st.subheader("Custom Questions")
     st.caption("Add your own concepts/questions to any topic.")
-    all_topic_names = list(TOPIC_CONCEPTS.keys()) + st.session_state.custom_topics
+    concepts = st.session_state.concepts
+    all_topic_names = list(default_presets().topics) + st.session_state.custom_topics
     concept_topic = st.selectbox("Topic", options=all_topic_names, key="concept_topic_select")
     concept_input = st.text_input("New question/concept", key="concept_input")
     if concept_input and st.button("Add Concept"):
-        if concept_topic not in st.session_state.custom_concepts:
-            st.session_state.custom_concepts[concept_topic] = []
-        if concept_input not in st.session_state.custom_concepts[concept_topic]:
-            st.session_state.custom_concepts[concept_topic].append(concept_input)
+        if concepts.add(concept_topic, concept_input):
             st.rerun()
 
-    if concept_topic and st.session_state.custom_concepts.get(concept_topic):
+    if concept_topic and concepts.custom(concept_topic):
         st.caption(f"Your custom concepts for {concept_topic}:")
-        for i, c in enumerate(st.session_state.custom_concepts[concept_topic]):
+        for i, c in enumerate(concepts.custom(concept_topic)):
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.text(c)
             with col2:
                 if st.button("×", key=f"rm_concept_{concept_topic}_{i}"):
-                    st.session_state.custom_concepts[concept_topic].pop(i)
+                    concepts.remove(concept_topic, c)
                     st.rerun()
 
-    preset_count = len(TOPIC_CONCEPTS.get(concept_topic, [])) if concept_topic else 0
-    custom_count = len(st.session_state.custom_concepts.get(concept_topic, [])) if concept_topic else 0
     if concept_topic:
+        preset_count, custom_count = concepts.counts(concept_topic)
         st.caption(f"Total: {preset_count} preset + {custom_count} custom = {preset_count + custom_count}")
+    st.session_state.no_repeat = st.checkbox(
+        "Don't repeat concepts back to back",
+        value=st.session_state.no_repeat,
+        help="Skip the concept you just practiced even if it's still the most due for review.",
+    )
 
     st.divider()
     st.subheader("Audience / Persona")
-    st.caption(f"Default personas: {', '.join(list(AUDIENCES.keys())[:3])}, ...")
+    st.caption(f"Default personas: {', '.join(AUDIENCE_LABELS[:3])}, ...")
 
     custom_persona = st.text_input(
         "Custom persona (optional)",
@@ -444,13 +435,118 @@ with st.sidebar:
             st.caption(f"✓ Will use: **{sanitized}**")
 
     st.divider()
-    if st.session_state.history:
-        st.subheader(f"History ({len(st.session_state.history)} attempts)")
-        for i, h in enumerate(reversed(st.session_state.history[-10:])):
-            with st.expander(f"#{len(st.session_state.history) - i} — {h['topic']}: {h['score']}/10"):
+    history = get_history_store()
+    history_total = history.count(st.session_state.user_id)
+    if history_total:
+        st.subheader(f"History ({history_total} attempts)")
+        # Only the summary rows on screen are fetched; blobs stay on disk
+        offset = st.session_state.history_page * HISTORY_PAGE_SIZE
+        for i, h in enumerate(history.page(st.session_state.user_id, limit=HISTORY_PAGE_SIZE, offset=offset)):
+            with st.expander(f"#{history_total - offset - i} — {h['topic']}: {h['score']}/10"):
                 st.write(f"**Prompt**: {h['prompt']}")
                 st.write(f"**Time**: {h['time_used']}s / {h['timer']}s")
                 st.write(f"**Grade**: {h['grade']}")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.session_state.history_page > 0 and st.button("Newer", use_container_width=True):
+                st.session_state.history_page -= 1
+                st.rerun()
+        with col2:
+            if offset + HISTORY_PAGE_SIZE < history_total and st.button("Older", use_container_width=True):
+                st.session_state.history_page += 1
+                st.rerun()
+
+        if history_total >= 2:
+            progress = progress_analytics(history, history_total)
+            overview = progress.overview()
+            with st.expander("Progress"):
+                col1, col2 = st.columns(2)
+                change = overview["recent_change"]
+                col1.metric("Average score", f"{overview['score']:.1f}",
+                            delta=f"{change:+.1f} last 10" if change is not None else None)
+                col2.metric("Time used", f"{overview['time_used_ratio']:.0%}")
+                if overview["words_per_s"]:
+                    st.caption(f"{overview['words_per_s']:.2f} words per second on average")
+                st.line_chart(progress.trend(), x="attempt", height=220)
+                st.dataframe(progress.by_topic(), hide_index=True, use_container_width=True)
+
+    with st.expander("Export / import"):
+        if history_total and st.button("Prepare export", use_container_width=True):
+            archive = io.BytesIO()
+            export_history(history, archive, st.session_state.user_id)
+            st.session_state.history_export = archive.getvalue()
+        if st.session_state.history_export:
+            st.download_button("Download history", st.session_state.history_export, file_name="thinkfast_history.tfh",
+                               mime="application/octet-stream", use_container_width=True)
+        uploaded = st.file_uploader("Import history", type=["tfh", "json"],
+                                    help="A history export, or the web app's thinkfast_attempts JSON")
+        if uploaded is not None and uploaded.file_id != st.session_state.history_import:
+            st.session_state.history_import = uploaded.file_id
+            try:
+                imported = import_file(history, uploaded, st.session_state.user_id)
+            except ValueError as e:
+                st.error(f"Couldn't import {uploaded.name}: {e}")
+            else:
+                st.session_state.history_page = 0
+                st.session_state.history_export = None
+                st.session_state.progress = None
+                st.toast(f"Imported {imported} attempts")
+                st.rerun()
+
+    if not DEPLOY_MODE:
+        stats = st.session_state.rerun_stats
+        total_runs = sum(stats["runs"].values())
+        session_minutes = max((time.time() - stats["started"]) / 60, 1 / 60)
+        with st.expander("Diagnostics"):
+            st.caption(f"Timer mode: {TIMER_MODE}")
+            st.caption(f"{total_runs} reruns in {session_minutes:.1f} min ({total_runs / session_minutes:.1f} per session-minute)")
+            st.caption(", ".join(f"{phase}: {n}" for phase, n in stats["runs"].items()))
+            score_cache = get_score_cache()
+            if score_cache is not None:
+                cache_stats = score_cache.stats()
+                st.caption(f"Score cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size']} entries")
+            prefetch_stats = st.session_state.prefetcher.stats()
+            st.caption(
+                f"Prefetch: {prefetch_stats['ready']} ready, {prefetch_stats['pending']} preparing, "
+                f"{prefetch_stats['used']} used, {prefetch_stats['cancelled']} cancelled"
+            )
+            executor_stats = get_score_executor().stats()
+            st.caption(
+                f"Background scoring: {executor_stats['running']} running, {executor_stats['waiting']} waiting "
+                f"(limit {executor_stats['limit']}), {executor_stats['reattached']} reruns reattached"
+            )
+            if SCORING_MODE == "worker":
+                job_stats = get_job_queue().stats()
+                st.caption("Job queue: " + ", ".join(f"{status}: {n}" for status, n in sorted(job_stats.items())))
+            references = get_reference_cache()
+            if references is not None:
+                ref_stats = references.stats()
+                st.caption(f"Reference cache: {ref_stats['hits']} hits, {ref_stats['misses']} misses, {ref_stats['size']} stored")
+            dedup_index = dedup.get_dedup_index()
+            if dedup_index is not None:
+                dedup_stats = dedup_index.stats()
+                st.caption(
+                    f"Near-duplicate index: {dedup_stats['explanations']} explanations in {dedup_stats['keys']} "
+                    f"concept/audience groups · {metrics.DEDUP.value(outcome='reused'):g} reused, "
+                    f"{metrics.DEDUP.value(outcome='anchored'):g} anchored, "
+                    f"{metrics.DEDUP.value(outcome='copied'):g} copied"
+                )
+            prescore_stats = prescore.stats()
+            st.caption(f"Local pre-score: {prescore_stats.get('avoided', 0)} of {prescore_stats.get('checked', 0)} model calls avoided")
+            route_stats = routing.ROUTE_STATS.summary()
+            for name in routing.ROUTES:
+                r = route_stats[name]
+                if r["calls"]:
+                    st.caption(
+                        f"Route {name}: {r['calls']} calls, p50 {r['p50_s']:.1f}s, p95 {r['p95_s']:.1f}s, "
+                        f"{r['input_tokens']} tokens in / {r['output_tokens']} out"
+                    )
+            escalations = route_stats["escalations"]
+            disagreement = route_stats["disagreement_rate"]
+            st.caption(
+                f"Escalations: {escalations['invalid']} invalid, {escalations['low_confidence']} low confidence"
+                + (f" · small/large disagreement {disagreement:.0%}" if disagreement is not None else "")
+            )
 
 # --- Main Area ---
 st.title("⚡ ThinkFast")
@@ -472,16 +568,14 @@ if st.session_state.phase == "setup":
     st.write(f"**Timer**: {timer_label}")
 
     if st.button("Generate Prompt", type="primary", use_container_width=True):
-        topic = random.choice(all_topics)
-        prompt, concept, audience = generate_prompt(topic, custom_persona=st.session_state.get("custom_persona", ""), custom_concepts=st.session_state.custom_concepts)
-        st.session_state.prompt = prompt
-        st.session_state.concept = concept
-        st.session_state.audience = audience
-        st.session_state.current_topic = topic
-        st.session_state.timer_duration = timer_duration
-        st.session_state.phase = "practicing"
-        st.session_state.explanation = ""
-        st.session_state.start_time = time.time()
+        ready = st.session_state.prefetcher.take("new_topic", prefetch_context(all_topics, timer_duration))
+        if ready is not None:
+            start_practice(ready.topic, ready.prompt, ready.concept, ready.audience, timer_duration)
+        else:
+            previous = st.session_state.concept or None
+            topic = st.session_state.scheduler.next_topic(all_topics, st.session_state.concepts, avoid=previous)
+            prompt, concept, audience = generate_prompt(topic, custom_persona=st.session_state.get("custom_persona", ""), concepts=st.session_state.concepts, no_repeat=st.session_state.no_repeat, scheduler=st.session_state.scheduler, previous=previous)
+            start_practice(topic, prompt, concept, audience, timer_duration)
         st.rerun()
 
 # ========== PRACTICING PHASE ==========
@@ -493,19 +587,23 @@ elif st.session_state.phase == "practicing":
     st.info(st.session_state.prompt)
 
     # Timer display
-    mins, secs = divmod(int(remaining), 60)
-    timer_color = "green" if remaining > st.session_state.timer_duration * 0.5 else "orange" if remaining > st.session_state.timer_duration * 0.2 else "red"
-    st.markdown(
-        f"### :{timer_color}[⏱ {mins:02d}:{secs:02d}]"
-    )
-    st.progress(remaining / st.session_state.timer_duration)
+    if TIMER_MODE == "rerun":
+        mins, secs = divmod(int(remaining), 60)
+        timer_color = "green" if remaining > st.session_state.timer_duration * 0.5 else "orange" if remaining > st.session_state.timer_duration * 0.2 else "red"
+        st.markdown(
+            f"### :{timer_color}[⏱ {mins:02d}:{secs:02d}]"
+        )
+        st.progress(remaining / st.session_state.timer_duration)
+        expired = remaining <= 0
+    else:
+        expired = render_countdown(remaining, st.session_state.timer_duration, str(st.session_state.start_time)) or remaining <= 0
 
     explanation = st.text_area(
         "Type your explanation here...",
         value=st.session_state.explanation,
         height=250,
         key="explanation_input",
-        disabled=remaining <= 0,
+        disabled=expired,
     )
     st.session_state.explanation = explanation
 
@@ -523,11 +621,12 @@ elif st.session_state.phase == "practicing":
             st.session_state.phase = "setup"
             st.rerun()
 
-    # Auto-refresh timer (every 1 second)
-    if remaining > 0:
+    # Auto-refresh timer (every 1 second). In client mode the browser countdown
+    # triggers the single rerun at expiry instead.
+    if TIMER_MODE == "rerun" and remaining > 0:
         time.sleep(1)
         st.rerun()
-    elif explanation.strip():
+    elif expired and explanation.strip():
         st.session_state.time_used = st.session_state.timer_duration
         st.session_state.phase = "submitted"
         st.rerun()
@@ -539,40 +638,60 @@ elif st.session_state.phase == "submitted":
     st.write(f"*Your explanation ({len(st.session_state.explanation.split())} words, {st.session_state.time_used}s used):*")
     st.text(st.session_state.explanation)
 
-    with st.spinner("Claude is evaluating your explanation..."):
-        result = score_explanation(
-            prompt=st.session_state.prompt,
-            explanation=st.session_state.explanation,
-            topic=st.session_state.current_topic,
-            audience=st.session_state.audience,
-            timer_duration=st.session_state.timer_duration,
-            time_used=st.session_state.time_used,
-        )
+    if use_worker():
+        result = poll_worker_score()
+    else:
+        result = poll_inline_score()
 
     if result:
+        history = get_history_store()
+        progress = st.session_state.progress
+        if st.session_state.rescore and st.session_state.attempt_id is not None:
+            # A re-score replaces the attempt's stored score rather than adding an entry
+            history.update_score(st.session_state.attempt_id, result)
+            if progress is not None:
+                progress.update_score(st.session_state.attempt_id, result)
+        else:
+            entry = {
+                "topic": st.session_state.current_topic,
+                "prompt": st.session_state.prompt,
+                "concept": st.session_state.concept,
+                "audience": st.session_state.audience,
+                "explanation": st.session_state.explanation,
+                "words": len(st.session_state.explanation.split()),
+                "timer": st.session_state.timer_duration,
+                "time_used": st.session_state.time_used,
+                "score": result["overall"]["score"],
+                "grade": result["overall"]["grade"],
+                "full_score": result,
+                "first_score_s": st.session_state.score_timing.get("first_score_s"),
+                "usage": st.session_state.score_timing.get("usage", {}),
+                "route": st.session_state.score_timing.get("route"),
+                "timestamp": datetime.now().isoformat(),
+            }
+            st.session_state.attempt_id = history.add(st.session_state.user_id, entry)
+            st.session_state.scheduler.review(
+                st.session_state.current_topic, st.session_state.concept, result["overall"]["score"])
+            if progress is not None:
+                progress.append({**entry, "id": st.session_state.attempt_id})
+        log_scored_attempt(result)
+        clear_score_job()
+        st.session_state.rescore = False
         st.session_state.score = result
-        st.session_state.history.append({
-            "topic": st.session_state.current_topic,
-            "prompt": st.session_state.prompt,
-            "explanation": st.session_state.explanation,
-            "timer": st.session_state.timer_duration,
-            "time_used": st.session_state.time_used,
-            "score": result["overall"]["score"],
-            "grade": result["overall"]["grade"],
-            "full_score": result,
-            "timestamp": datetime.now().isoformat(),
-        })
+        st.session_state.history_page = 0
         st.session_state.phase = "scored"
         st.rerun()
     else:
         st.error("Scoring failed. Check your API key and try again.")
         if st.button("Back to Setup"):
+            clear_score_job()
             st.session_state.phase = "setup"
             st.rerun()
 
 # ========== SCORED — RESULTS ==========
 elif st.session_state.phase == "scored":
     result = st.session_state.score
+    prefetch_next_prompts(all_topics, timer_duration)
 
     st.subheader("Results")
     st.info(st.session_state.prompt)
@@ -590,6 +709,41 @@ elif st.session_state.phase == "scored":
     with col3:
         st.metric("Time", f"{st.session_state.time_used}s / {st.session_state.timer_duration}s")
 
+    timing = st.session_state.score_timing
+    if timing.get("prescored"):
+        st.caption("Scored locally: this attempt didn't need a model call")
+    elif timing.get("reused"):
+        st.caption(f"Reused the score of a near-identical earlier attempt ({result['dedup']['reused']:.0%} similar)")
+    elif timing.get("cached"):
+        st.caption("Served from the score cache")
+    elif timing.get("first_score_s") is not None:
+        st.caption(f"Time to first score: {timing['first_score_s']:.1f}s · full result: {timing['total_s']:.1f}s")
+    agreement = result.get("consensus")
+    if agreement:
+        st.caption(
+            f"Consensus ({agreement['method']}) of {len(agreement['raters'])} of {agreement['requested']} raters"
+            + (" · stopped early on agreement" if agreement["stopped_early"] else "")
+            + f" · overall scores {', '.join(f'{s:g}' for s in agreement['scores'])}"
+            f" (variance {agreement['variance']['overall']:.2f})"
+        )
+    usage = timing.get("usage")
+    if usage and not DEPLOY_MODE:
+        route = timing.get("route", "large")
+        if timing.get("escalated"):
+            route = f"{route} → large ({timing['escalated'].replace('_', ' ')})"
+        st.caption(
+            f"Model route: {route} · Tokens: {usage['input_tokens']} in ({usage['cache_read_input_tokens']} cached, "
+            f"{usage['cache_creation_input_tokens']} written to cache) · {usage['output_tokens']} out"
+        )
+
+    review_state = st.session_state.scheduler.state(st.session_state.current_topic, st.session_state.concept)
+    if review_state is not None and review_state.reviewed:
+        due_in = review_state.due - time.time()
+        st.caption(f"Next review of this concept in {due_in / 86400:.1f} days" if due_in >= 86400
+                   else f"Next review of this concept in {max(due_in, 0) / 60:.0f} min")
+    if result.get("dedup", {}).get("copied_model_explanation"):
+        st.warning("This looks copied from a model explanation shown after an earlier attempt. "
+                   "Try explaining it in your own words.")
     st.write(overall["summary"])
 
     # Strengths & improvements
@@ -623,19 +777,23 @@ elif st.session_state.phase == "scored":
         with st.expander("Model explanation"):
             st.markdown(result["model_explanation"])
 
+    if st.button("Re-score this attempt", help="Ask Claude for a fresh evaluation instead of the cached one"):
+        metrics.RESCORES.inc()
+        st.session_state.rescore = True
+        st.session_state.phase = "submitted"
+        st.rerun()
+
     # Actions
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Try Again (Same Topic)", use_container_width=True):
-            topic = st.session_state.current_topic
-            prompt, concept, audience = generate_prompt(topic, custom_persona=st.session_state.get("custom_persona", ""), custom_concepts=st.session_state.custom_concepts)
-            st.session_state.prompt = prompt
-            st.session_state.concept = concept
-            st.session_state.audience = audience
-            st.session_state.timer_duration = timer_duration
-            st.session_state.explanation = ""
-            st.session_state.start_time = time.time()
-            st.session_state.phase = "practicing"
+            ready = st.session_state.prefetcher.take("same_topic", prefetch_context(all_topics, timer_duration))
+            if ready is not None:
+                start_practice(ready.topic, ready.prompt, ready.concept, ready.audience, timer_duration)
+            else:
+                topic = st.session_state.current_topic
+                prompt, concept, audience = generate_prompt(topic, custom_persona=st.session_state.get("custom_persona", ""), concepts=st.session_state.concepts, no_repeat=st.session_state.no_repeat, scheduler=st.session_state.scheduler, previous=st.session_state.concept)
+                start_practice(topic, prompt, concept, audience, timer_duration)
             st.rerun()
     with col2:
         if st.button("New Topic", type="primary", use_container_width=True):
@@ -0,0 +1,56 @@
+"""Process-wide resources of the Streamlit app.
+
+Streamlit re-executes ``app.py`` on every rerun, including its decorators and
+top-level statements. What only needs building once per process lives here
+instead: imported modules are executed once, so the cached functions below
+are decorated once and the countdown component is declared once.
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+import dedup
+from client_pool import get_client
+from history_store import get_history_store
+from scoring import time_band
+from warm_references import start_background_warm
+
+DEDUP_WARM = int(os.environ.get("DEDUP_WARM", "2000"))
+# Pre-generate model explanations in the background with the deployment's key
+REFERENCE_WARM = os.environ.get("REFERENCE_WARM", "").lower() in ("1", "true", "yes")
+REFERENCE_WARM_LIMIT = int(os.environ.get("REFERENCE_WARM_LIMIT", "0")) or None
+
+countdown = components.declare_component(
+    "countdown",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "countdown"),
+)
+
+
+@st.cache_resource
+def warm_dedup_index() -> int:
+    """Seed the near-duplicate index from the newest stored attempts, once per process."""
+    index = dedup.get_dedup_index()
+    if index is None:
+        return 0
+    seeded = 0
+    for entry in reversed(get_history_store().recent(DEDUP_WARM)):
+        # Entries written before concept/audience were recorded can't be keyed
+        if not entry.get("concept") or not entry.get("full_score"):
+            continue
+        result = {k: v for k, v in entry["full_score"].items() if k != "dedup"}
+        index.add(entry["concept"], entry.get("audience", ""), time_band(entry["timer"]),
+                  entry["explanation"], result, entry["user"])
+        seeded += 1
+    return seeded
+
+
+@st.cache_resource
+def start_reference_warmup(_api_key: str):
+    """Fill the reference cache from the concept bank once per process (``REFERENCE_WARM=1``).
+
+    Only then is a client built, and with it the ``anthropic`` SDK imported.
+    """
+    if REFERENCE_WARM and _api_key:
+        return start_background_warm(get_client(_api_key), limit=REFERENCE_WARM_LIMIT)
+    return None
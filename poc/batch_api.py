@@ -0,0 +1,226 @@
+"""Nightly / bulk scoring through the Message Batches API (half the price of real-time calls).
+
+Every input record becomes one batch request whose ``custom_id`` encodes its
+input line, so results (which come back in any order) map straight back to
+their attempts. Job state lives in a local manifest file that is rewritten
+after every step: rerunning the same command after an interruption skips
+requests that were already submitted (by ``custom_id``) and only polls and
+collects. Which records were invalid or prescored is decided once, on the
+first run, and kept in the manifest.
+
+    python batch_api.py history.jsonl scores.jsonl --manifest nightly.manifest.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import anthropic
+
+import scoring
+from batch_score import read_jsonl
+from prescore import prescore
+from streaming import usage_dict
+
+MAX_REQUESTS_PER_BATCH = 10_000
+
+
+def custom_id(index: int) -> str:
+    return f"attempt-{index}"
+
+
+def record_index(request_id: str) -> int:
+    return int(request_id.rsplit("-", 1)[1])
+
+
+def records_digest(records: list) -> str:
+    """SHA-256 of the records as scored (invalid input lines by their error), whether read from a file or passed in."""
+    h = hashlib.sha256()
+    for record in records:
+        text = repr(record) if isinstance(record, Exception) else json.dumps(record, sort_keys=True, default=str)
+        h.update(text.encode("utf-8", "surrogatepass") + b"\n")
+    return h.hexdigest()
+
+
+def load_manifest(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: dict):
+    """Write atomically so an interrupted save never leaves a half-written manifest."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def triage(records: list) -> tuple[dict[int, str], dict[int, dict]]:
+    """Records that don't go to the model: per-index errors for records that
+    can't be scored, and per-index local results for records that ``prescore``
+    already failed.
+
+    ``prescore`` gives up when it runs over its CPU budget, so this is only
+    run once per manifest and the decisions are stored.
+    """
+    invalid, prescored = {}, {}
+    for index, record in enumerate(records):
+        if isinstance(record, Exception):
+            invalid[index] = f"Invalid input: {record}"
+            continue
+        try:
+            attempt = scoring.attempt_from_record(record)
+            scoring.build_scoring_prompt(**attempt)
+        except (KeyError, TypeError, ValueError) as e:
+            invalid[index] = f"Invalid input: {type(e).__name__}: {e}"
+            continue
+        local = prescore(attempt["explanation"], record.get("concept", ""), attempt["prompt"])
+        if local is not None:
+            prescored[index] = local
+    return invalid, prescored
+
+
+def build_batch_requests(records: list, skip: set[int]) -> list[dict]:
+    """Batch requests for every record whose index is not in ``skip``."""
+    requests = []
+    for index, record in enumerate(records):
+        if index in skip:
+            continue
+        attempt = scoring.attempt_from_record(record)
+        params = scoring.build_request(scoring.build_scoring_prompt(**attempt), attempt["timer_duration"])
+        requests.append({"custom_id": custom_id(index), "params": params})
+    return requests
+
+
+def submit(client, records: list, manifest_path: str, input_path: str | None = None,
+           chunk_size: int = MAX_REQUESTS_PER_BATCH) -> dict:
+    """Create batches for ``records``, resuming from the manifest if one exists."""
+    manifest = load_manifest(manifest_path)
+    digest = records_digest(records)
+    if manifest is None:
+        manifest = {
+            "input": input_path,
+            "records_sha256": digest,
+            "model": scoring.MODEL,
+            "created_at": datetime.now().isoformat(),
+            "total": len(records),
+            "batches": [],
+        }
+    elif manifest.get("records_sha256") != digest:
+        raise ValueError(f"{manifest_path} was created for different input records; use a new manifest")
+    elif any("custom_ids" not in b for b in manifest["batches"]):
+        raise ValueError(f"{manifest_path} doesn't list its submitted requests; use a new manifest")
+
+    if "prescored" not in manifest:
+        invalid, prescored = triage(records)
+        manifest["invalid"] = {str(i): err for i, err in invalid.items()}
+        manifest["prescored"] = {str(i): result for i, result in prescored.items()}
+        save_manifest(manifest_path, manifest)
+    skip = {int(i) for i in manifest["invalid"]} | {int(i) for i in manifest["prescored"]}
+    skip |= {record_index(request_id) for b in manifest["batches"] for request_id in b["custom_ids"]}
+    requests = build_batch_requests(records, skip)
+    for start in range(0, len(requests), chunk_size):
+        chunk = requests[start:start + chunk_size]
+        batch = client.messages.batches.create(requests=chunk)
+        manifest["batches"].append({"id": batch.id, "count": len(chunk), "status": batch.processing_status,
+                                    "custom_ids": [request["custom_id"] for request in chunk]})
+        save_manifest(manifest_path, manifest)
+    save_manifest(manifest_path, manifest)
+    return manifest
+
+
+def wait(client, manifest: dict, manifest_path: str, poll_interval: float = 30.0,
+         timeout: float | None = None, log=None) -> dict:
+    """Poll every unfinished batch until all have ended (or ``timeout`` elapses)."""
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        pending = [b for b in manifest["batches"] if b["status"] != "ended"]
+        for entry in pending:
+            batch = client.messages.batches.retrieve(entry["id"])
+            entry["status"] = batch.processing_status
+            entry["request_counts"] = batch.request_counts.model_dump()
+        save_manifest(manifest_path, manifest)
+        pending = [b for b in manifest["batches"] if b["status"] != "ended"]
+        if not pending:
+            return manifest
+        if log:
+            log(f"{len(pending)} of {len(manifest['batches'])} batches still processing")
+        if deadline and time.monotonic() > deadline:
+            raise TimeoutError(f"{len(pending)} batches still processing")
+        time.sleep(poll_interval)
+
+
+def collect(client, manifest: dict) -> list[dict]:
+    """Download results for all ended batches and return one row per input record, in input order."""
+    rows = [{"index": i, "result": None, "error": "missing"} for i in range(manifest["total"])]
+    for index, err in manifest.get("invalid", {}).items():
+        rows[int(index)]["error"] = err
+    for index, result in manifest.get("prescored", {}).items():
+        rows[int(index)].update(result=result, error=None, prescored=True)
+    for entry in manifest["batches"]:
+        for item in client.messages.batches.results(entry["id"]):
+            index = record_index(item.custom_id)
+            row = rows[index]
+            if item.result.type == "succeeded":
+                try:
+                    row["result"] = scoring.parse_score(item.result.message.content[0].text)
+                    row["usage"] = usage_dict(item.result.message.usage)
+                    row["error"] = None
+                except ValueError as e:
+                    row["error"] = f"Unparseable response: {e}"
+            elif item.result.type == "errored":
+                row["error"] = f"errored: {item.result.error.error.message}"
+            else:
+                row["error"] = item.result.type
+    return rows
+
+
+def score_explanations(client, records: list[dict], manifest_path: str, poll_interval: float = 30.0,
+                       timeout: float | None = None) -> list[dict | None]:
+    """Batch counterpart of ``scoring.score_explanation``: one result dict (or None) per record."""
+    manifest = submit(client, records, manifest_path)
+    manifest = wait(client, manifest, manifest_path, poll_interval, timeout)
+    return [row["result"] for row in collect(client, manifest)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a JSONL file via the Message Batches API")
+    parser.add_argument("input", help="Input JSONL (same format as batch_score.py)")
+    parser.add_argument("output", help="Output JSONL, one row per input line in input order")
+    parser.add_argument("--manifest", help="Job manifest path (default: <output>.manifest.json)")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, default=None, help="Give up waiting after this many seconds")
+    parser.add_argument("--chunk-size", type=int, default=MAX_REQUESTS_PER_BATCH, help="Requests per batch")
+    parser.add_argument("--base-url", default=os.environ.get("ANTHROPIC_BASE_URL"), help="API base URL (e.g. a fake server)")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY") or ("fake-key" if args.base_url else "")
+    if not api_key:
+        parser.error("Set ANTHROPIC_API_KEY (or --base-url for a fake server)")
+    client = anthropic.Anthropic(api_key=api_key, base_url=args.base_url)
+    manifest_path = args.manifest or f"{args.output}.manifest.json"
+
+    def log(msg):
+        print(msg, file=sys.stderr)
+
+    records = list(read_jsonl(args.input))
+    manifest = submit(client, records, manifest_path, input_path=args.input, chunk_size=args.chunk_size)
+    log(f"{len(manifest['batches'])} batches for {manifest['total']} records (manifest: {manifest_path})")
+    manifest = wait(client, manifest, manifest_path, args.poll_interval, args.timeout, log=log)
+    rows = collect(client, manifest)
+    with open(args.output, "w", encoding="utf-8") as out:
+        for row in rows:
+            record = records[row["index"]]
+            row["id"] = record.get("id") if isinstance(record, dict) else None
+            out.write(json.dumps(row) + "\n")
+    failed = sum(1 for row in rows if row["error"])
+    log(json.dumps({"total": len(rows), "ok": len(rows) - failed, "failed": failed}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Offline batch scoring of many explanations.
+
+Reads JSONL records with ``prompt``, ``explanation``, ``topic``, ``audience``,
+``timer`` (or ``timer_duration``), ``time_used`` and optionally ``concept``
+and ``user``, scores them concurrently through ``scoring.ascore_explanation``
+and writes one JSONL result per input line, in input order, as soon as each
+prefix of the input is done. Records without a ``user`` never reuse another
+record's score.
+
+    python batch_score.py attempts.jsonl scores.jsonl --concurrency 8 --rate 4
+
+Point ANTHROPIC_BASE_URL at ``fake_anthropic.py`` to run without a key.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import anthropic
+
+import scoring
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` requests per second with bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_delay(error: Exception, attempt: int, base: float, cap: float) -> float:
+    """Backoff for a retryable error: honour retry-after, else exponential with full jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in scoring.RETRYABLE_STATUS
+
+
+async def score_record(client, record: dict, bucket: TokenBucket, max_retries: int,
+                       backoff: float, backoff_cap: float, use_cache: bool) -> dict:
+    """Score one input record, retrying 429/529 responses. Never raises."""
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            result, timing = await scoring.ascore_explanation(
+                client, **scoring.attempt_from_record(record), use_cache=use_cache,
+                concept=record.get("concept", ""), user=record.get("user", ""),
+            )
+            return {"result": result, "error": None, "attempts": attempt + 1,
+                    "cached": bool(timing.get("cached")), "prescored": bool(timing.get("prescored")),
+                    "usage": timing.get("usage", {}),
+                    "latency_s": round(time.perf_counter() - started, 4)}
+        except Exception as e:
+            if is_retryable(e) and attempt < max_retries:
+                await asyncio.sleep(retry_delay(e, attempt, backoff, backoff_cap))
+                attempt += 1
+                continue
+            return {"result": None, "error": f"{type(e).__name__}: {e}", "attempts": attempt + 1,
+                    "cached": False, "prescored": False, "latency_s": round(time.perf_counter() - started, 4)}
+
+
+async def run_batch(records, out, client, concurrency: int = 8, rate: float = 0.0, burst: int = 1,
+                    max_retries: int = 5, backoff: float = 1.0, backoff_cap: float = 30.0,
+                    use_cache: bool = True) -> dict:
+    """Score ``records`` (an iterable of dicts) and write JSONL lines to ``out`` in input order.
+
+    At most ``concurrency`` requests are in flight, and reading the input stops
+    while that many results are waiting behind an earlier, slower one.
+    """
+    bucket = TokenBucket(rate, burst)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    window = asyncio.Semaphore(concurrency * 4)  # bounds buffered out-of-order results
+    done: dict[int, dict] = {}
+    next_index = 0
+    stats = {"total": 0, "ok": 0, "failed": 0, "retries": 0, "cached": 0, "prescored": 0}
+
+    def flush():
+        nonlocal next_index
+        while next_index in done:
+            row = done.pop(next_index)
+            out.write(json.dumps(row) + "\n")
+            window.release()
+            next_index += 1
+        out.flush()
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, record = item
+            if isinstance(record, Exception):
+                outcome = {"result": None, "error": f"Invalid input: {record}", "attempts": 0,
+                           "cached": False, "prescored": False, "latency_s": 0.0}
+            else:
+                outcome = await score_record(client, record, bucket, max_retries, backoff, backoff_cap, use_cache)
+            stats["ok" if outcome["error"] is None else "failed"] += 1
+            stats["retries"] += max(0, outcome["attempts"] - 1)
+            stats["cached"] += outcome["cached"]
+            stats["prescored"] += outcome["prescored"]
+            record_id = record.get("id") if isinstance(record, dict) else None
+            done[index] = {"index": index, "id": record_id, **outcome}
+            flush()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for index, record in enumerate(records):
+        await window.acquire()
+        stats["total"] += 1
+        await queue.put((index, record))
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    return stats
+
+
+def read_jsonl(path: str):
+    """Yield parsed records; malformed lines are yielded as the ValueError so they keep their slot."""
+    with open(path, encoding="utf-8") if path != "-" else sys.stdin as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a JSONL file of explanations")
+    parser.add_argument("input", help="Input JSONL ('-' for stdin)")
+    parser.add_argument("output", help="Output JSONL ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Max requests per second (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=4, help="Token bucket burst size")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per record on 429/529")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base backoff in seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the score cache")
+    parser.add_argument("--base-url", default=os.environ.get("ANTHROPIC_BASE_URL"), help="API base URL (e.g. a fake server)")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY") or ("fake-key" if args.base_url else "")
+    if not api_key:
+        parser.error("Set ANTHROPIC_API_KEY (or --base-url for a fake server)")
+    # Retries are handled here so 429/529 go through the shared token bucket
+    client = anthropic.AsyncAnthropic(api_key=api_key, base_url=args.base_url, max_retries=0)
+
+    async def run():
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            return await run_batch(
+                read_jsonl(args.input), out, client,
+                concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                max_retries=args.max_retries, backoff=args.backoff, use_cache=not args.no_cache,
+            )
+        finally:
+            if out is not sys.stdout:
+                out.close()
+            await client.close()
+
+    started = time.perf_counter()
+    stats = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["per_second"] = round(stats["total"] / elapsed, 2) if elapsed else 0.0
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
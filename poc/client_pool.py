@@ -0,0 +1,127 @@
+"""Process-wide pool of Anthropic clients, shared across Streamlit sessions.
+
+Clients are keyed by a SHA-256 digest of the API key so the raw key is never
+stored as a dict key or logged. The env-key deployment and per-user sidebar
+keys go through the same cache.
+
+``anthropic`` takes about a second to import, so it's imported when the
+first client is built rather than with this module: app users who never
+score don't pay for it.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import anthropic
+
+MAX_CLIENTS = int(os.environ.get("ANTHROPIC_CLIENT_CACHE_SIZE", "32"))
+MAX_CONNECTIONS = int(os.environ.get("ANTHROPIC_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.environ.get("ANTHROPIC_MAX_KEEPALIVE", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("ANTHROPIC_CONNECT_TIMEOUT", "5"))
+REQUEST_TIMEOUT = float(os.environ.get("ANTHROPIC_TIMEOUT", "60"))
+MAX_RETRIES = int(os.environ.get("ANTHROPIC_MAX_RETRIES", "2"))
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Short, non-reversible identifier for an API key, safe to use in logs."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class ClientPool:
+    """Bounded LRU cache of Anthropic clients with shared connection limits."""
+
+    def __init__(
+        self,
+        max_clients: int = MAX_CLIENTS,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        request_timeout: float = REQUEST_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        base_url: str | None = None,
+    ):
+        self.max_clients = max_clients
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.base_url = base_url or os.environ.get("ANTHROPIC_BASE_URL") or None
+        self._clients: OrderedDict[str, "anthropic.Anthropic"] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _build(self, api_key: str) -> "anthropic.Anthropic":
+        import anthropic
+
+        # httpx's Limits class, taken from the SDK so we build against whichever
+        # HTTP library version the installed anthropic release was built with
+        limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive,
+        )
+        timeout = anthropic.Timeout(self.request_timeout, connect=self.connect_timeout)
+        http_client = anthropic.DefaultHttpxClient(limits=limits, timeout=timeout)
+        return anthropic.Anthropic(
+            api_key=api_key,
+            base_url=self.base_url,
+            timeout=timeout,
+            max_retries=self.max_retries,
+            http_client=http_client,
+        )
+
+    def get(self, api_key: str) -> "anthropic.Anthropic":
+        """Return the cached client for this key, creating it on first use."""
+        fp = hashlib.sha256(api_key.encode()).hexdigest()
+        with self._lock:
+            client = self._clients.get(fp)
+            if client is not None:
+                self._clients.move_to_end(fp)
+                self.hits += 1
+                return client
+            self.misses += 1
+            client = self._build(api_key)
+            self._clients[fp] = client
+            # Evicted clients aren't closed: another session may still be
+            # streaming through one, and closing it would tear down its
+            # connections. Each is closed when its last user drops it.
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def clear(self):
+        """Close and drop every cached client (only once nothing is using them)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._clients)
+        return {"size": size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+_pool: ClientPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClientPool:
+    """Process-wide pool singleton."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ClientPool()
+    return _pool
+
+
+def get_client(api_key: str) -> "anthropic.Anthropic":
+    """Shortcut for ``get_pool().get(api_key)``."""
+    return get_pool().get(api_key)
@@ -0,0 +1,157 @@
+"""Topic/concept banks loaded from files.
+
+A bank is a JSON Lines file with one topic per line, ``topic`` first:
+
+    {"topic": "Python", "concepts": ["decorators", "generators", ...]}
+
+Opening a bank only indexes line offsets and topic names; a topic's concepts
+are parsed the first time that topic is sampled. Files at or above
+``MMAP_THRESHOLD`` bytes are memory-mapped instead of read into memory. The
+file is re-checked at most every ``check_interval`` seconds and reloaded when
+its size or mtime changes, so a bank can be swapped without a restart.
+Replace bank files atomically (``write_bank`` does) rather than rewriting
+them in place, since a mapped file must not shrink under its readers.
+
+``ConceptBank`` has the same ``get``/``topics`` interface as
+``concept_index.PresetConcepts`` and can be used wherever presets are.
+"""
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+
+DEFAULT_BANK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "banks", "default.jsonl")
+MMAP_THRESHOLD = 1 << 20
+TOPIC_PREFIX = b'{"topic":'
+_decoder = json.JSONDecoder()
+
+
+def write_bank(path: str, topic_concepts: dict[str, list[str]]):
+    """Write ``topic_concepts`` as a bank file (atomically)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for topic, concepts in topic_concepts.items():
+            f.write(json.dumps({"topic": topic, "concepts": list(concepts)}, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+class ConceptBank:
+    """Lazily loaded, hot-reloadable topic bank backed by one JSONL file."""
+
+    def __init__(self, path: str = DEFAULT_BANK, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._data = b""
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._loaded: dict[str, tuple[str, ...]] = {}
+        self._topics: tuple[str, ...] = ()
+        self._signature = None
+        self._checked = 0.0
+        self.reloads = 0
+        self._open()
+
+    def _open(self):
+        # Build the new state fully before dropping the old one, so a bad
+        # replacement file leaves the previous bank in service.
+        st = os.stat(self.path)
+        file = None
+        if st.st_size >= MMAP_THRESHOLD:
+            file = open(self.path, "rb")
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        try:
+            offsets = self._index(data)
+        except ValueError:
+            if file is not None:
+                data.close()
+                file.close()
+            raise
+        self._close()
+        self._file, self._data, self._offsets = file, data, offsets
+        self._topics = tuple(self._offsets)
+        self._loaded = {}
+        self._signature = (st.st_size, st.st_mtime_ns)
+        self._checked = time.monotonic()
+
+    def _close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = b""
+
+    @staticmethod
+    def _index(data) -> dict[str, tuple[int, int]]:
+        """Map topic -> (start, end) byte span of its line, parsing only the topic key."""
+        offsets = {}
+        pos, size = 0, len(data)
+        while pos < size:
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = size
+            topic = None
+            if data[pos:pos + len(TOPIC_PREFIX)] == TOPIC_PREFIX:
+                head = bytes(data[pos + len(TOPIC_PREFIX):min(end, pos + 512)]).decode("utf-8", "ignore").lstrip()
+                try:
+                    topic = _decoder.raw_decode(head)[0]
+                except ValueError:
+                    pass
+            if topic is None and data[pos:end].strip():
+                # Lines not written with the topic key first fall back to a full parse
+                topic = json.loads(data[pos:end]).get("topic")
+            if topic:
+                offsets[topic] = (pos, end)
+            pos = end + 1
+        return offsets
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return  # keep serving the last good bank
+        if (st.st_size, st.st_mtime_ns) != self._signature:
+            try:
+                self._open()
+                self.reloads += 1
+            except (OSError, ValueError):
+                pass
+
+    @property
+    def topics(self) -> tuple[str, ...]:
+        with self._lock:
+            self._maybe_reload()
+            return self._topics
+
+    def get(self, topic: str) -> tuple[str, ...]:
+        """Concepts for ``topic`` (empty if unknown), parsed on first access."""
+        with self._lock:
+            self._maybe_reload()
+            concepts = self._loaded.get(topic)
+            if concepts is None:
+                span = self._offsets.get(topic)
+                if span is None:
+                    return ()
+                concepts = tuple(json.loads(self._data[span[0]:span[1]])["concepts"])
+                self._loaded[topic] = concepts
+            return concepts
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+if __name__ == "__main__":
+    bank = ConceptBank(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BANK)
+    for name in bank.topics:
+        print(f"{len(bank.get(name)):6d}  {name}")
@@ -0,0 +1,130 @@
+"""Concept index for prompt sampling.
+
+Preset concepts (a ``PresetConcepts`` or a file-backed
+``concept_bank.ConceptBank``) are per-topic tuples built once per process and
+shared by every session. Each session layers its own custom concepts on top in
+per-topic arrays with a position map, so adding or removing a custom concept
+is O(1) and sampling never concatenates preset and custom lists.
+"""
+import random
+
+
+class PresetConcepts:
+    """Immutable, precomputed per-topic preset arrays (build once per process)."""
+
+    def __init__(self, topic_concepts: dict[str, list[str]]):
+        self.by_topic: dict[str, tuple[str, ...]] = {t: tuple(c) for t, c in topic_concepts.items()}
+        self.topics: tuple[str, ...] = tuple(self.by_topic)
+
+    def get(self, topic: str) -> tuple[str, ...]:
+        return self.by_topic.get(topic, ())
+
+
+class ShuffleBag:
+    """Draws every index in ``range(n)`` once per cycle, never the same index twice in a row."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.bag: list[int] = []
+        self.size = 0
+        self.last: int | None = None
+
+    def reset(self, size: int):
+        self.size = size
+        self.bag = []
+
+    def draw(self) -> int:
+        if not self.bag:
+            self.bag = list(range(self.size))
+            self.rng.shuffle(self.bag)
+            # The bag is drawn from the end; don't start a cycle with the previous draw
+            if self.size > 1 and self.bag[-1] == self.last:
+                self.bag[0], self.bag[-1] = self.bag[-1], self.bag[0]
+        self.last = self.bag.pop()
+        return self.last
+
+
+class ConceptIndex:
+    """Per-session view: shared presets plus this session's custom concepts."""
+
+    def __init__(self, presets, custom_weight: float = 1.0, rng: random.Random | None = None):
+        self.presets = presets
+        self.custom_weight = custom_weight  # sampling weight of a custom concept relative to a preset one
+        self.rng = rng or random.Random()
+        self._custom: dict[str, list[str]] = {}
+        self._positions: dict[str, dict[str, int]] = {}
+        self._bags: dict[str, ShuffleBag] = {}
+
+    # --- custom concepts ---
+
+    def add(self, topic: str, concept: str) -> bool:
+        """Add a custom concept. Returns False if it was already there."""
+        positions = self._positions.setdefault(topic, {})
+        if concept in positions:
+            return False
+        items = self._custom.setdefault(topic, [])
+        positions[concept] = len(items)
+        items.append(concept)
+        self._invalidate(topic)
+        return True
+
+    def remove(self, topic: str, concept: str) -> bool:
+        """Remove a custom concept in O(1) by swapping the last one into its slot."""
+        positions = self._positions.get(topic, {})
+        i = positions.pop(concept, None)
+        if i is None:
+            return False
+        items = self._custom[topic]
+        last = items.pop()
+        if i < len(items):
+            items[i] = last
+            positions[last] = i
+        self._invalidate(topic)
+        return True
+
+    def custom(self, topic: str) -> list[str]:
+        """This session's custom concepts for ``topic`` (do not mutate)."""
+        return self._custom.get(topic, [])
+
+    def custom_topics(self) -> dict[str, list[str]]:
+        return {t: list(c) for t, c in self._custom.items() if c}
+
+    def counts(self, topic: str) -> tuple[int, int]:
+        """(preset, custom) concept counts for ``topic``."""
+        return len(self.presets.get(topic)), len(self._custom.get(topic, ()))
+
+    # --- sampling ---
+
+    def sample(self, topic: str, no_repeat: bool = False) -> str | None:
+        """Pick a concept for ``topic``; None if it has none.
+
+        Weighted sampling treats preset and custom concepts as one virtual array
+        without building it. With ``no_repeat`` a per-topic shuffle bag is used
+        instead, so each concept comes up once per cycle.
+        """
+        preset = self.presets.get(topic)
+        custom = self._custom.get(topic, ())
+        n_preset, n_custom = len(preset), len(custom)
+        if not n_preset and not n_custom:
+            return None
+        if no_repeat:
+            bag = self._bags.get(topic)
+            if bag is None:
+                bag = self._bags[topic] = ShuffleBag(self.rng)
+            if bag.size != n_preset + n_custom:
+                # Presets can change under us when the bank is hot-reloaded
+                bag.reset(n_preset + n_custom)
+            i = bag.draw()
+            return preset[i] if i < n_preset else custom[i - n_preset]
+        if not n_preset:
+            return custom[self.rng.randrange(n_custom)]
+        w = self.custom_weight if n_custom else 0.0
+        r = self.rng.random() * (n_preset + w * n_custom)
+        if r < n_preset:
+            return preset[int(r)]
+        return custom[min(n_custom - 1, int((r - n_preset) / w))]
+
+    def _invalidate(self, topic: str):
+        bag = self._bags.get(topic)
+        if bag is not None:
+            bag.reset(sum(self.counts(topic)))
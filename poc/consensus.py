@@ -0,0 +1,244 @@
+"""Multi-rater consensus scoring.
+
+With ``CONSENSUS_RATERS`` set, ``scoring.score_explanation`` sends each
+attempt to every rater at once — a route name or model id, optionally with
+a temperature, e.g. ``large:0,large:0.7,small:1`` — and combines their
+per-dimension and overall scores with a median or a trimmed mean
+(``CONSENSUS_AGGREGATE``). As results come in, once ``CONSENSUS_MIN_AGREE``
+of them agree within ``CONSENSUS_TOLERANCE`` points on every score, the
+other raters are cancelled: queued calls never start and streaming ones are
+closed at their next event. An invalid ``CONSENSUS_RATERS`` is reported on
+stderr and ignored.
+
+Rater calls from every session share one pool of ``CONSENSUS_CONCURRENCY``
+threads (one semaphore per event loop for the async path), so a burst of
+consensus scores queues instead of multiplying API concurrency. The combined
+result keeps the feedback of the rater closest to the consensus and carries
+a ``consensus`` entry with the raters' overall scores and per-score variance.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from routing import ROUTES
+from score_parser import clamp_score, grade_for
+from streaming import DIMENSIONS
+
+CONSENSUS_RATERS = os.environ.get("CONSENSUS_RATERS", "")  # empty: one routed call per score
+# "median" or "trimmed" (mean without the CONSENSUS_TRIM fraction at each end)
+AGGREGATE = os.environ.get("CONSENSUS_AGGREGATE", "median").lower()
+TRIM = float(os.environ.get("CONSENSUS_TRIM", "0.2"))
+# Stop once this many raters agree within TOLERANCE points on every score
+MIN_AGREE = int(os.environ.get("CONSENSUS_MIN_AGREE", "2"))
+TOLERANCE = float(os.environ.get("CONSENSUS_TOLERANCE", "1.0"))
+# Rater calls in flight per process, across every session
+CONCURRENCY = int(os.environ.get("CONSENSUS_CONCURRENCY", "8"))
+
+SCORES = ["overall", *DIMENSIONS]
+
+
+class Cancelled(Exception):
+    """Raised inside a rater's call once consensus has been reached without it."""
+
+
+@dataclass(frozen=True)
+class Rater:
+    name: str  # the route name, or the model id
+    model: str
+    max_tokens: int
+    temperature: float | None = None
+
+    @property
+    def route(self) -> str | None:
+        return self.name if self.name in ROUTES else None
+
+
+def parse_raters(spec: str) -> list[Rater]:
+    """Raters from a comma-separated ``name[:temperature]`` list; names that aren't routes are model ids."""
+    raters = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, temperature = item.rpartition(":")
+        if not sep:
+            name, temperature = item, ""
+        try:
+            value = float(temperature) if temperature else None
+        except ValueError:
+            raise ValueError(f"rater {item!r} has an invalid temperature") from None
+        if not name:
+            raise ValueError(f"rater {item!r} has no route or model")
+        route = ROUTES.get(name, ROUTES["large"])
+        raters.append(Rater(name, route["model"] if name in ROUTES else name, route["max_tokens"], value))
+    return raters
+
+
+try:
+    RATERS = parse_raters(CONSENSUS_RATERS)
+except ValueError as e:
+    # Every entry point imports this through ``scoring``; a typo here shouldn't take them all down
+    print(f"Ignoring CONSENSUS_RATERS: {e}; scoring with one routed call", file=sys.stderr)
+    RATERS = []
+
+
+def signature(raters: list[Rater], method: str = AGGREGATE) -> str:
+    """Identifies a consensus setup in score-cache keys."""
+    return "consensus:" + method + ":" + ",".join(f"{r.model}@{r.temperature}" for r in raters)
+
+
+def scores(result: dict) -> list[float]:
+    """Overall then dimension scores of a result, in ``SCORES`` order."""
+    return [result["overall"]["score"], *(result[dim]["score"] for dim in DIMENSIONS)]
+
+
+def aggregate(values: list[float], method: str = AGGREGATE, trim: float = TRIM) -> float:
+    if method == "trimmed":
+        values = sorted(values)
+        k = min(int(len(values) * trim), (len(values) - 1) // 2)
+        return statistics.fmean(values[k:len(values) - k])
+    return statistics.median(values)
+
+
+def agree(results: list[dict], tolerance: float = TOLERANCE) -> bool:
+    """Whether every score of ``results`` lies within ``tolerance`` points across raters."""
+    columns = zip(*(scores(result) for result in results))
+    return all(max(column) - min(column) <= tolerance for column in columns)
+
+
+def combine(results: list[dict], method: str = AGGREGATE) -> tuple[dict, dict]:
+    """The consensus result and its statistics.
+
+    Scores are aggregated per dimension and overall; the feedback, summary and
+    model explanation come from the rater whose scores are closest to them.
+    """
+    rows = [scores(result) for result in results]
+    combined = [clamp_score(aggregate(list(column), method)) for column in zip(*rows)]
+    closest = min(range(len(results)), key=lambda i: sum((a - b) ** 2 for a, b in zip(rows[i], combined)))
+    base = results[closest]
+    result = {
+        **base,
+        **{dim: {**base[dim], "score": score} for dim, score in zip(DIMENSIONS, combined[1:])},
+        "overall": {**base["overall"], "score": combined[0], "grade": grade_for(combined[0])},
+    }
+    variance = {
+        name: round(statistics.pvariance(column), 3) for name, column in zip(SCORES, zip(*rows))
+    }
+    return result, {"method": method, "scores": [row[0] for row in rows], "variance": variance,
+                    "representative": closest}
+
+
+def _merge(timings: list[dict]) -> dict:
+    usage = {}
+    for timing in timings:
+        for kind, n in (timing.get("usage") or {}).items():
+            usage[kind] = usage.get(kind, 0) + n
+    merged = {"usage": usage}
+    repairs = [timing["repair"] for timing in timings if timing.get("repair")]
+    if repairs:
+        merged["repair"] = repairs[0]
+    return merged
+
+
+def _finish(raters: list[Rater], done: list[tuple[Rater, dict, dict]], errors: list[Exception],
+            started: float, first: float | None, method: str) -> tuple[dict, dict]:
+    if not done:
+        raise errors[0] if errors else RuntimeError("every consensus rater was cancelled")
+    result, info = combine([result for _, result, _ in done], method)
+    info.update(
+        raters=[rater.name for rater, _, _ in done],
+        requested=len(raters),
+        stopped_early=len(done) + len(errors) < len(raters),
+        failed=len(errors),
+        representative=done[info["representative"]][0].name,
+    )
+    timing = {**_merge([timing for _, _, timing in done]),
+              "first_score_s": first, "total_s": time.perf_counter() - started}
+    return {**result, "consensus": info}, timing
+
+
+def run(rate, raters: list[Rater], min_agree: int = MIN_AGREE, tolerance: float = TOLERANCE,
+        method: str = AGGREGATE) -> tuple[dict, dict]:
+    """Call ``rate(rater, cancelled)`` for every rater on the shared pool and combine the results.
+
+    ``rate`` returns (result, timing), or None once the ``cancelled`` event is
+    set. Failed raters are left out; the call fails only if all of them do.
+    """
+    cancelled = threading.Event()
+    started = time.perf_counter()
+    futures = {get_rater_pool().submit(rate, rater, cancelled): rater for rater in raters}
+    done, errors, first = [], [], None
+    try:
+        for future in as_completed(futures):
+            try:
+                rated = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if rated is None:
+                continue
+            first = first if first is not None else time.perf_counter() - started
+            done.append((futures[future], *rated))
+            if len(done) >= min_agree and agree([result for _, result, _ in done], tolerance):
+                break
+    finally:
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+    return _finish(raters, done, errors, started, first, method)
+
+
+async def arun(rate, raters: list[Rater], min_agree: int = MIN_AGREE, tolerance: float = TOLERANCE,
+               method: str = AGGREGATE) -> tuple[dict, dict]:
+    """Async ``run``: ``rate(rater)`` is a coroutine function; raters still running at consensus are cancelled."""
+    budget = _async_budget()
+    started = time.perf_counter()
+
+    async def limited(rater):
+        async with budget:
+            return rater, await rate(rater)
+
+    tasks = [asyncio.ensure_future(limited(rater)) for rater in raters]
+    done, errors, first = [], [], None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                rater, rated = await next_done
+            except Exception as e:
+                errors.append(e)
+                continue
+            first = first if first is not None else time.perf_counter() - started
+            done.append((rater, *rated))
+            if len(done) >= min_agree and agree([result for _, result, _ in done], tolerance):
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return _finish(raters, done, errors, started, first, method)
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_budgets: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # event loop -> its semaphore
+
+
+def get_rater_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for rater calls; its size is the consensus concurrency budget."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="rater")
+    return _pool
+
+
+def _async_budget() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    budget = _budgets.get(loop)
+    if budget is None:
+        budget = _budgets[loop] = asyncio.Semaphore(CONCURRENCY)
+    return budget
@@ -0,0 +1,177 @@
+"""Near-duplicate detection over past explanations.
+
+Each explanation is embedded locally as a signed, hashed bag of character
+4-grams of its normalized text (NumPy, no model or network), L2-normalized so
+a dot product is cosine similarity. Past attempts are kept per
+(concept, audience, timer band) in fixed-size matrices, and the model
+explanations shown with their results per concept, so a lookup is two
+small matrix-vector products.
+
+``scoring`` uses a lookup to reuse the score of a near-identical earlier
+attempt by the same (named) user, anchor the model on a similar one by anyone, and
+flag explanations copied from an earlier result's ``model_explanation``.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+ENABLED = os.environ.get("DEDUP", "1").lower() not in ("0", "false", "no")
+DIM_BITS = 10
+DIM = 1 << DIM_BITS
+MAX_PER_KEY = int(os.environ.get("DEDUP_MAX_PER_KEY", "500"))
+REUSE_THRESHOLD = float(os.environ.get("DEDUP_REUSE", "0.97"))
+ANCHOR_THRESHOLD = float(os.environ.get("DEDUP_ANCHOR", "0.85"))
+COPY_THRESHOLD = float(os.environ.get("DEDUP_COPY", "0.9"))
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+# Multiplicative hashing constants (Knuth; murmur3 finalizer)
+_BUCKET_MUL = np.uint32(2654435761)
+_SIGN_MUL = np.uint32(2246822519)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_ALNUM.sub(" ", text.lower()).split())
+
+
+def embed(text: str) -> np.ndarray:
+    """Unit-length float32 vector of ``DIM`` signed 4-gram hash counts (all zeros for very short text)."""
+    b = np.frombuffer(normalize(text).encode(), dtype=np.uint8).astype(np.uint32)
+    if len(b) < 4:
+        return np.zeros(DIM, dtype=np.float32)
+    grams = (b[:-3] << 24) | (b[1:-2] << 16) | (b[2:-1] << 8) | b[3:]
+    buckets = (grams * _BUCKET_MUL) >> np.uint32(32 - DIM_BITS)
+    signs = ((grams * _SIGN_MUL) >> np.uint32(31)).astype(np.float32) * 2 - 1
+    v = np.bincount(buckets, weights=signs, minlength=DIM).astype(np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class VectorSet:
+    """Up to ``capacity`` vectors with payloads; the oldest is overwritten when full."""
+
+    def __init__(self, capacity: int = MAX_PER_KEY):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(capacity, 16), DIM), dtype=np.float32)
+        self.payloads: list = []
+        self.added = 0
+
+    def add(self, vector: np.ndarray, payload):
+        n = len(self.payloads)
+        if n < self.capacity:
+            if n == len(self.vectors):
+                grown = np.zeros((min(self.capacity, n * 2), DIM), dtype=np.float32)
+                grown[:n] = self.vectors
+                self.vectors = grown
+            self.vectors[n] = vector
+            self.payloads.append(payload)
+        else:
+            slot = self.added % self.capacity
+            self.vectors[slot] = vector
+            self.payloads[slot] = payload
+        self.added += 1
+
+    def nearest(self, vector: np.ndarray, accept=None) -> tuple[float, object]:
+        """(cosine similarity, payload) of the closest vector whose payload passes ``accept`` (any if None);
+        (0.0, None) if there is none."""
+        n = len(self.payloads)
+        if not n:
+            return 0.0, None
+        sims = self.vectors[:n] @ vector
+        if accept is not None:
+            mask = np.fromiter((accept(p) for p in self.payloads), dtype=bool, count=n)
+            if not mask.any():
+                return 0.0, None
+            sims = np.where(mask, sims, -np.inf)
+        i = int(np.argmax(sims))
+        return float(sims[i]), self.payloads[i]
+
+
+class DedupIndex:
+    """Process-wide index of scored explanations and the model explanations returned with them."""
+
+    def __init__(self, max_per_key: int = MAX_PER_KEY):
+        self.max_per_key = max_per_key
+        self._answers: dict[tuple, VectorSet] = {}
+        self._models: dict[str, VectorSet] = {}
+        # Hashes of the model explanations already indexed per concept, oldest first
+        self._model_texts: dict[str, OrderedDict[int, None]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(concept: str, audience: str, band: str) -> tuple[tuple, str]:
+        c = normalize(concept)
+        return (c, normalize(audience), band), c
+
+    def lookup(self, concept: str, audience: str, band: str, explanation: str, user: str = "") -> dict:
+        """Closest earlier attempt by ``user`` (``similarity``, its ``result``), closest by anyone
+        (``anchor_similarity``, ``anchor``) and ``model_similarity``.
+
+        Anonymous attempts (an empty ``user``) are never matched as the same user's.
+        """
+        vector = embed(explanation)
+        answer_key, model_key = self._keys(concept, audience, band)
+        with self._lock:
+            answers, models = self._answers.get(answer_key), self._models.get(model_key)
+            anchor_similarity, anchor = answers.nearest(vector) if answers else (0.0, None)
+            similarity, own = anchor_similarity, anchor
+            if not user:
+                similarity, own = 0.0, None
+            elif anchor is not None and anchor[0] != user:
+                similarity, own = answers.nearest(vector, lambda payload: payload[0] == user)
+            model_similarity, _ = models.nearest(vector) if models else (0.0, None)
+        # Payloads are (user, result)
+        return {"similarity": similarity, "result": own[1] if own else None,
+                "anchor_similarity": anchor_similarity, "anchor": anchor[1] if anchor else None,
+                "model_similarity": model_similarity}
+
+    def add(self, concept: str, audience: str, band: str, explanation: str, result: dict, user: str = ""):
+        """Index ``user``'s scored attempt and the model explanation they were shown with it."""
+        answer_key, model_key = self._keys(concept, audience, band)
+        vector = embed(explanation)
+        model_text = result.get("model_explanation") or ""
+        with self._lock:
+            # Cached references repeat the same model explanation for every attempt at a concept
+            seen = self._model_texts.setdefault(model_key, OrderedDict())
+            if hash(model_text) in seen:
+                model_text = ""
+            seen[hash(model_text)] = None
+            if len(seen) > self.max_per_key:
+                seen.popitem(last=False)
+        model_vector = embed(model_text) if model_text else None
+        with self._lock:
+            answers = self._answers.get(answer_key)
+            if answers is None:
+                answers = self._answers[answer_key] = VectorSet(self.max_per_key)
+            answers.add(vector, (user, result))
+            if model_vector is not None:
+                models = self._models.get(model_key)
+                if models is None:
+                    models = self._models[model_key] = VectorSet(self.max_per_key)
+                models.add(model_vector, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys": len(self._answers),
+                "explanations": sum(len(s.payloads) for s in self._answers.values()),
+                "model_explanations": sum(len(s.payloads) for s in self._models.values()),
+            }
+
+
+_index: DedupIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex | None:
+    """Process-wide index singleton, or None when ``DEDUP=0``."""
+    global _index
+    if not ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DedupIndex()
+    return _index
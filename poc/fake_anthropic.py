@@ -0,0 +1,323 @@
+"""Local stand-in for the Anthropic Messages API, for offline tests and benchmarks.
+
+Serves ``POST /v1/messages`` (plain and ``"stream": true`` SSE) with a
+deterministic, well-formed score, plus the Message Batches endpoints
+(create, retrieve, results, cancel); a batch ends ``--batch-delay`` seconds
+after it is created. Latency, error rates and 429/529 responses
+are configurable so the batch runner's retry and rate limiting can be
+exercised without a key or network access.
+
+    python fake_anthropic.py --port 8765 --latency 0.5 --rate-limit 0.1
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 python batch_score.py in.jsonl out.jsonl
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_score(seed_text: str, noise: random.Random | None = None, temperature: float = 0.0) -> dict:
+    """A schema-valid score derived from a hash of the request, so reruns agree.
+
+    With a ``temperature`` above 0, ``noise`` moves each dimension score by
+    about that many points, like a sampled rater.
+    """
+    rng = random.Random(hashlib.sha256(seed_text.encode()).digest())
+    dims = {
+        name: {"score": rng.randint(3, 9), "feedback": f"Fake {name} feedback. Deterministic for this input."}
+        for name in ["clarity", "accuracy", "structure", "completeness", "conciseness"]
+    }
+    if noise is not None and temperature > 0:
+        for dim in dims.values():
+            dim["score"] = min(10, max(1, dim["score"] + round(noise.gauss(0, temperature))))
+    weights = {"clarity": 0.25, "accuracy": 0.25, "structure": 0.2, "completeness": 0.15, "conciseness": 0.15}
+    overall = round(sum(dims[k]["score"] * w for k, w in weights.items()), 1)
+    grade = "A" if overall >= 8.5 else "B" if overall >= 7 else "C" if overall >= 5.5 else "D" if overall >= 4 else "F"
+    return {
+        **dims,
+        "overall": {
+            "score": overall,
+            "grade": grade,
+            "summary": "Fake overall summary from the local test server.",
+            "strengths": ["Deterministic output"],
+            "improvements": ["Use a real model"],
+        },
+        "model_explanation": "A fake reference explanation. " * 8,
+    }
+
+
+class FakeConfig:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, overloaded_rate: float = 0.0, chunk_size: int = 24,
+                 seed: int | None = None, batch_delay: float = 1.0, truncate_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.overloaded_rate = overloaded_rate
+        self.truncate_rate = truncate_rate
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.responses: dict[int, int] = {}
+        self.batch_delay = batch_delay
+        self.batches: dict[str, dict] = {}
+        self.cached_prefixes: set[str] = set()
+
+    def count(self, status: int):
+        with self.lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeConfig  # set on the subclass built by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        self.config.count(status)
+
+    def _send_error(self, status: int, kind: str, message: str, headers: dict | None = None):
+        self._send_json(status, {"type": "error", "error": {"type": kind, "message": message}}, headers)
+
+    def _sse(self, event: str, data: dict):
+        chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def _message(self, body: dict, message_id: str, truncate_at: float | None = None) -> dict:
+        messages = body.get("messages") or [{}]
+        system = body.get("system") or ""
+        if isinstance(system, list):
+            system = "".join(b.get("text", "") for b in system if isinstance(b, dict))
+        # Seeded on the attempt itself, so follow-up turns get the same score
+        with self.config.lock:
+            score = fake_score(json.dumps(messages[0], sort_keys=True), self.config.rng,
+                               body.get("temperature") or 0.0)
+        if "JSON" not in system:
+            text = score["model_explanation"].strip()  # a reference-answer request (warm_references)
+        else:
+            if '"model_explanation"' not in system:
+                del score["model_explanation"]  # the rubric variant used with a cached reference
+            text = json.dumps(score, indent=2)
+        stop_reason = "end_turn"
+        prefill = messages[-1].get("content") if messages[-1].get("role") == "assistant" else None
+        if isinstance(prefill, str) and text.startswith(prefill):
+            text = text[len(prefill):]
+        elif truncate_at is not None:
+            text = text[:int(len(text) * truncate_at)]
+            stop_reason = "max_tokens"
+        # Mimic prompt caching: cache_control system blocks are written once, then read
+        cached_prefix = "".join(
+            b.get("text", "") for b in body.get("system", []) if isinstance(b, dict) and b.get("cache_control")
+        )
+        with self.config.lock:
+            seen = cached_prefix in self.config.cached_prefixes
+            self.config.cached_prefixes.add(cached_prefix)
+        prefix_tokens = len(cached_prefix) // 4
+        usage = {
+            "input_tokens": (len(json.dumps(body)) - len(cached_prefix)) // 4,
+            "output_tokens": len(text) // 4,
+            "cache_creation_input_tokens": 0 if seen else prefix_tokens,
+            "cache_read_input_tokens": prefix_tokens if seen else 0,
+        }
+        return {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        }
+
+    def _batch_view(self, batch: dict) -> dict:
+        cfg = self.config
+        ended = batch["cancelled"] or time.time() - batch["created"] >= cfg.batch_delay
+        n = len(batch["requests"])
+        created = datetime.fromtimestamp(batch["created"], timezone.utc)
+        counts = {"processing": 0 if ended else n, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if ended:
+            counts["canceled" if batch["cancelled"] else "succeeded"] = n
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "canceling" if batch["cancelled"] else "in_progress",
+            "request_counts": counts,
+            "created_at": created.isoformat(),
+            "expires_at": (created + timedelta(hours=24)).isoformat(),
+            "ended_at": datetime.now(timezone.utc).isoformat() if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"http://{self.headers.get('host')}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def _batch_results(self, batch: dict):
+        lines = []
+        for request in batch["requests"]:
+            if batch["cancelled"]:
+                result = {"type": "canceled"}
+            else:
+                result = {"type": "succeeded", "message": self._message(request["params"], f"msg_{request['custom_id']}")}
+            lines.append(json.dumps({"custom_id": request["custom_id"], "result": result}))
+        body = ("\n".join(lines) + "\n").encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/binary")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.config.count(200)
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        with self.config.lock:
+            self.config.requests += 1
+        if parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4:
+            batch = self.config.batches.get(parts[3])
+            if batch is None:
+                self._send_error(404, "not_found_error", f"No batch {parts[3]}")
+            elif len(parts) == 5 and parts[4] == "results":
+                if self._batch_view(batch)["processing_status"] != "ended":
+                    self._send_error(400, "invalid_request_error", "Batch has not ended")
+                else:
+                    self._batch_results(batch)
+            else:
+                self._send_json(200, self._batch_view(batch))
+            return
+        self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+
+    def do_POST(self):
+        cfg = self.config
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        with cfg.lock:
+            cfg.requests += 1
+            roll = cfg.rng.random()
+            delay = cfg.latency + cfg.rng.uniform(0, cfg.jitter)
+
+        path = self.path.split("?")[0]
+        if path == "/v1/messages/batches":
+            with cfg.lock:
+                batch_id = f"msgbatch_fake_{len(cfg.batches) + 1}"
+                batch = {"id": batch_id, "requests": body.get("requests", []), "created": time.time(), "cancelled": False}
+                cfg.batches[batch_id] = batch
+            self._send_json(200, self._batch_view(batch))
+            return
+        if path.startswith("/v1/messages/batches/") and path.endswith("/cancel"):
+            batch = cfg.batches.get(path.split("/")[4])
+            if batch is None:
+                self._send_error(404, "not_found_error", "No such batch")
+                return
+            batch["cancelled"] = True
+            self._send_json(200, self._batch_view(batch))
+            return
+        if path != "/v1/messages":
+            self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+            return
+        time.sleep(delay)
+        if roll < cfg.rate_limit_rate:
+            self._send_error(429, "rate_limit_error", "Fake rate limit", {"retry-after": "0"})
+            return
+        roll -= cfg.rate_limit_rate
+        if roll < cfg.overloaded_rate:
+            self._send_error(529, "overloaded_error", "Fake overload")
+            return
+        roll -= cfg.overloaded_rate
+        if roll < cfg.error_rate:
+            self._send_error(500, "api_error", "Fake internal error")
+            return
+        roll -= cfg.error_rate
+        truncate_at = roll / cfg.truncate_rate if roll < cfg.truncate_rate else None
+
+        message = self._message(body, f"msg_fake_{cfg.requests}", truncate_at)
+        if not body.get("stream"):
+            self._send_json(200, message)
+            return
+
+        text = message["content"][0]["text"]
+        usage = message["usage"]
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        self._sse("message_start", {"type": "message_start", "message": {
+            **message, "content": [], "stop_reason": None,
+            "usage": {**usage, "output_tokens": 1}}})
+        self._sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                          "content_block": {"type": "text", "text": ""}})
+        for i in range(0, len(text), cfg.chunk_size):
+            self._sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                              "delta": {"type": "text_delta", "text": text[i:i + cfg.chunk_size]}})
+        self._sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._sse("message_delta", {"type": "message_delta",
+                                    "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                    "usage": {"output_tokens": usage["output_tokens"]}})
+        self._sse("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        cfg.count(200)
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-stream (cancelled consensus raters) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, config: FakeConfig | None = None) -> ThreadingHTTPServer:
+    """Build (but don't start) a fake server. Port 0 picks a free port."""
+    handler = type("Handler", (FakeAnthropicHandler,), {"config": config or FakeConfig()})
+    return FakeServer((host, port), handler)
+
+
+def serve_in_thread(config: FakeConfig | None = None) -> tuple[ThreadingHTTPServer, str]:
+    """Start a fake server on a free port in a daemon thread. Returns (server, base_url)."""
+    server = make_server(config=config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 500 responses")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument("--overloaded", type=float, default=0.0, help="Fraction of 529 responses")
+    parser.add_argument("--truncate", type=float, default=0.0, help="Fraction of responses cut short (max_tokens)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds until a message batch ends")
+    args = parser.parse_args()
+    config = FakeConfig(args.latency, args.jitter, args.error_rate, args.rate_limit, args.overloaded,
+                        seed=args.seed, batch_delay=args.batch_delay, truncate_rate=args.truncate)
+    server = make_server(args.host, args.port, config)
+    print(f"Fake Anthropic API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
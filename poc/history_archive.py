@@ -0,0 +1,575 @@
+"""Compact binary export and import of attempt history.
+
+An archive is an 8-byte header (magic, version, codec) followed by blocks of
+up to ``ARCHIVE_BLOCK_RECORDS`` attempts. Each block is stored column by
+column — user, topic, prompt, timer, each dimension's score and feedback,
+summary, model explanation, ... — with fixed-width lengths and scores in
+tenths instead of repeated JSON keys, then compressed as a unit (gzip, zstd
+or none) behind a CRC32 of its uncompressed bytes. Similar text sits
+together, so it compresses well. Whatever doesn't fit a column (extra entry
+fields, extra ``full_score`` keys, unexpected types) goes to a JSON column,
+so any history entry round-trips.
+
+Readers are generators that hold one block in memory at a time, and a
+writer opened with ``append=True`` adds blocks to an existing archive. A
+corrupt or malformed input of any kind raises ``ValueError``, and an import
+is checked entry by entry and stored all or nothing.
+
+    python history_archive.py export history.tfh --user <id>        # one user, or every user
+    python history_archive.py import history.tfh --user <id>
+    python history_archive.py from-web thinkfast_attempts.json history.tfh --user <id>
+    python history_archive.py cat history.tfh | head                  # JSONL
+
+``from-web`` converts the web app's ``thinkfast_attempts`` localStorage
+value (in the browser console: ``copy(localStorage.getItem("thinkfast_attempts"))``)
+without loading the whole array.
+"""
+import argparse
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from itertools import accumulate, islice
+
+from history_store import HistoryStore, get_history_store
+from streaming import DIMENSIONS
+
+MAGIC = b"TFHA"
+VERSION = 2  # 2: blocks carry a CRC32 of their uncompressed bytes
+CODECS = {"none": 0, "gzip": 1, "zstd": 2}
+BLOCK_RECORDS = int(os.environ.get("ARCHIVE_BLOCK_RECORDS", "1000"))
+
+HEADER = struct.Struct("<4sBBH")  # magic, version, codec, reserved
+BLOCK = struct.Struct("<III")  # stored payload length, records, CRC32 of the uncompressed block
+NONE = 0xFFFFFFFF
+NO_SCORE = 0xFFFF
+FLOAT_SCORE = 0x8000  # set on scores that were floats, so 7.0 and 7 both come back as they went in
+
+ENTRY_COLUMNS = [
+    ("user", "str"), ("topic", "str"), ("prompt", "str"), ("concept", "str"), ("audience", "str"),
+    ("timer", "int"), ("time_used", "int"), ("words", "int"), ("score", "score"), ("grade", "str"),
+    ("timestamp", "str"), ("route", "str"), ("explanation", "str"),
+]
+OVERALL_COLUMNS = [
+    ("score", "score"), ("grade", "str"), ("summary", "str"), ("strengths", "strs"), ("improvements", "strs"),
+]
+SCORE_COLUMNS = [
+    *[((dim, part), kind) for dim in DIMENSIONS for part, kind in (("score", "score"), ("feedback", "str"))],
+    *[(("overall", part), kind) for part, kind in OVERALL_COLUMNS],
+    (("model_explanation",), "str"),
+]
+# Entry fields without a column; full_score keys without a column, or the whole full_score if it has another shape
+EXTRA_COLUMNS = [("extra", "json"), ("score_extra", "json")]
+KINDS = [kind for _, kind in ENTRY_COLUMNS + SCORE_COLUMNS + EXTRA_COLUMNS]
+_ENTRY_NAMES = {name for name, _ in ENTRY_COLUMNS}
+_SCORE_KEYS = {*DIMENSIONS, "overall", "model_explanation"}
+_OVERALL_KEYS = {part for part, _ in OVERALL_COLUMNS}
+_DIMENSION_KEYS = {"score", "feedback"}
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _fits_score(value) -> bool:
+    return type(value) in (int, float) and 0 <= value * 10 < FLOAT_SCORE and round(value * 10) / 10 == value
+
+
+def _fits(kind: str, value) -> bool:
+    if kind == "str":
+        return isinstance(value, str)
+    if kind == "int":
+        return type(value) is int and 0 <= value < NONE
+    if kind == "score":
+        return _fits_score(value)
+    if kind == "strs":
+        return isinstance(value, list) and all(isinstance(v, str) for v in value)
+    return True
+
+
+def _score_row(full) -> list | None:
+    """``full_score`` values in ``SCORE_COLUMNS`` order, or None if it doesn't have the scorer's shape."""
+    if not isinstance(full, dict):
+        return None
+    overall = full.get("overall")
+    if not isinstance(overall, dict) or overall.keys() != _OVERALL_KEYS:
+        return None
+    row = []
+    for dim in DIMENSIONS:
+        part = full.get(dim)
+        if (not isinstance(part, dict) or part.keys() != _DIMENSION_KEYS or not _fits_score(part["score"])
+                or not isinstance(part["feedback"], str)):
+            return None
+        row += (part["score"], part["feedback"])
+    overall_row = [overall[part] for part, _ in OVERALL_COLUMNS]
+    if not all(_fits(kind, value) for (_, kind), value in zip(OVERALL_COLUMNS, overall_row)):
+        return None
+    row += overall_row
+    model_explanation = full.get("model_explanation")
+    if "model_explanation" in full and not isinstance(model_explanation, str):
+        return None
+    row.append(model_explanation)
+    return row
+
+
+def flatten(entry: dict) -> list:
+    """One archive row (``KINDS`` order) for a history entry."""
+    row, extra = [], {}
+    for name, kind in ENTRY_COLUMNS:
+        value = entry.get(name)
+        if (value is not None and not _fits(kind, value)) or (value is None and name in entry):
+            extra[name] = value
+            value = None
+        row.append(value)
+    for key, value in entry.items():
+        if key not in _ENTRY_NAMES and key not in ("id", "full_score"):
+            extra[key] = value
+    full = entry.get("full_score")
+    if full is None and "full_score" in entry:
+        extra["full_score"] = None
+    scores = _score_row(full)
+    if scores is None:
+        row += [None] * len(SCORE_COLUMNS)
+        score_extra = full
+    else:
+        row += scores
+        score_extra = {k: v for k, v in full.items() if k not in _SCORE_KEYS} or None
+    return row + [extra or None, score_extra]
+
+
+def unflatten(row: list) -> dict:
+    """The history entry of an archive row."""
+    entry = {name: value for (name, _), value in zip(ENTRY_COLUMNS, row) if value is not None}
+    scores = row[len(ENTRY_COLUMNS):len(ENTRY_COLUMNS) + len(SCORE_COLUMNS)]
+    extra, score_extra = row[-2:]
+    if scores[0] is None:
+        full = score_extra
+    else:
+        full = {dim: {"score": scores[2 * i], "feedback": scores[2 * i + 1]} for i, dim in enumerate(DIMENSIONS)}
+        base = 2 * len(DIMENSIONS)
+        full["overall"] = {part: scores[base + i] for i, (part, _) in enumerate(OVERALL_COLUMNS)}
+        if scores[-1] is not None:
+            full["model_explanation"] = scores[-1]
+        full.update(score_extra or {})
+    if full is not None:
+        entry["full_score"] = full
+    if extra:
+        entry.update(extra)
+    return entry
+
+
+# --- column codecs ---
+
+def _u32(values) -> bytes:
+    a = array("I", values)
+    if not _LITTLE_ENDIAN:
+        a.byteswap()
+    return a.tobytes()
+
+
+def _read_array(typecode: str, data: bytes | memoryview, n: int, pos: int) -> tuple[array, int]:
+    a = array(typecode)
+    end = pos + n * a.itemsize
+    a.frombytes(data[pos:end])
+    if not _LITTLE_ENDIAN:
+        a.byteswap()
+    return a, end
+
+
+def _encode_strs(values: list) -> bytes:
+    """Lengths in code points (``NONE`` for None), then all the text as one UTF-8 string."""
+    present = [v for v in values if v is not None]
+    text = "".join(present).encode("utf-8", "surrogatepass")
+    return _u32([NONE if v is None else len(v) for v in values]) + text
+
+
+def _decode_strs(data: bytes | memoryview, n: int) -> list:
+    lengths, pos = _read_array("I", data, n, 0)
+    text = bytes(data[pos:]).decode("utf-8", "surrogatepass")
+    ends = accumulate(0 if length == NONE else length for length in lengths)
+    return [None if length == NONE else text[end - length:end] for length, end in zip(lengths, ends)]
+
+
+def _encode_column(kind: str, values: list) -> bytes:
+    if kind == "str":
+        return _encode_strs(values)
+    if kind == "int":
+        return _u32([NONE if v is None else v for v in values])
+    if kind == "score":
+        a = array("H", [NO_SCORE if v is None else round(v * 10) | (FLOAT_SCORE if type(v) is float else 0)
+                        for v in values])
+        if not _LITTLE_ENDIAN:
+            a.byteswap()
+        return a.tobytes()
+    if kind == "strs":
+        counts = _u32([NONE if v is None else len(v) for v in values])
+        return counts + _encode_strs([s for v in values if v is not None for s in v])
+    return _encode_strs([None if v is None else json.dumps(v, separators=(",", ":")) for v in values])
+
+
+def _decode_column(kind: str, data: memoryview, n: int) -> list:
+    if kind == "str":
+        return _decode_strs(data, n)
+    if kind == "int":
+        return [None if v == NONE else v for v in _read_array("I", data, n, 0)[0]]
+    if kind == "score":
+        return [None if v == NO_SCORE else (v ^ FLOAT_SCORE) / 10 if v & FLOAT_SCORE else v // 10
+                for v in _read_array("H", data, n, 0)[0]]
+    if kind == "strs":
+        counts, pos = _read_array("I", data, n, 0)
+        items = _decode_strs(data[pos:], sum(c for c in counts if c != NONE))
+        ends = list(accumulate(0 if c == NONE else c for c in counts))
+        return [None if c == NONE else items[end - c:end] for c, end in zip(counts, ends)]
+    return [None if v is None else json.loads(v) for v in _decode_strs(data, n)]
+
+
+def encode_block(entries: list[dict]) -> bytes:
+    """Uncompressed columnar block: each column as a u32 byte length and its bytes."""
+    rows = [flatten(entry) for entry in entries]
+    parts = []
+    for kind, values in zip(KINDS, zip(*rows)):
+        column = _encode_column(kind, list(values))
+        parts += [struct.pack("<I", len(column)), column]
+    return b"".join(parts)
+
+
+def decode_block(data: bytes, n: int) -> list[dict]:
+    """Entries of an uncompressed block; ValueError if it is corrupt."""
+    view, pos, columns = memoryview(data), 0, []
+    try:
+        for kind in KINDS:
+            (length,) = struct.unpack_from("<I", view, pos)
+            pos += 4
+            column = _decode_column(kind, view[pos:pos + length], n)
+            if pos + length > len(view) or len(column) != n:
+                raise ValueError(f"{kind} column has {len(column)} of {n} values")
+            columns.append(column)
+            pos += length
+        return [unflatten(list(row)) for row in zip(*columns)]
+    except Exception as e:  # struct.error, bad UTF-8 or JSON, mismatched columns, ...
+        raise ValueError(f"corrupt history archive block: {e}") from e
+
+
+def _zstd():
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.compress, zstd.decompress
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd archives need Python 3.14+ or the zstandard package") from None
+    return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+
+
+def _compressor(codec: int):
+    if codec == CODECS["gzip"]:
+        return lambda data: zlib.compress(data, 6)
+    if codec == CODECS["zstd"]:
+        return _zstd()[0]
+    return bytes
+
+
+def _decompressor(codec: int):
+    if codec == CODECS["gzip"]:
+        return zlib.decompress
+    if codec == CODECS["zstd"]:
+        return _zstd()[1]
+    return bytes
+
+
+# --- files ---
+
+def _read_header(f) -> int:
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("not a history archive (file too short)")
+    magic, version, codec, _ = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("not a history archive")
+    if version != VERSION or codec not in CODECS.values():
+        raise ValueError(f"unsupported history archive (version {version}, codec {codec})")
+    return codec
+
+
+class ArchiveWriter:
+    """Buffers entries and writes them a compressed block at a time.
+
+    ``file`` is a path or a binary file object. With ``append=True`` an
+    existing archive is extended (keeping its codec); a new or empty one is
+    started otherwise.
+    """
+
+    def __init__(self, file, codec: str = "gzip", append: bool = False, block_records: int = BLOCK_RECORDS):
+        self._owned = isinstance(file, (str, os.PathLike))
+        if self._owned:
+            mode = "r+b" if append and os.path.exists(file) and os.path.getsize(file) else "wb"
+            file = open(file, mode)
+        self.f = file
+        self.block_records = block_records
+        self.records = 0
+        self._buffer: list[dict] = []
+        if append and self.f.seekable() and self.f.seek(0, os.SEEK_END):
+            self.f.seek(0)
+            self.codec = _read_header(self.f)
+            self.f.seek(0, os.SEEK_END)
+        else:
+            self.codec = CODECS[codec]
+            self.f.write(HEADER.pack(MAGIC, VERSION, self.codec, 0))
+        self._compress = _compressor(self.codec)
+
+    def write(self, entry: dict):
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.block_records:
+            self.flush()
+
+    def write_many(self, entries) -> int:
+        """Write every entry of an iterable. Returns how many."""
+        n = 0
+        for entry in entries:
+            self.write(entry)
+            n += 1
+        return n
+
+    def flush(self):
+        """Write the buffered entries as one block."""
+        if not self._buffer:
+            return
+        data = encode_block(self._buffer)
+        payload = self._compress(data)
+        self.f.write(BLOCK.pack(len(payload), len(self._buffer), zlib.crc32(data)) + payload)
+        self.f.flush()
+        self.records += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_archive(file):
+    """Yield the entries of an archive (path or binary file object) in order, one block in memory at a time."""
+    f = open(file, "rb") if isinstance(file, (str, os.PathLike)) else file
+    try:
+        decompress = _decompressor(_read_header(f))
+        while header := f.read(BLOCK.size):
+            if len(header) < BLOCK.size:
+                raise ValueError("truncated history archive")
+            length, n, crc = BLOCK.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                raise ValueError("truncated history archive")
+            try:
+                data = decompress(payload)
+            except Exception as e:  # zlib.error, ZstdError
+                raise ValueError(f"corrupt history archive block: {e}") from e
+            if zlib.crc32(data) != crc:
+                raise ValueError("corrupt history archive block: checksum mismatch")
+            yield from decode_block(data, n)
+    finally:
+        if f is not file:
+            f.close()
+
+
+def is_archive(f) -> bool:
+    """Whether a seekable binary file starts with the archive magic (the position is kept)."""
+    pos = f.tell()
+    magic = f.read(len(MAGIC))
+    f.seek(pos)
+    return magic == MAGIC
+
+
+# --- history store and web app ---
+
+def export_history(store: HistoryStore, file, user: str | None = None, codec: str = "gzip",
+                   append: bool = False) -> int:
+    """Write ``user``'s attempts (every user's if None), oldest first. Returns how many."""
+    with ArchiveWriter(file, codec, append) as writer:
+        return writer.write_many(store.iter_attempts(user))
+
+
+def check_entry(entry) -> dict:
+    """``entry`` if it has every field the history store needs, else ValueError."""
+    if not isinstance(entry, dict):
+        raise ValueError(f"expected an attempt object, got {type(entry).__name__}")
+    for name in ("topic", "prompt", "timestamp"):
+        if not isinstance(entry.get(name), str) or not entry[name]:
+            raise ValueError(f"attempt without a {name}")
+    for name, low in (("timer", 1), ("time_used", 0)):
+        value = entry.get(name)
+        if type(value) not in (int, float) or value < low:
+            raise ValueError(f"attempt with an invalid {name}: {value!r}")
+    if not isinstance(entry.get("explanation", ""), str):
+        raise ValueError("attempt with a non-text explanation")
+    if not isinstance(entry.get("full_score", {}), dict | None):
+        raise ValueError("attempt with a malformed full_score")
+    return entry
+
+
+def import_history(store: HistoryStore, entries, user: str | None = None) -> int:
+    """Add entries to ``store`` under ``user`` (default: each entry's own ``user``). Returns how many.
+
+    Every entry is checked as it is read, in a single transaction: on any
+    error (ValueError) nothing is imported.
+    """
+    def owned():
+        for i, entry in enumerate(entries, 1):
+            try:
+                check_entry(entry)
+                owner = user or entry.get("user")
+                if not owner:
+                    raise ValueError("attempt without a user; pass one")
+            except ValueError as e:
+                raise ValueError(f"attempt {i}: {e}") from None
+            yield owner, {k: v for k, v in entry.items() if k != "user"}
+
+    return store.add_many(owned())
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20):
+    """Yield the items of a JSON array read from a text file, without loading the whole array."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    started = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if not started and pos < len(buf):
+            if buf[pos] != "[":
+                raise ValueError("expected a JSON array")
+            started, pos = True, pos + 1
+            continue
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos) if pos < len(buf) else (None, None)
+        except json.JSONDecodeError:
+            end = None
+        # An item is complete once something follows it (a number could go on in the next chunk)
+        if end is not None and (end < len(buf) or eof):
+            yield item
+            pos = end
+            continue
+        if eof:
+            raise ValueError("truncated JSON array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+
+def web_attempt(attempt: dict) -> dict:
+    """History entry for one attempt of the web app's ``thinkfast_attempts`` (ValueError if malformed)."""
+    if not isinstance(attempt, dict):
+        raise ValueError(f"expected an attempt object, got {type(attempt).__name__}")
+    prompt = attempt.get("prompt") or {}
+    score = attempt.get("score") or {}
+    if not isinstance(prompt, dict) or not isinstance(score, dict):
+        raise ValueError("attempt with a malformed prompt or score")
+    score = dict(score)
+    if "modelExplanation" in score:
+        score["model_explanation"] = score.pop("modelExplanation")
+    overall = score.get("overall") if isinstance(score.get("overall"), dict) else {}
+    entry = {
+        "topic": prompt.get("topic"),
+        "prompt": prompt.get("text"),
+        "concept": prompt.get("concept", ""),
+        "audience": prompt.get("audienceLabel") or prompt.get("audience", ""),
+        "explanation": attempt.get("explanation", ""),
+        "words": attempt.get("wordCount"),
+        "timer": attempt.get("timerDuration"),
+        "time_used": attempt.get("timeUsed"),
+        "score": overall.get("score"),
+        "grade": overall.get("grade"),
+        "full_score": score,
+        "timestamp": attempt.get("createdAt"),
+        "web_id": attempt.get("id"),
+    }
+    if prompt.get("difficulty"):
+        entry["difficulty"] = prompt["difficulty"]
+    return {k: v for k, v in entry.items() if v is not None}
+
+
+def web_to_archive(f, writer: ArchiveWriter, user: str) -> int:
+    """Convert a ``thinkfast_attempts`` JSON array (newest first, as the web app keeps it) into
+    ``writer``, oldest first. Returns how many attempts.
+
+    The array is read item by item into uncompressed blocks in a temporary
+    file, which are then written out last block first, so only one block of
+    attempts is in memory at a time.
+    """
+    items = iter_json_array(f)
+    blocks = []  # (offset, length, attempts)
+    with tempfile.TemporaryFile() as tmp:
+        while batch := [{"user": user, **check_entry(web_attempt(a))} for a in islice(items, writer.block_records)]:
+            block = encode_block(batch)
+            blocks.append((tmp.tell(), len(block), len(batch)))
+            tmp.write(block)
+        for offset, length, n in reversed(blocks):
+            tmp.seek(offset)
+            writer.write_many(reversed(decode_block(tmp.read(length), n)))
+    return sum(n for _, _, n in blocks)
+
+
+def import_file(store: HistoryStore, f, user: str) -> int:
+    """Import an archive or a ``thinkfast_attempts`` JSON file (binary, seekable) as ``user``'s attempts."""
+    if is_archive(f):
+        return import_history(store, read_archive(f), user)
+    text = io.TextIOWrapper(f, encoding="utf-8-sig")
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            writer = ArchiveWriter(tmp, "none")
+            web_to_archive(text, writer, user)
+            writer.flush()
+            tmp.seek(0)
+            return import_history(store, read_archive(tmp), user)
+    finally:
+        text.detach()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and import attempt history as compact binary archives")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write the history store to an archive")
+    export.add_argument("archive")
+    export.add_argument("--user", help="Only this user's attempts (default: every user)")
+    export.add_argument("--append", action="store_true", help="Add to an existing archive")
+    imp = sub.add_parser("import", help="Add an archive's attempts to the history store")
+    imp.add_argument("archive")
+    imp.add_argument("--user", help="Import under this user (default: each attempt's own)")
+    web = sub.add_parser("from-web", help="Convert the web app's thinkfast_attempts JSON to an archive")
+    web.add_argument("json_file")
+    web.add_argument("archive")
+    web.add_argument("--user", required=True)
+    web.add_argument("--append", action="store_true", help="Add to an existing archive")
+    cat = sub.add_parser("cat", help="Print an archive as JSONL")
+    cat.add_argument("archive")
+    for p in (export, web):
+        p.add_argument("--codec", choices=list(CODECS), default="gzip")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        n = export_history(get_history_store(), args.archive, args.user, args.codec, args.append)
+    elif args.command == "import":
+        n = import_history(get_history_store(), read_archive(args.archive), args.user)
+    elif args.command == "from-web":
+        with open(args.json_file, encoding="utf-8") as f, ArchiveWriter(args.archive, args.codec, args.append) as w:
+            n = web_to_archive(f, w, args.user)
+    else:
+        n = 0
+        for entry in read_archive(args.archive):
+            sys.stdout.write(json.dumps(entry) + "\n")
+            n += 1
+    print(json.dumps({"command": args.command, "attempts": n}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Durable attempt history in SQLite (WAL mode).
+
+Summary columns (topic, prompt, times, score, grade, timestamp) live in
+``attempts`` and are what the sidebar pages through. The large per-attempt
+blobs (``explanation``, the ``full_score`` JSON and any extra per-attempt
+fields such as timing and token usage) live in ``attempt_blobs`` and are only
+read when asked for.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable
+
+HISTORY_DB = os.environ.get("HISTORY_DB", "thinkfast_history.sqlite3")
+
+SUMMARY_COLUMNS = ["id", "user", "topic", "prompt", "timer", "time_used", "score", "grade", "timestamp"]
+BLOB_FIELDS = ["explanation", "full_score"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    timer INTEGER NOT NULL,
+    time_used INTEGER NOT NULL,
+    score REAL,
+    grade TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempt_blobs (
+    attempt_id INTEGER PRIMARY KEY REFERENCES attempts(id) ON DELETE CASCADE,
+    explanation TEXT NOT NULL,
+    full_score TEXT NOT NULL,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS attempts_user_time ON attempts (user, timestamp);
+CREATE INDEX IF NOT EXISTS attempts_user_topic_time ON attempts (user, topic, timestamp);
+"""
+
+
+class HistoryStore:
+    """Attempt history for all users of a process (or of every process sharing the file)."""
+
+    def __init__(self, path: str = HISTORY_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, user: str, entry: dict) -> int:
+        """Store one history entry (the dict the app used to append). Returns its id."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                attempt_id = self._insert(user, entry)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return attempt_id
+
+    def add_many(self, items: Iterable[tuple[str, dict]]) -> int:
+        """Store (user, entry) pairs in one transaction: all of them, or none if anything fails
+        (including ``items`` raising). Returns how many were stored."""
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for user, entry in items:
+                    self._insert(user, entry)
+                    added += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def _insert(self, user: str, entry: dict) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO attempts (user, topic, prompt, timer, time_used, score, grade, timestamp)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (user, entry["topic"], entry["prompt"], entry["timer"], entry["time_used"],
+             entry.get("score"), entry.get("grade"), entry["timestamp"]),
+        )
+        meta = {k: v for k, v in entry.items() if k not in SUMMARY_COLUMNS and k not in BLOB_FIELDS}
+        self._conn.execute(
+            "INSERT INTO attempt_blobs (attempt_id, explanation, full_score, meta) VALUES (?, ?, ?, ?)",
+            (cur.lastrowid, entry.get("explanation", ""), json.dumps(entry.get("full_score") or {}),
+             json.dumps(meta)),
+        )
+        return cur.lastrowid
+
+    def update_score(self, attempt_id: int, full_score: dict):
+        """Replace an attempt's score after an explicit re-score."""
+        overall = full_score.get("overall", {})
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "UPDATE attempts SET score = ?, grade = ? WHERE id = ?",
+                    (overall.get("score"), overall.get("grade"), attempt_id),
+                )
+                self._conn.execute(
+                    "UPDATE attempt_blobs SET full_score = ? WHERE attempt_id = ?",
+                    (json.dumps(full_score), attempt_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count(self, user: str, topic: str | None = None) -> int:
+        sql, params = "SELECT COUNT(*) FROM attempts WHERE user = ?", [user]
+        if topic is not None:
+            sql += " AND topic = ?"
+            params.append(topic)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def page(self, user: str, limit: int = 10, offset: int = 0, topic: str | None = None,
+             include_blobs: bool = False) -> list[dict]:
+        """Newest-first page of attempts. Summary columns only unless ``include_blobs``."""
+        columns = ", ".join(f"a.{c}" for c in SUMMARY_COLUMNS)
+        sql = f"SELECT {columns}"
+        if include_blobs:
+            sql += ", b.explanation, b.full_score, b.meta FROM attempts a JOIN attempt_blobs b ON b.attempt_id = a.id"
+        else:
+            sql += " FROM attempts a"
+        sql += " WHERE a.user = ?"
+        params: list = [user]
+        if topic is not None:
+            sql += " AND a.topic = ?"
+            params.append(topic)
+        sql += " ORDER BY a.timestamp DESC, a.id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row(r) for r in rows]
+
+    def iter_attempts(self, user: str | None, batch_size: int = 500, include_blobs: bool = True):
+        """Yield every attempt for ``user`` (every user if None) oldest-first, a page at a time."""
+        last_id = 0
+        columns = ", ".join(f"a.{c}" for c in SUMMARY_COLUMNS)
+        blob_sql = ", b.explanation, b.full_score, b.meta" if include_blobs else ""
+        join_sql = " JOIN attempt_blobs b ON b.attempt_id = a.id" if include_blobs else ""
+        user_sql = " AND a.user = ?" if user is not None else ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {columns}{blob_sql} FROM attempts a{join_sql}"
+                    f" WHERE a.id > ?{user_sql} ORDER BY a.id LIMIT ?",
+                    (last_id, *([user] if user is not None else []), batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield self._row(r)
+            last_id = rows[-1]["id"]
+
+    def recent(self, limit: int = 1000) -> list[dict]:
+        """Newest ``limit`` attempts across every user, with blobs (to seed in-memory indexes)."""
+        columns = ", ".join(f"a.{c}" for c in SUMMARY_COLUMNS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns}, b.explanation, b.full_score, b.meta FROM attempts a"
+                " JOIN attempt_blobs b ON b.attempt_id = a.id ORDER BY a.id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def get(self, attempt_id: int, include_blobs: bool = True) -> dict | None:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM attempts WHERE id = ?", (attempt_id,)
+            ).fetchall()
+        if not rows:
+            return None
+        entry = self._row(rows[0])
+        if include_blobs:
+            entry.update(self.blobs(attempt_id))
+        return entry
+
+    def blobs(self, attempt_id: int) -> dict:
+        """Lazily load the explanation and full score of one attempt."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT explanation, full_score, meta FROM attempt_blobs WHERE attempt_id = ?", (attempt_id,)
+            ).fetchone()
+        if row is None:
+            return {}
+        return self._row(row)
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        if "full_score" in entry:
+            entry["full_score"] = json.loads(entry["full_score"])
+        if "meta" in entry:
+            entry.update(json.loads(entry.pop("meta")))
+        return entry
+
+
+_store: HistoryStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide store singleton."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
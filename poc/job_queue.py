@@ -0,0 +1,186 @@
+"""Durable scoring job queue in SQLite (WAL mode).
+
+The app submits a job per attempt and polls it; ``scoring_worker.py``
+processes claim jobs, score them and write the result back. Nothing else is
+shared between them, so the app and the workers can be restarted
+independently and a job in flight survives either.
+
+A claimed job holds a lease that its worker renews while scoring; a worker
+that dies mid-job lets the lease lapse and another worker picks the job up
+again, up to ``MAX_ATTEMPTS`` times. Only the worker holding an unexpired
+lease can record the job's result, so a reclaimed job is never written twice.
+Jobs never contain API keys: workers use their own ``ANTHROPIC_API_KEY``.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+JOB_QUEUE_DB = os.environ.get("JOB_QUEUE_DB", "thinkfast_jobs.sqlite3")
+LEASE_S = float(os.environ.get("JOB_LEASE_S", "120"))
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL_S = float(os.environ.get("JOB_TTL_S", str(7 * 24 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,            -- queued | running | done | failed
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    acked INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    """Jobs shared by every process that opens the same file."""
+
+    def __init__(self, path: str = JOB_QUEUE_DB, lease_s: float = LEASE_S, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, payload: dict) -> bool:
+        """Queue a job. Returns False if ``job_id`` already exists (submitting is idempotent)."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, status, payload, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(payload), now, now),
+            )
+        return cur.rowcount == 1
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row is not None else None
+
+    def position(self, job_id: str) -> int:
+        """Queued jobs ahead of this one (0 once it is running or finished)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                " AND created < (SELECT created FROM jobs WHERE id = ? AND status = 'queued')",
+                (job_id,),
+            ).fetchone()
+        return row[0]
+
+    def claim(self, worker: str) -> dict | None:
+        """Lease the oldest runnable job to ``worker``, or None if there is none."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died on their last allowed attempt
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'worker lease expired', updated = ?"
+                    " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND lease_until < ?) ORDER BY created LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,"
+                    " lease_until = ?, updated = ? WHERE id = ?",
+                    (worker, now + self.lease_s, now, row["id"]),
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row(job)
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extend ``worker``'s lease on a running job. False if the lease has lapsed or moved on."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ?"
+                " WHERE id = ? AND status = 'running' AND worker = ? AND lease_until > ?",
+                (now + self.lease_s, now, job_id, worker, now),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        """Record the result if ``worker`` still holds the lease. Returns whether it was recorded."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated = ?"
+                " WHERE id = ? AND status = 'running' AND worker = ? AND lease_until > ?",
+                (json.dumps(result), now, job_id, worker, now),
+            )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str, retry: bool = False) -> bool:
+        """Record a failure if ``worker`` still holds the lease; a retryable one goes back on the queue
+        until ``max_attempts``. Returns whether it was recorded."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END,"
+                " error = ?, lease_until = NULL, updated = ?"
+                " WHERE id = ? AND status = 'running' AND worker = ? AND lease_until > ?",
+                (retry, self.max_attempts, error, now, job_id, worker, now),
+            )
+        return cur.rowcount == 1
+
+    def ack(self, job_id: str):
+        """Mark a finished job's result as recorded by the app, so it isn't restored again."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET acked = 1 WHERE id = ?", (job_id,))
+
+    def prune(self, max_age_s: float = JOB_TTL_S) -> int:
+        """Delete finished jobs older than ``max_age_s``. Returns how many were removed."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (time.time() - max_age_s,)
+            )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+_queue: JobQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide queue singleton."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
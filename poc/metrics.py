@@ -0,0 +1,242 @@
+"""Process-wide metrics in the Prometheus text format, plus a per-attempt log.
+
+Counters and histograms are kept in memory and exposed by either or both of:
+
+- ``METRICS_PORT``: a stdlib HTTP server answering ``GET /metrics``
+- ``METRICS_FILE``: a file rewritten every ``METRICS_DUMP_S`` seconds (for a
+  node-exporter textfile collector); ``{pid}`` in the name is replaced by the
+  process id, so each scoring worker can write its own file
+
+``ATTEMPT_LOG`` appends one JSON line per scored attempt. Lines carry ids,
+timings, token counts and scores only; API keys are never logged and the
+explanation text is only included with ``ATTEMPT_LOG_TEXT=1``.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_DUMP_S = float(os.environ.get("METRICS_DUMP_S", "15"))
+ATTEMPT_LOG = os.environ.get("ATTEMPT_LOG", "")
+ATTEMPT_LOG_TEXT = os.environ.get("ATTEMPT_LOG_TEXT", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 16, 20, 30, 45, 60)
+PARSE_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+SCORE_SECONDS = Histogram(
+    "thinkfast_score_seconds", "End-to-end scoring time per attempt", ("route", "source"))
+FIRST_SCORE_SECONDS = Histogram(
+    "thinkfast_first_score_seconds", "Time until the first streamed dimension score", ("route",))
+PARSE_SECONDS = Histogram(
+    "thinkfast_parse_seconds", "Time to parse and validate one scorer response", buckets=PARSE_BUCKETS)
+TOKENS = Counter(
+    "thinkfast_tokens_total", "Tokens billed for scoring", ("route", "kind"))
+SCORES = Counter(
+    "thinkfast_scores_total", "Scored attempts by where the result came from", ("source",))
+SCORE_ERRORS = Counter(
+    "thinkfast_score_errors_total", "Failed scoring calls by exception class", ("error",))
+REPAIRS = Counter(
+    "thinkfast_score_repairs_total", "Follow-up calls made to repair a scorer response", ("kind",))
+ESCALATIONS = Counter(
+    "thinkfast_score_escalations_total", "Small-route results re-scored by the large model", ("reason",))
+RERUNS = Counter(
+    "thinkfast_reruns_total", "Streamlit script runs by phase", ("phase",))
+RESCORES = Counter(
+    "thinkfast_rescores_total", "Explicit re-scores requested from the results page")
+DEDUP = Counter(
+    "thinkfast_dedup_total", "Near-duplicate index hits: reused, anchored or copied", ("outcome",))
+
+METRICS = [SCORE_SECONDS, FIRST_SCORE_SECONDS, PARSE_SECONDS, TOKENS, SCORES, SCORE_ERRORS,
+           REPAIRS, ESCALATIONS, RERUNS, RESCORES, DEDUP]
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def score_source(timing: dict) -> str:
+    """Where a ``scoring.score_explanation`` result came from, from its timing dict."""
+    if timing.get("prescored"):
+        return "prescore"
+    if timing.get("reused"):
+        return "reuse"
+    return "cache" if timing.get("cached") else "model"
+
+
+def record_score(timing: dict):
+    """Record one successful ``scoring.score_explanation`` call from its timing dict."""
+    source = score_source(timing)
+    route = timing.get("route", "")
+    SCORES.inc(source=source)
+    SCORE_SECONDS.observe(timing.get("total_s", 0.0), route=route, source=source)
+    if timing.get("first_score_s") is not None and source == "model":
+        FIRST_SCORE_SECONDS.observe(timing["first_score_s"], route=route)
+    for kind, n in (timing.get("usage") or {}).items():
+        TOKENS.inc(n, route=route, kind=kind.removesuffix("_tokens"))
+    if timing.get("repair"):
+        REPAIRS.inc(kind=timing["repair"])
+    if timing.get("escalated"):
+        ESCALATIONS.inc(reason=timing["escalated"])
+
+
+def record_error(error: Exception):
+    SCORE_ERRORS.inc(error=type(error).__name__)
+
+
+# --- attempt log ---
+
+_log_lock = threading.Lock()
+
+
+def log_attempt(record: dict, explanation: str = ""):
+    """Append one attempt to ``ATTEMPT_LOG`` (no-op if unset)."""
+    if not ATTEMPT_LOG:
+        return
+    line = {"ts": datetime.now().isoformat(timespec="seconds"), **record}
+    if ATTEMPT_LOG_TEXT:
+        line["explanation"] = explanation
+    with _log_lock, open(ATTEMPT_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(line, default=str) + "\n")
+
+
+# --- exporters ---
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def dump(path: str):
+    """Write the current metrics to ``path`` atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_exporters(port: int = METRICS_PORT, path: str = METRICS_FILE, interval: float = METRICS_DUMP_S):
+    """Start the configured exporters once per process. Returns the HTTP server, if any."""
+    global _started
+    with _start_lock:
+        if _started:
+            return None
+        _started = True
+    server = None
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        except OSError:
+            server = None  # another process on this host already serves the port
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    if path:
+        path = path.replace("{pid}", str(os.getpid()))
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    dump(path)
+                except OSError:
+                    pass
+
+        threading.Thread(target=loop, daemon=True, name="metrics-dump").start()
+    return server
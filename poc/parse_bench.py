@@ -0,0 +1,141 @@
+"""Fuzz corpus and parse-time microbenchmark for ``score_parser``.
+
+Builds a deterministic corpus of scorer outputs (fenced, with preambles and
+trailing prose, stray braces, odd score types, cut off at many offsets),
+checks the parser's invariants on every case, and times parsing against the
+old ``index``/``rindex`` + ``json.loads`` approach.
+
+    python parse_bench.py                       # fuzz + benchmark
+    python parse_bench.py --write-corpus c.jsonl
+    python parse_bench.py --corpus c.jsonl      # re-check a saved corpus
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import score_parser
+from fake_anthropic import fake_score
+
+PREAMBLES = ["", "Here is my evaluation:\n\n", "Sure! Scores use {1-10}.\n", "```json\n", "Evaluation {draft}: "]
+TRAILERS = ["", "\n```", "\n\nLet me know if you want more detail.", "\n```\nNote: {weights} as specified.", " }"]
+
+
+def legacy_parse(text: str) -> dict:
+    json_match = text[text.index("{"):text.rindex("}") + 1]
+    return json.loads(json_match)
+
+
+def _noisy(rng: random.Random, base: dict) -> dict:
+    """A copy of a fake score with awkward but legal content."""
+    out = json.loads(json.dumps(base))
+    dim = rng.choice(list(score_parser.WEIGHTS))
+    kind = rng.randrange(5)
+    if kind == 0:
+        out[dim]["feedback"] = 'Uses "quotes", {braces} and [brackets] \\ slashes, café, 👍.'
+    elif kind == 1:
+        out[dim]["score"] = rng.choice(["7", "8/10", 12, 0, -3, 7.25])
+    elif kind == 2:
+        del out["overall"]["score"]
+        del out["overall"]["grade"]
+    elif kind == 3:
+        del out[dim]["feedback"]
+    return out
+
+
+def build_corpus(n: int, seed: int = 0) -> list[dict]:
+    """Cases: {"kind", "text", "expect"}; ``expect`` is the complete JSON body a case was made from."""
+    rng = random.Random(seed)
+    cases = []
+    for i in range(n):
+        base = _noisy(rng, fake_score(f"case-{seed}-{i}"))
+        body = json.dumps(base, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+        text = rng.choice(PREAMBLES) + body + rng.choice(TRAILERS)
+        cases.append({"kind": "whole", "text": text, "expect": body})
+        cut = rng.randrange(1, len(body))
+        preamble = rng.choice(PREAMBLES)
+        cases.append({"kind": "truncated", "text": preamble + body[:cut], "expect": body, "body_at": len(preamble)})
+    cases += [
+        {"kind": "garbage", "text": "", "expect": None},
+        {"kind": "garbage", "text": "I can't evaluate this explanation.", "expect": None},
+        {"kind": "garbage", "text": "{not json at all}", "expect": None},
+        {"kind": "garbage", "text": "[1, 2, 3]", "expect": None},
+    ]
+    return cases
+
+
+def check(case: dict) -> str | None:
+    """Invariant violation for one case, or None."""
+    try:
+        parsed = score_parser.parse(case["text"])
+    except Exception as e:  # noqa: BLE001 - any exception is a fuzz failure
+        return f"raised {type(e).__name__}: {e}"
+    if parsed.result is not None:
+        scores = [d.score for d in parsed.result.dimensions.values()] + [parsed.result.score]
+        if not all(1 <= s <= 10 for s in scores):
+            return f"unclamped score in {scores}"
+    expect = case["expect"]
+    if case["kind"] == "whole":
+        if parsed.raw != json.loads(expect):
+            return "whole response not extracted exactly"
+    elif case["kind"] == "truncated":
+        if parsed.raw is not None and not parsed.truncated:
+            return "truncated response not flagged"
+        # A continuation that prefills the cut-off text must yield the full object
+        prefix = case["text"].rstrip()
+        done = prefix[case["body_at"]:]
+        full = score_parser.parse(prefix + expect[len(done):])
+        if full.raw != json.loads(expect):
+            return "continuation did not reassemble"
+    elif parsed.raw is not None:
+        return "extracted an object from garbage"
+    return None
+
+
+def bench(texts: list[str], fn, repeat: int) -> float:
+    """Mean microseconds per call of ``fn`` over ``texts``."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            try:
+                fn(text)
+            except ValueError:
+                pass
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the scorer output parser")
+    parser.add_argument("--cases", type=int, default=2000, help="Base responses to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", help="Check a saved JSONL corpus instead of generating one")
+    parser.add_argument("--write-corpus", help="Save the generated corpus as JSONL")
+    parser.add_argument("--repeat", type=int, default=5, help="Benchmark passes over the corpus")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            cases = [json.loads(line) for line in f if line.strip()]
+    else:
+        cases = build_corpus(args.cases, args.seed)
+    if args.write_corpus:
+        with open(args.write_corpus, "w", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+    failures = [(case, err) for case in cases if (err := check(case)) is not None]
+    for case, err in failures[:10]:
+        print(f"FAIL {case['kind']}: {err}\n  {case['text'][:200]!r}", file=sys.stderr)
+    print(f"fuzz: {len(cases)} cases, {len(failures)} failures")
+
+    for kind in ("whole", "truncated"):
+        texts = [c["text"] for c in cases if c["kind"] == kind]
+        new = bench(texts, score_parser.parse, args.repeat)
+        old = bench(texts, legacy_parse, args.repeat)
+        print(f"{kind:>9}: score_parser {new:7.1f} µs/parse   legacy {old:7.1f} µs/parse   ({len(texts)} texts)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
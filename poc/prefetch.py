@@ -0,0 +1,139 @@
+"""Speculative preparation of the next practice prompt.
+
+While the results page is on screen, the session's ``Prefetcher`` picks the
+prompts that "Try Again (Same Topic)" and "Generate Prompt" would produce and
+prepares what scoring them will need (today: the reference explanation,
+which also opens a pooled connection) on a small shared thread pool. Taking a
+prefetched prompt is instant.
+
+Each kind of transition keeps at most ``PREFETCH_DEPTH`` prompts. Prefetched
+prompts are tied to a context (topics, persona, timer): when it changes they
+are cancelled; work already sent to the API finishes, and its result
+stays in the reference cache.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from reference_cache import get_reference_cache, stores_from
+from scoring import time_band
+from warm_references import build_reference_request
+
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", "1"))
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "4"))
+
+
+@dataclass
+class PrefetchedPrompt:
+    kind: str  # "same_topic" | "new_topic"
+    topic: str
+    prompt: str
+    concept: str
+    audience: str
+    timer_duration: int
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    future: Future | None = None
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+def prepare_reference(client, item: PrefetchedPrompt) -> bool:
+    """Make sure a reference explanation for ``item`` is cached. Returns whether one was generated."""
+    cache = get_reference_cache()
+    band = time_band(item.timer_duration)
+    if (cache is None or not stores_from(client) or item.cancelled.is_set()
+            or cache.get(item.concept, item.audience, band) is not None):
+        return False
+    message = client.messages.create(**build_reference_request(item.concept, item.topic, item.audience, band))
+    text = message.content[0].text.strip()
+    if text:
+        cache.set(item.concept, item.audience, band, text)
+    return bool(text)
+
+
+class Prefetcher:
+    """Per-session set of prepared next prompts."""
+
+    def __init__(self, depth: int = PREFETCH_DEPTH):
+        self.depth = depth
+        self.context: tuple | None = None
+        self._items: list[PrefetchedPrompt] = []
+        self.prepared = 0
+        self.used = 0
+        self.cancelled = 0
+
+    def update(self, context: tuple, timer_duration: int, wanted: list[tuple[str, str, str]], make_prompt,
+               client=None):
+        """Keep prefetched prompts for ``wanted`` (kind, topic, concept) in ``context``; cancel the rest.
+
+        ``make_prompt(topic, concept)`` returns (prompt, concept, audience) for
+        a new one; with a ``client`` its reference explanation is prepared in
+        the background. At most ``depth`` prompts are kept per kind.
+        """
+        if context != self.context:
+            self.cancel()
+            self.context = context
+        capped, per_kind = [], {}
+        for kind, topic, concept in wanted:
+            if concept and per_kind.get(kind, 0) < self.depth:
+                per_kind[kind] = per_kind.get(kind, 0) + 1
+                capped.append((kind, topic, concept))
+        keep = []
+        for item in self._items:
+            if (item.kind, item.topic, item.concept) in capped:
+                keep.append(item)
+            else:
+                item.cancel()
+                self.cancelled += 1
+        have = {(item.kind, item.topic, item.concept) for item in keep}
+        for kind, topic, concept in capped:
+            if (kind, topic, concept) in have:
+                continue
+            prompt, concept, audience = make_prompt(topic, concept)
+            item = PrefetchedPrompt(kind, topic, prompt, concept, audience, timer_duration)
+            if client is not None:
+                item.future = get_prefetch_pool().submit(prepare_reference, client, item)
+            keep.append(item)
+            self.prepared += 1
+        self._items = keep
+
+    def take(self, kind: str, context: tuple) -> PrefetchedPrompt | None:
+        """The first prefetched prompt of ``kind`` if it was prepared for ``context``."""
+        if context != self.context:
+            self.cancel()
+            return None
+        for i, item in enumerate(self._items):
+            if item.kind == kind:
+                self.used += 1
+                return self._items.pop(i)
+        return None
+
+    def cancel(self):
+        """Drop every prefetched prompt (topics, persona or timer changed)."""
+        for item in self._items:
+            item.cancel()
+        self.cancelled += len(self._items)
+        self._items = []
+
+    def stats(self) -> dict:
+        pending = sum(1 for item in self._items if item.future is not None and not item.future.done())
+        return {"ready": len(self._items) - pending, "pending": pending, "prepared": self.prepared,
+                "used": self.used, "cancelled": self.cancelled}
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_prefetch_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for prefetch work, separate from scoring so it never delays a score."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    return _pool
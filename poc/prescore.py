@@ -0,0 +1,135 @@
+"""Cheap local pre-scoring tier.
+
+Empty or near-empty (under ``MIN_WORDS``), pasted-prompt, repetitive or
+keyboard-mash explanations (typically auto-submitted at timer expiry) get a
+deterministic failing score in the same JSON shape as the LLM's, without an
+API call. Anything that is not obviously failing returns None and goes to the
+model as before, including terse answers that may well be right. The word-based checks
+only apply to text written mostly in ASCII letters; other scripts (Chinese,
+Japanese, ...) go to the model unless they are empty.
+
+The check runs on at most ``MAX_CHARS`` of the explanation and gives up (and
+defers to the model) if it exceeds ``CPU_BUDGET_S`` of CPU time.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+MIN_WORDS = 2
+MAX_CHARS = 8000
+CPU_BUDGET_S = 0.005
+
+_WORD = re.compile(r"[A-Za-z0-9']+")
+_VOWELS = set("aeiouyAEIOUY")
+_ASCII_LETTERS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+MIN_ASCII_RATIO = 0.8  # share of letters that must be ASCII for the word-based checks
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+FEEDBACK = {
+    "too_short": "The explanation is too short to evaluate.",
+    "copied_prompt": "The explanation mostly repeats the prompt instead of explaining the concept.",
+    "repetitive": "The explanation repeats the same few words instead of explaining the concept.",
+    "gibberish": "The explanation does not contain readable text.",
+}
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def stats() -> dict:
+    """Counters: ``checked``, ``avoided`` (LLM calls skipped), per-reason counts, ``over_budget``."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _syllables(word: str) -> int:
+    groups = re.findall(r"[aeiouy]+", word.lower())
+    return max(1, len(groups) - (1 if word.lower().endswith("e") and len(groups) > 1 else 0))
+
+
+def features(explanation: str, concept: str = "", prompt: str = "") -> dict:
+    """Lexical features of an explanation. Cheap: a few passes over at most MAX_CHARS."""
+    text = explanation[:MAX_CHARS]
+    tokens = _WORD.findall(text)
+    words = [w.lower() for w in tokens]
+    n = len(words)
+    unique = len(set(words))
+    concept_words = {w.lower() for w in _WORD.findall(concept) if len(w) > 2}
+    prompt_words = {w.lower() for w in _WORD.findall(prompt)}
+    # Acronyms (TCP, HTTPS) and tokens with digits (IPv4, 3NF) count as words
+    wordlike = sum(
+        1 for w in tokens
+        if w.isupper() or any(c.isdigit() for c in w)
+        or (any(c in _VOWELS for c in w) and len(w) <= 20 and not re.search(r"[^aeiouy\d']{6,}", w.lower()))
+    )
+    letters = [c for c in text if c.isalpha()]
+    sentences = max(1, len(re.findall(r"[.!?]+", text)))
+    syllables = sum(_syllables(w) for w in words)
+    return {
+        "word_count": len(explanation.split()),
+        "unique_ratio": unique / n if n else 0.0,
+        "repetition_ratio": 1 - unique / n if n else 0.0,
+        "concept_overlap": len(concept_words & set(words)) / len(concept_words) if concept_words else 0.0,
+        "prompt_copy_ratio": sum(1 for w in words if w in prompt_words) / n if n else 0.0,
+        "wordlike_ratio": wordlike / n if n else 0.0,
+        # Text without any letters counts as ASCII: it's unreadable in every script
+        "ascii_ratio": sum(1 for c in letters if c in _ASCII_LETTERS) / len(letters) if letters else 1.0,
+        # Flesch reading ease; only meaningful for a few sentences or more
+        "reading_ease": 206.835 - 1.015 * (n / sentences) - 84.6 * (syllables / n) if n else 0.0,
+    }
+
+
+def classify(f: dict, prompt_word_count: int) -> str | None:
+    """Reason an attempt obviously fails, or None if it should go to the model."""
+    if f["ascii_ratio"] < MIN_ASCII_RATIO:
+        # Words can't be told apart in scripts written without spaces
+        return "too_short" if f["word_count"] == 0 else None
+    if f["word_count"] < MIN_WORDS:
+        return "too_short"
+    if f["wordlike_ratio"] < 0.5:
+        return "gibberish"
+    if f["prompt_copy_ratio"] >= 0.9 and f["word_count"] <= prompt_word_count + 5:
+        return "copied_prompt"
+    if f["word_count"] >= 8 and f["unique_ratio"] < 0.3:
+        return "repetitive"
+    return None
+
+
+def failing_result(reason: str, f: dict) -> dict:
+    """A score in the scorer's JSON shape for an attempt that fails a local check."""
+    feedback = FEEDBACK[reason]
+    dims = {
+        name: {"score": 1, "feedback": feedback}
+        for name in ["clarity", "accuracy", "structure", "completeness", "conciseness"]
+    }
+    return {
+        **dims,
+        "overall": {
+            "score": 1,
+            "grade": "F",
+            "summary": f"{feedback} It was scored locally without calling the model.",
+            "strengths": [],
+            "improvements": ["Write a few complete sentences that explain the concept in your own words"],
+        },
+        "prescore": {"reason": reason, "features": {k: round(v, 3) for k, v in f.items()}},
+    }
+
+
+def prescore(explanation: str, concept: str = "", prompt: str = "") -> dict | None:
+    """Deterministic failing result for an obviously failing attempt, else None."""
+    _count("checked")
+    started = time.process_time()
+    f = features(explanation, concept, prompt)
+    if time.process_time() - started > CPU_BUDGET_S:
+        _count("over_budget")
+        return None
+    reason = classify(f, len(prompt.split()))
+    if reason is None:
+        return None
+    _count("avoided")
+    _count(reason)
+    return failing_result(reason, f)
@@ -0,0 +1,100 @@
+"""Practice prompt generation, independent of Streamlit.
+
+Static data (audiences, templates, timer options) is built once at import. ``generate_prompt``
+samples a concept from a ``ConceptIndex``; without one it falls back to the
+process-wide default bank.
+"""
+import functools
+import os
+import random
+
+from concept_bank import DEFAULT_BANK, ConceptBank
+from concept_index import ConceptIndex
+from scheduler import ConceptScheduler
+
+AUDIENCES = {
+    "a 10-year-old child": "child",
+    "a non-technical adult": "non-technical",
+    "a peer with similar expertise": "peer",
+    "a job interviewer": "interviewer",
+    "a business executive": "executive",
+}
+
+AUDIENCE_LABELS = tuple(AUDIENCES)
+
+MAX_PERSONA_LENGTH = 50  # Character limit for custom persona to prevent prompt injection
+
+PROMPT_TEMPLATES = [
+    "[{topic}] Explain {concept} to {audience}.",
+    "[{topic}] What is {concept} and why does it matter? Explain for {audience}.",
+    "[{topic}] Describe how {concept} works to {audience}.",
+    "[{topic}] Summarize {concept} in a way that {audience} would understand.",
+    "[{topic}] What are the most important things to know about {concept}? Explain for {audience}.",
+    "[{topic}] Walk through {concept} step by step for {audience}.",
+]
+
+TIMER_OPTIONS = {
+    "30 seconds": 30,
+    "60 seconds": 60,
+    "90 seconds": 90,
+    "120 seconds": 120,
+    "3 minutes": 180,
+    "5 minutes": 300,
+}
+
+
+@functools.cache
+def default_presets() -> ConceptBank:
+    """The ``CONCEPT_BANK`` bank, opened once per process."""
+    return ConceptBank(os.environ.get("CONCEPT_BANK", DEFAULT_BANK))
+
+
+def sanitize_persona(persona: str) -> str:
+    """Sanitize and validate custom persona input to prevent prompt injection."""
+    if not persona:
+        return ""
+
+    # Trim to max length
+    persona = persona[:MAX_PERSONA_LENGTH].strip()
+
+    # Remove special characters that could be used for injection
+    # Allow only letters, numbers, spaces, hyphens, and basic punctuation
+    allowed_chars = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 -,.'")
+    persona = "".join(c for c in persona if c in allowed_chars)
+
+    # Remove any newlines or control characters
+    persona = " ".join(persona.split())
+
+    return persona
+
+
+def generate_prompt(topic: str, custom_concept: str | None = None, custom_persona: str | None = None, concepts: ConceptIndex | None = None, no_repeat: bool = False, scheduler: ConceptScheduler | None = None, previous: str | None = None) -> tuple[str, str, str]:
+    """Generate a practice prompt. Returns (full_prompt, concept, audience_label).
+
+    With a ``scheduler`` (and ``concepts``) the concept is the most urgent one
+    for spaced repetition; ``no_repeat`` then only avoids ``previous``.
+    """
+    if custom_concept:
+        concept = custom_concept
+    elif scheduler is not None and concepts is not None:
+        concept = scheduler.next_concept(topic, concepts, avoid=previous if no_repeat else None)
+        if concept is None:
+            concept = f"a key concept from {topic}"
+    else:
+        concept = (concepts or ConceptIndex(default_presets())).sample(topic, no_repeat=no_repeat)
+        if concept is None:
+            concept = f"a key concept from {topic}"
+
+    # Use custom persona if provided and valid, otherwise random
+    if custom_persona:
+        sanitized = sanitize_persona(custom_persona)
+        if sanitized:
+            audience_label = sanitized
+        else:
+            audience_label = random.choice(AUDIENCE_LABELS)
+    else:
+        audience_label = random.choice(AUDIENCE_LABELS)
+
+    template = random.choice(PROMPT_TEMPLATES)
+    prompt = template.format(topic=topic, concept=concept, audience=audience_label)
+    return prompt, concept, audience_label
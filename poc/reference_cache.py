@@ -0,0 +1,107 @@
+"""Persistent cache of model explanations per (concept, audience, timer band).
+
+The reference answer shown with a score depends only on what was asked, not
+on the user's text, so it is generated once per triple and stored here.
+``scoring`` then asks the scorer for the scores alone, which cuts output
+tokens and latency. ``warm_references.py`` fills the cache ahead of time.
+
+    REFERENCE_CACHE=sqlite|off       (default sqlite)
+    REFERENCE_DB=thinkfast_references.sqlite3
+    REFERENCE_HOSTS=api.anthropic.com   (API hosts whose explanations are stored)
+
+Stored references are shown to every later user, so only explanations from
+``REFERENCE_HOSTS`` are kept, never ones from a fake server or test double.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+REFERENCE_BACKEND = os.environ.get("REFERENCE_CACHE", "sqlite").lower()
+REFERENCE_DB = os.environ.get("REFERENCE_DB", "thinkfast_references.sqlite3")
+REFERENCE_HOSTS = {h.strip() for h in os.environ.get("REFERENCE_HOSTS", "api.anthropic.com").split(",") if h.strip()}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_references (
+    concept TEXT NOT NULL,
+    audience TEXT NOT NULL,
+    band TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (concept, audience, band)
+);
+"""
+
+
+def _key(concept: str, audience: str, band: str) -> tuple[str, str, str]:
+    return " ".join(concept.lower().split()), " ".join(audience.lower().split()), band
+
+
+def stores_from(client) -> bool:
+    """Whether model explanations generated through ``client`` may be stored (its API host is trusted)."""
+    base_url = getattr(client, "base_url", None)
+    return getattr(base_url, "host", None) in REFERENCE_HOSTS
+
+
+class ReferenceCache:
+    """Model explanations in SQLite (WAL mode), shared by every process using the file."""
+
+    def __init__(self, path: str = REFERENCE_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, concept: str, audience: str, band: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM model_references WHERE concept = ? AND audience = ? AND band = ?",
+                _key(concept, audience, band),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, concept: str, audience: str, band: str, text: str, replace: bool = False):
+        """Store a reference; the first one stored for a triple wins unless ``replace``."""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.execute(
+                f"{verb} INTO model_references (concept, audience, band, text, created) VALUES (?, ?, ?, ?, ?)",
+                (*_key(concept, audience, band), text, time.time()),
+            )
+
+    def missing(self, keys: list[tuple[str, str, str]]) -> list[tuple[str, str, str]]:
+        """The (concept, audience, band) triples of ``keys`` with no stored reference."""
+        with self._lock:
+            have = set(self._conn.execute("SELECT concept, audience, band FROM model_references").fetchall())
+        return [k for k in keys if _key(*k) not in have]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM model_references").fetchone()[0]
+
+
+_cache: ReferenceCache | None = None
+_cache_ready = False
+_cache_lock = threading.Lock()
+
+
+def get_reference_cache() -> ReferenceCache | None:
+    """Process-wide cache singleton (None when REFERENCE_CACHE=off)."""
+    global _cache, _cache_ready
+    if not _cache_ready:
+        with _cache_lock:
+            if not _cache_ready:
+                _cache = ReferenceCache() if REFERENCE_BACKEND == "sqlite" else None
+                _cache_ready = True
+    return _cache
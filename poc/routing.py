@@ -0,0 +1,115 @@
+"""Tiered model routing for scoring.
+
+Short attempts (a small timer band and few words) go to a smaller, faster
+model with a lower ``max_tokens``; everything else goes to the large model.
+A small-model result is escalated to the large model when ``score_parser``
+finds it incomplete or it looks low-confidence: its overall score disagrees
+with the rubric-weighted mean of its own dimension scores.
+
+Per-route latency, token usage, escalations and small-vs-large disagreement
+are tracked in ``ROUTE_STATS`` so thresholds can be tuned.
+"""
+import os
+import random
+import threading
+
+from score_parser import WEIGHTS
+
+ROUTES = {
+    "small": {
+        "model": os.environ.get("SMALL_SCORING_MODEL", "claude-haiku-4-5-20251001"),
+        "max_tokens": int(os.environ.get("SMALL_SCORING_MAX_TOKENS", "1200")),
+    },
+    "large": {
+        "model": os.environ.get("LARGE_SCORING_MODEL", "claude-sonnet-4-5-20250929"),
+        "max_tokens": int(os.environ.get("LARGE_SCORING_MAX_TOKENS", "2000")),
+    },
+}
+SMALL_MAX_TIMER = int(os.environ.get("SMALL_ROUTE_MAX_TIMER", "60"))
+SMALL_MAX_WORDS = int(os.environ.get("SMALL_ROUTE_MAX_WORDS", "120"))
+# Overall score further than this from the weighted dimension mean counts as low confidence
+CONFIDENCE_TOLERANCE = float(os.environ.get("SMALL_ROUTE_TOLERANCE", "1.5"))
+# Fraction of accepted small-route results also scored by the large model, to measure disagreement
+SHADOW_RATE = float(os.environ.get("SMALL_ROUTE_SHADOW_RATE", "0"))
+ROUTING_ENABLED = os.environ.get("SCORING_ROUTING", "1").lower() not in ("0", "false", "no")
+
+
+def choose_route(timer_duration: int, word_count: int) -> str:
+    if ROUTING_ENABLED and timer_duration <= SMALL_MAX_TIMER and word_count <= SMALL_MAX_WORDS:
+        return "small"
+    return "large"
+
+
+def is_confident(result: dict) -> bool:
+    """Low confidence = the overall score doesn't follow from the model's own dimension scores."""
+    weighted = sum(result[dim]["score"] * w for dim, w in WEIGHTS.items())
+    return abs(result["overall"]["score"] - weighted) <= CONFIDENCE_TOLERANCE
+
+
+def needs_escalation(result: dict) -> str | None:
+    """Why a validated small-route result must be redone by the large model, or None to accept it."""
+    return None if is_confident(result) else "low_confidence"
+
+
+def should_shadow() -> bool:
+    return SHADOW_RATE > 0 and random.random() < SHADOW_RATE
+
+
+class RouteStats:
+    """Thread-safe per-route counters and latency samples."""
+
+    MAX_SAMPLES = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {
+                name: {"calls": 0, "latencies": [], "input_tokens": 0, "output_tokens": 0}
+                for name in ROUTES
+            }
+            self.escalations = {"invalid": 0, "low_confidence": 0}
+            self.compared = 0
+            self.disagreed = 0
+
+    def record_call(self, route: str, latency: float, usage: dict | None):
+        with self._lock:
+            r = self.routes[route]
+            r["calls"] += 1
+            r["latencies"].append(latency)
+            if len(r["latencies"]) > self.MAX_SAMPLES:
+                del r["latencies"][: len(r["latencies"]) - self.MAX_SAMPLES]
+            r["input_tokens"] += (usage or {}).get("input_tokens", 0)
+            r["output_tokens"] += (usage or {}).get("output_tokens", 0)
+
+    def record_escalation(self, reason: str):
+        with self._lock:
+            self.escalations[reason] += 1
+
+    def record_comparison(self, small: dict, large: dict):
+        """Compare a valid small-route result with the large model's for the same attempt."""
+        with self._lock:
+            self.compared += 1
+            if abs(small["overall"]["score"] - large["overall"]["score"]) > CONFIDENCE_TOLERANCE:
+                self.disagreed += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            out = {}
+            for name, r in self.routes.items():
+                lat = sorted(r["latencies"])
+                out[name] = {
+                    "calls": r["calls"],
+                    "p50_s": lat[len(lat) // 2] if lat else None,
+                    "p95_s": lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else None,
+                    "input_tokens": r["input_tokens"],
+                    "output_tokens": r["output_tokens"],
+                }
+            out["escalations"] = dict(self.escalations)
+            out["disagreement_rate"] = self.disagreed / self.compared if self.compared else None
+            return out
+
+
+ROUTE_STATS = RouteStats()
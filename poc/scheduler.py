@@ -0,0 +1,249 @@
+"""Spaced-repetition concept scheduling.
+
+Each (user, topic, concept) has an SM-2 review state: ease, interval,
+repetitions, lapses, due time and last overall score. A session keeps one
+min-heap per topic keyed by due time, pulled earlier for weakly scored
+concepts, so picking the next concept and rescheduling one are O(log n) in
+the size of the topic. Concepts never practiced enter the heap as due now in
+random order, after any overdue reviews. Superseded heap entries are skipped
+lazily when they surface.
+
+Review states persist in a ``reviews`` table (``REVIEW_DB``, by default the
+history database).
+"""
+import heapq
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from history_store import HISTORY_DB
+
+REVIEW_DB = os.environ.get("REVIEW_DB", HISTORY_DB)
+# Length of one SM-2 interval step ("a day" in the original algorithm)
+INTERVAL_UNIT_S = float(os.environ.get("SR_INTERVAL_UNIT_S", "86400"))
+# A failed concept comes back after this long, whatever its interval was
+RELEARN_S = float(os.environ.get("SR_RELEARN_S", "600"))
+# Fraction of its interval by which a 1/10 score pulls a concept ahead of one scored 10/10
+WEAKNESS = float(os.environ.get("SR_WEAKNESS", "0.3"))
+MIN_EASE = 1.3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    user TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    concept TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    last_score REAL,
+    reviewed REAL NOT NULL,
+    PRIMARY KEY (user, topic, concept)
+);
+"""
+
+
+@dataclass
+class ReviewState:
+    ease: float = 2.5
+    interval: float = 0.0  # in INTERVAL_UNIT_S
+    reps: int = 0
+    lapses: int = 0
+    due: float = 0.0
+    last_score: float | None = None
+    reviewed: float = 0.0
+
+
+def quality(score: float) -> int:
+    """Map an overall 1-10 score to SM-2's 0-5 recall quality."""
+    return max(0, min(5, round((score - 1) / 9 * 5)))
+
+
+def review(state: ReviewState, score: float, now: float) -> ReviewState:
+    """SM-2 update of ``state`` after an attempt scored ``score``/10 at ``now``."""
+    q = quality(score)
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    if q < 3:
+        return ReviewState(ease, 0.0, 0, state.lapses + 1, now + RELEARN_S, score, now)
+    reps = state.reps + 1
+    interval = 1.0 if reps == 1 else 6.0 if reps == 2 else state.interval * ease
+    return ReviewState(ease, interval, reps, state.lapses, now + interval * INTERVAL_UNIT_S, score, now)
+
+
+def priority(state: ReviewState) -> float:
+    """Heap key: the due time, pulled earlier the weaker the last score."""
+    if state.last_score is None:
+        return state.due
+    return state.due - WEAKNESS * (state.due - state.reviewed) * (10 - state.last_score) / 9
+
+
+class ReviewStore:
+    """Review states of every user, in SQLite (WAL mode)."""
+
+    def __init__(self, path: str = REVIEW_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def load(self, user: str, topic: str) -> dict[str, ReviewState]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT concept, ease, interval, reps, lapses, due, last_score, reviewed FROM reviews"
+                " WHERE user = ? AND topic = ?", (user, topic),
+            ).fetchall()
+        return {concept: ReviewState(*rest) for concept, *rest in rows}
+
+    def save(self, user: str, topic: str, concept: str, state: ReviewState):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (user, topic, concept, ease, interval, reps, lapses, due,"
+                " last_score, reviewed) VALUES (:user, :topic, :concept, :ease, :interval, :reps, :lapses,"
+                " :due, :last_score, :reviewed)",
+                {"user": user, "topic": topic, "concept": concept, **asdict(state)},
+            )
+
+
+_store: ReviewStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_review_store() -> ReviewStore:
+    """Process-wide store singleton."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReviewStore()
+    return _store
+
+
+class _TopicQueue:
+    """Lazy-deletion min-heap over one topic's concepts."""
+
+    def __init__(self, states: dict[str, ReviewState]):
+        self.states = states
+        self.heap: list[tuple[float, float, str]] = []
+        self.keys: dict[str, float] = {}  # concept -> its live heap key
+        self.concepts: set[str] = set()
+        # Preset tuple and custom concepts at the last sync
+        self.preset: tuple | None = None
+        self.custom: tuple = ()
+
+    def push(self, concept: str, key: float, tiebreak: float):
+        self.keys[concept] = key
+        heapq.heappush(self.heap, (key, tiebreak, concept))
+
+
+class ConceptScheduler:
+    """Per-session scheduler over a ``ConceptIndex``; states are loaded per topic on first use."""
+
+    def __init__(self, user: str, store: ReviewStore | None = None, rng: random.Random | None = None):
+        self.user = user
+        self.store = store
+        self.rng = rng or random.Random()
+        self._queues: dict[str, _TopicQueue] = {}
+
+    def _load(self, topic: str) -> _TopicQueue:
+        queue = self._queues.get(topic)
+        if queue is None:
+            states = self.store.load(self.user, topic) if self.store is not None else {}
+            queue = self._queues[topic] = _TopicQueue(states)
+        return queue
+
+    def _queue(self, topic: str, concepts) -> _TopicQueue:
+        queue = self._load(topic)
+        preset, custom = concepts.presets.get(topic), tuple(concepts.custom(topic))
+        if preset is not queue.preset or custom != queue.custom:
+            # First use, a custom concept added or removed, or the bank hot-reloaded
+            queue.concepts = {*preset, *custom}
+            queue.preset, queue.custom = preset, custom
+            now = time.time()
+            entries = [
+                (priority(queue.states[c]) if c in queue.states else now, self.rng.random(), c)
+                for c in queue.concepts if c not in queue.keys
+            ]
+            if entries and not queue.heap:
+                queue.heap = entries
+                heapq.heapify(queue.heap)
+                queue.keys.update((c, key) for key, _, c in entries)
+            else:
+                for key, tiebreak, c in entries:
+                    queue.push(c, key, tiebreak)
+        return queue
+
+    def _peek(self, queue: _TopicQueue, avoid: str | None) -> tuple[float, str] | None:
+        heap, skipped, top = queue.heap, [], None
+        while heap:
+            key, _, concept = heap[0]
+            if queue.keys.get(concept) != key or concept not in queue.concepts:
+                heapq.heappop(heap)  # superseded by a later review, or removed from the bank
+                if queue.keys.get(concept) == key:
+                    del queue.keys[concept]
+                continue
+            if concept == avoid and not skipped and len(queue.concepts) > 1:
+                skipped.append(heapq.heappop(heap))
+                continue
+            top = (key, concept)
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if top is None and avoid in queue.concepts:
+            top = (queue.keys[avoid], avoid)
+        return top
+
+    def next_concept(self, topic: str, concepts, avoid: str | None = None) -> str | None:
+        """The most urgent concept of ``topic``, skipping ``avoid`` (the previous one) if there is another.
+
+        The pick stays at the top of the queue until it's reviewed, so an
+        abandoned attempt comes back next time.
+        """
+        top = self._peek(self._queue(topic, concepts), avoid)
+        return top[1] if top is not None else None
+
+    def upcoming(self, topic: str, concepts, n: int, avoid: str | None = None) -> list[str]:
+        """Up to ``n`` concepts of ``topic`` in the order ``next_concept`` would pick them, without ``avoid``."""
+        queue = self._queue(topic, concepts)
+        heap, popped, picked = queue.heap, [], []
+        while heap and len(picked) < n:
+            entry = heapq.heappop(heap)
+            key, _, concept = entry
+            if queue.keys.get(concept) != key or concept not in queue.concepts:
+                if queue.keys.get(concept) == key:
+                    del queue.keys[concept]
+                continue
+            popped.append(entry)
+            if concept != avoid:
+                picked.append(concept)
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        return picked
+
+    def next_topic(self, topics: list[str], concepts, avoid: str | None = None) -> str:
+        """The topic whose most urgent concept is due soonest (a topic without concepts counts as due now)."""
+        now = time.time()
+        urgency = []
+        for topic in topics:
+            top = self._peek(self._queue(topic, concepts), avoid)
+            urgency.append((top[0] if top is not None else now, self.rng.random(), topic))
+        return min(urgency)[2]
+
+    def review(self, topic: str, concept: str, score: float, now: float | None = None) -> ReviewState:
+        """Record a scored attempt at ``concept`` and reschedule it."""
+        now = time.time() if now is None else now
+        queue = self._load(topic)
+        state = review(queue.states.get(concept, ReviewState()), score, now)
+        queue.states[concept] = state
+        if self.store is not None:
+            self.store.save(self.user, topic, concept, state)
+        queue.push(concept, priority(state), self.rng.random())
+        return state
+
+    def state(self, topic: str, concept: str) -> ReviewState | None:
+        return self._load(topic).states.get(concept)
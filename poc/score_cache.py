@@ -0,0 +1,177 @@
+"""Content-addressed cache of scoring results.
+
+Keys are a SHA-256 of the model name plus the fully rendered scoring prompt
+(prompt, explanation, audience, timer_duration and time_used are all part of
+it), so retries, double-clicks and duplicate reruns of the same attempt return
+the stored result instead of paying for another LLM call.
+
+Two backends share the same interface: an in-memory LRU and an on-disk SQLite
+table. Both are bounded by entry count and expire entries after a TTL.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get("SCORE_CACHE", "memory").lower()  # memory | sqlite | off
+CACHE_PATH = os.environ.get("SCORE_CACHE_PATH", "score_cache.sqlite3")
+CACHE_TTL = float(os.environ.get("SCORE_CACHE_TTL", str(24 * 3600)))
+CACHE_SIZE = int(os.environ.get("SCORE_CACHE_SIZE", "1024"))
+
+
+def cache_key(model: str, scoring_prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{scoring_prompt}".encode()).hexdigest()
+
+
+class ScoreCache(ABC):
+    """Interface shared by the cache backends. Values are JSON-serializable dicts."""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        raw = self._get(key, time.time())
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: dict):
+        self._set(key, json.dumps(value), time.time())
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    @abstractmethod
+    def _get(self, key: str, now: float) -> str | None:
+        """The raw stored value, or None if missing or expired."""
+
+    @abstractmethod
+    def _set(self, key: str, raw: str, now: float):
+        """Store a raw value, evicting past ``max_entries``."""
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryScoreCache(ScoreCache):
+    """Process-local LRU with TTL."""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_SIZE):
+        super().__init__(ttl, max_entries)
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, raw = entry
+            if now - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return raw
+
+    def _set(self, key: str, raw: str, now: float):
+        with self._lock:
+            self._data[key] = (now, raw)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteScoreCache(ScoreCache):
+    """On-disk cache shared by every process pointing at the same file."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_entries: int = CACHE_SIZE):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS score_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS score_cache_used_at ON score_cache (used_at)")
+
+    def _get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM score_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM score_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE score_cache SET used_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(self, key: str, raw: str, now: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO score_cache (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, raw, now, now),
+            )
+            self._conn.execute("DELETE FROM score_cache WHERE stored_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM score_cache WHERE key IN ("
+                " SELECT key FROM score_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM score_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM score_cache").fetchone()[0]
+
+
+def make_score_cache(backend: str = CACHE_BACKEND) -> ScoreCache | None:
+    """Build the configured backend, or None when caching is off."""
+    if backend == "sqlite":
+        return SqliteScoreCache()
+    if backend == "memory":
+        return MemoryScoreCache()
+    return None
+
+
+_cache: ScoreCache | None = None
+_cache_ready = False
+_cache_lock = threading.Lock()
+
+
+def get_score_cache() -> ScoreCache | None:
+    """Process-wide cache singleton (None when SCORE_CACHE=off)."""
+    global _cache, _cache_ready
+    if not _cache_ready:
+        with _cache_lock:
+            if not _cache_ready:
+                _cache = make_score_cache()
+                _cache_ready = True
+    return _cache
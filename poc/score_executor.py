@@ -0,0 +1,116 @@
+"""In-process background scoring for the Streamlit app.
+
+Scoring calls run on a shared thread pool instead of the script thread, keyed
+by a per-attempt job id: a rerun that asks for the same id gets the job
+already in flight instead of issuing a second call. The pool size caps how
+many scores one process has in flight; further jobs wait for a slot.
+
+Streamed score events are buffered on the job so each rerun can redraw the
+partial result; background threads never touch ``st.*``.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+MAX_CONCURRENT = int(os.environ.get("MAX_CONCURRENT_SCORES", "8"))
+# Finished jobs nobody collected (closed tab) are dropped after this long
+JOB_TTL_S = float(os.environ.get("SCORE_JOB_TTL_S", "600"))
+
+
+class ScoreJob:
+    """One background scoring call and the events it has streamed so far."""
+
+    def __init__(self):
+        self.future: Future | None = None
+        self.submitted = time.monotonic()
+        self._events: list = []
+        self._lock = threading.Lock()
+
+    def on_event(self, event):
+        with self._lock:
+            self._events.append(event)
+
+    def events(self) -> list:
+        with self._lock:
+            return list(self._events)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to ``timeout`` seconds for the call to finish. Returns whether it has."""
+        done, _ = wait([self.future], timeout=timeout)
+        return bool(done)
+
+    def running(self) -> bool:
+        return self.future.running()
+
+    def result(self):
+        """The scoring call's return value; re-raises its exception."""
+        return self.future.result()
+
+
+class ScoreExecutor:
+    """Idempotent, bounded background scoring shared by every session of a process."""
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT, job_ttl_s: float = JOB_TTL_S):
+        self.max_workers = max_workers
+        self.job_ttl_s = job_ttl_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="score")
+        self._jobs: dict[str, ScoreJob] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.reattached = 0
+
+    def submit(self, job_id: str, fn, *args, **kwargs) -> ScoreJob:
+        """Run ``fn(*args, on_event=job.on_event, **kwargs)`` once per ``job_id``; later calls reattach."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self.reattached += 1
+                return job
+            job = ScoreJob()
+            job.future = self._pool.submit(fn, *args, on_event=job.on_event, **kwargs)
+            self._jobs[job_id] = job
+            self.submitted += 1
+            return job
+
+    def get(self, job_id: str) -> ScoreJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """Forget a job whose outcome has been handled (a pending one still finishes)."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.job_ttl_s
+        stale = [k for k, job in self._jobs.items() if job.submitted < cutoff and job.done()]
+        for k in stale:
+            del self._jobs[k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            submitted, reattached = self.submitted, self.reattached
+        running = sum(1 for job in jobs if job.running())
+        waiting = sum(1 for job in jobs if not job.running() and not job.done())
+        return {"running": running, "waiting": waiting, "limit": self.max_workers,
+                "submitted": submitted, "reattached": reattached}
+
+
+_executor: ScoreExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_score_executor() -> ScoreExecutor:
+    """Process-wide executor singleton."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ScoreExecutor()
+    return _executor
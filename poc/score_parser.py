@@ -0,0 +1,316 @@
+"""Tolerant parsing and validation of scorer output.
+
+``extract_json`` finds the first JSON object in a response, skipping
+markdown fences, preambles and trailing prose, and in one scan closes a
+response that was cut off mid-object (``max_tokens``) at the last point where
+doing so is valid JSON. ``validate`` turns the object into a ``ScoreResult``
+with scores clamped to 1-10 and derivable fields (overall score, grade)
+filled in, and lists whatever is still missing.
+
+When a response can't be used as is, ``repair_request`` builds a small
+follow-up request instead of a full re-score: a continuation that prefills
+the truncated text, or a request for just the missing fields. ``apply_repair``
+merges its answer back in.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+
+from streaming import DIMENSIONS
+
+WEIGHTS = {"clarity": 0.25, "accuracy": 0.25, "structure": 0.2, "completeness": 0.15, "conciseness": 0.15}
+GRADES = [(9.5, "A+"), (8.5, "A"), (8.0, "A-"), (7.5, "B+"), (7.0, "B"), (6.5, "B-"),
+          (6.0, "C+"), (5.5, "C"), (5.0, "C-"), (4.0, "D"), (0.0, "F")]
+# Candidate '{' positions tried before giving up on a response
+MAX_CANDIDATES = 8
+
+_STRUCTURAL = re.compile(r'["{}\[\],:]')
+_STRING_END = re.compile(r'["\\]')
+_NUMBER_TAIL = re.compile(r"\s*(-?\d+(\.\d+)?([eE][+-]?\d+)?|true|false|null)\s*")
+_SCORE = re.compile(r"-?\d+(\.\d+)?")
+_PARTIAL_ESCAPE = re.compile(r"\\u[0-9a-fA-F]{0,3}$")
+_decoder = json.JSONDecoder()
+
+
+def _scan(text: str, start: int) -> tuple[int | None, str | None]:
+    """Scan the object opening at ``text[start]``.
+
+    Returns ``(end, None)`` when the object closes at ``end`` (exclusive),
+    ``(None, repaired)`` when the text runs out first, and ``(None, None)``
+    on mismatched brackets.
+    """
+    stack = []          # expected closers
+    keys = []           # per open container: whether the next string is an object key
+    safe, safe_closers = start + 1, "}"
+    pos, n = start, len(text)
+    last_colon = -1
+    while True:
+        m = _STRUCTURAL.search(text, pos)
+        if m is None:
+            break
+        c, i = m.group(), m.start()
+        if c == '"':
+            is_key = bool(keys) and keys[-1]
+            j = i + 1
+            while True:
+                e = _STRING_END.search(text, j)
+                if e is None:
+                    # Cut off inside a string: a value can be closed where it stopped
+                    if not is_key:
+                        partial = text[start:n]
+                        if partial.endswith("\\") and (len(partial) - len(partial.rstrip("\\"))) % 2:
+                            partial = partial[:-1]
+                        partial = _PARTIAL_ESCAPE.sub("", partial)
+                        return None, partial + '"' + "".join(reversed(stack))
+                    return None, text[start:safe] + safe_closers
+                if e.group() == "\\":
+                    j = e.end() + 1
+                    continue
+                break
+            pos = e.end()
+            if not is_key:
+                safe, safe_closers = pos, "".join(reversed(stack))
+            continue
+        pos = i + 1
+        if c in "{[":
+            stack.append("}" if c == "{" else "]")
+            keys.append(c == "{")
+            safe, safe_closers = pos, "".join(reversed(stack))
+        elif c in "}]":
+            if not stack or stack[-1] != c:
+                return None, None
+            stack.pop()
+            keys.pop()
+            if not stack:
+                return pos, None
+            safe, safe_closers = pos, "".join(reversed(stack))
+        elif c == ",":
+            if stack:
+                if text[safe:i].strip() == "" or last_colon > safe:
+                    # A number or literal value just ended here
+                    safe, safe_closers = i, "".join(reversed(stack))
+                keys[-1] = stack[-1] == "}"
+        elif c == ":":
+            if keys:
+                keys[-1] = False
+            last_colon = i
+    # Cut off between tokens: keep a trailing complete number or literal value
+    if stack and last_colon > safe and _NUMBER_TAIL.fullmatch(text, last_colon + 1):
+        return None, text[start:].rstrip() + "".join(reversed(stack))
+    return None, text[start:safe] + safe_closers
+
+
+def extract_json(text: str) -> tuple[dict, bool]:
+    """First JSON object in ``text``. Returns (object, truncated); ValueError if there is none.
+
+    Each candidate ``{`` goes to the C decoder first, which stops at the end of
+    the object and so ignores trailing prose; the scanner only runs when that
+    fails, to tell a cut-off object (repairable) from a stray brace.
+    """
+    pos = text.find("{")
+    tried = 0
+    while pos != -1 and tried < MAX_CANDIDATES:
+        tried += 1
+        try:
+            obj, _ = _decoder.raw_decode(text, pos)
+            if isinstance(obj, dict):
+                return obj, False
+        except ValueError:
+            end, repaired = _scan(text, pos)
+            if end is None and repaired is not None:
+                try:
+                    obj = json.loads(repaired)
+                    if isinstance(obj, dict):
+                        return obj, True
+                except ValueError:
+                    pass
+        pos = text.find("{", pos + 1)
+    raise ValueError("no JSON object in scorer output")
+
+
+def clamp_score(value) -> float | int | None:
+    """A 1-10 score from a number or numeric string ("7", "7/10"); None if there is none."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        m = _SCORE.search(value)
+        if m is None:
+            return None
+        value = float(m.group())
+    if not isinstance(value, (int, float)) or value != value:
+        return None
+    value = round(min(10.0, max(1.0, float(value))), 1)
+    return int(value) if value.is_integer() else value
+
+
+def grade_for(score: float) -> str:
+    return next(grade for floor, grade in GRADES if score >= floor)
+
+
+def _text(value) -> str | None:
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _text_list(value) -> list[str]:
+    if isinstance(value, str):
+        value = [value]
+    return [s.strip() for s in value if isinstance(s, str) and s.strip()] if isinstance(value, list) else []
+
+
+@dataclass
+class Dimension:
+    score: float
+    feedback: str
+
+
+@dataclass
+class ScoreResult:
+    dimensions: dict[str, Dimension]
+    score: float
+    grade: str
+    summary: str
+    strengths: list[str] = field(default_factory=list)
+    improvements: list[str] = field(default_factory=list)
+    model_explanation: str = ""
+
+    def to_dict(self) -> dict:
+        """The scorer's JSON shape, as stored in history and the score cache."""
+        return {
+            **{name: {"score": d.score, "feedback": d.feedback} for name, d in self.dimensions.items()},
+            "overall": {
+                "score": self.score,
+                "grade": self.grade,
+                "summary": self.summary,
+                "strengths": self.strengths,
+                "improvements": self.improvements,
+            },
+            "model_explanation": self.model_explanation,
+        }
+
+
+@dataclass
+class ParsedScore:
+    result: ScoreResult | None
+    raw: dict | None = None
+    truncated: bool = False
+    missing: list[str] = field(default_factory=list)
+    reference: str | None = None  # model explanation supplied by the caller, not the response
+
+    @property
+    def complete(self) -> bool:
+        return self.result is not None and not self.truncated and not self.missing
+
+
+def validate(raw: dict, reference: str | None = None) -> tuple[ScoreResult | None, list[str]]:
+    """Typed, clamped result plus the fields still missing.
+
+    The result is None unless every dimension has a usable score; feedback,
+    summary and the model explanation default to empty strings. A
+    ``reference`` model explanation (the request didn't ask for one) is used
+    as is and never reported missing.
+    """
+    missing = []
+    dims = {}
+    for name in DIMENSIONS:
+        entry = raw.get(name)
+        if not isinstance(entry, dict):
+            entry = {"score": entry}
+        score = clamp_score(entry.get("score"))
+        feedback = _text(entry.get("feedback"))
+        if score is None:
+            missing.append(f"{name}.score")
+        if feedback is None:
+            missing.append(f"{name}.feedback")
+        dims[name] = Dimension(score, feedback or "")
+    overall = raw.get("overall") if isinstance(raw.get("overall"), dict) else {}
+    summary = _text(overall.get("summary"))
+    if summary is None:
+        missing.append("overall.summary")
+    explanation = reference if reference is not None else _text(raw.get("model_explanation"))
+    if explanation is None:
+        missing.append("model_explanation")
+    if any(d.score is None for d in dims.values()):
+        return None, missing
+    score = clamp_score(overall.get("score"))
+    if score is None:
+        score = clamp_score(sum(dims[k].score * w for k, w in WEIGHTS.items()))
+    grade = _text(overall.get("grade")) or grade_for(score)
+    return ScoreResult(
+        dimensions=dims,
+        score=score,
+        grade=grade,
+        summary=summary or "",
+        strengths=_text_list(overall.get("strengths")),
+        improvements=_text_list(overall.get("improvements")),
+        model_explanation=explanation or "",
+    ), missing
+
+
+def parse(text: str, reference: str | None = None) -> ParsedScore:
+    """Extract and validate a scorer response. Never raises."""
+    try:
+        raw, truncated = extract_json(text)
+    except ValueError:
+        return ParsedScore(None, reference=reference)
+    result, missing = validate(raw, reference)
+    return ParsedScore(result, raw, truncated, missing, reference)
+
+
+@dataclass
+class Repair:
+    kind: str  # "continue" | "fields" | "reformat"
+    request: dict
+
+
+def repair_request(request: dict, text: str, parsed: ParsedScore) -> Repair | None:
+    """A follow-up to ``request`` that fixes ``parsed`` without re-scoring, or None if it's complete."""
+    if parsed.complete:
+        return None
+    messages = list(request["messages"])
+    if parsed.truncated:
+        # Prefill the cut-off answer; the API rejects trailing whitespace in a final assistant turn
+        messages.append({"role": "assistant", "content": text.rstrip()})
+        return Repair("continue", {**request, "messages": messages})
+    if parsed.raw is None:
+        ask = "Respond with ONLY the JSON object in the format given in the instructions, no markdown fences or prose."
+        kind = "reformat"
+    else:
+        ask = (
+            f"Your JSON is missing or has invalid values for: {', '.join(parsed.missing)}. "
+            "Respond with ONLY a JSON object containing those fields, nested as in the required format."
+        )
+        kind = "fields"
+    messages += [{"role": "assistant", "content": text.rstrip() or "{}"}, {"role": "user", "content": ask}]
+    return Repair(kind, {**request, "messages": messages})
+
+
+def _merge(base: dict, patch: dict) -> dict:
+    out = dict(base)
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = _merge(out[key], value)
+        else:
+            out[key] = value
+    return out
+
+
+def apply_repair(parsed: ParsedScore, text: str, repair: Repair, repair_text: str) -> ParsedScore:
+    """Combine the original response with the answer to its repair request."""
+    if repair.kind == "continue":
+        return parse(text.rstrip() + repair_text, parsed.reference)
+    patch = parse(repair_text, parsed.reference)
+    if patch.raw is None:
+        return parsed
+    if repair.kind == "reformat":
+        return patch
+    raw = _merge(parsed.raw, patch.raw)
+    result, missing = validate(raw, parsed.reference)
+    return ParsedScore(result, raw, False, missing, parsed.reference)
+
+
+def parse_score(text: str) -> dict:
+    """Scorer response -> result dict; ValueError if it has no usable scores."""
+    parsed = parse(text)
+    if parsed.result is None:
+        raise ValueError(f"unusable scorer output (missing: {', '.join(parsed.missing) or 'JSON object'})")
+    return parsed.result.to_dict()
@@ -0,0 +1,557 @@
+"""Scoring pipeline shared by the Streamlit app and offline tools.
+
+Nothing in here touches ``st.*``: callers pass in a client and get a result
+dict back (or an exception), and decide for themselves how to surface errors.
+"""
+import functools
+import time
+from dataclasses import dataclass
+
+import consensus
+import dedup
+import metrics
+import score_parser
+from prescore import prescore
+from reference_cache import get_reference_cache, stores_from
+from routing import ROUTE_STATS, ROUTES, choose_route, needs_escalation, should_shadow
+from score_cache import ScoreCache, cache_key, get_score_cache
+from streaming import stream_score, usage_dict
+
+MODEL = ROUTES["large"]["model"]
+MAX_TOKENS = ROUTES["large"]["max_tokens"]
+# Rate limited / overloaded: safe to retry with backoff
+RETRYABLE_STATUS = {429, 529}
+
+
+# Time-based expectations per timer band. The rubric for a band is identical
+# for every attempt in it, so it can live in a cached system block.
+TIME_BANDS = {
+    "short": (
+        "very short time (≤60s) - expect bullet points or a brief paragraph covering key ideas only",
+        "For this short timeframe, completeness means hitting 2-3 key points, not exhaustive coverage",
+    ),
+    "moderate": (
+        "moderate time (60-120s) - expect 1-2 paragraphs with main concepts and an example",
+        "Should cover main concepts with at least one concrete example or analogy",
+    ),
+    "extended": (
+        "extended time (>120s) - expect well-developed explanation with examples, nuance, and structure",
+        "Should provide thorough coverage with examples, context, and possibly counterexamples",
+    ),
+}
+
+
+def time_band(timer_duration: int) -> str:
+    if timer_duration <= 60:
+        return "short"
+    if timer_duration <= 120:
+        return "moderate"
+    return "extended"
+
+
+MODEL_EXPLANATION_FIELD = (
+    ',\n  "model_explanation": "<A concise, well-structured explanation that could realistically be typed within '
+    'the total time budget. This should demonstrate ideal clarity, accuracy, and structure for the given audience '
+    'while respecting the time constraint.>"'
+)
+
+
+def _render_rubric(band: str, model_explanation: bool = True) -> str:
+    completeness_note = TIME_BANDS[band][1]
+    model_field = MODEL_EXPLANATION_FIELD if model_explanation else ""
+    return f"""You are an expert communication coach. Evaluate how well someone explained a concept under time pressure. The attempt's prompt, topic, target audience, time budget and explanation are given in the user message.
+
+## Evaluation Guidelines
+
+**Time-Adjusted Expectations**:
+- {completeness_note}
+- Minor typos, grammar issues, or abrupt endings are acceptable given time pressure
+- Prioritize clarity and accuracy over polish
+- Judge completeness relative to the time constraint - shorter times should NOT be penalized for brevity
+
+**Scoring Dimensions**:
+1. **Clarity**: Is it understandable specifically for the target audience? Consider the vocabulary, examples, and analogies appropriate for that exact persona.
+2. **Accuracy**: Are the core concepts technically correct?
+3. **Structure**: Is there logical flow (even if brief)?
+4. **Completeness**: Does it cover what's reasonable given the total time budget?
+5. **Conciseness**: Efficient use of limited time?
+
+Respond with ONLY this JSON (no markdown fences, no preamble):
+
+{{
+  "clarity": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
+  "accuracy": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
+  "structure": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
+  "completeness": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
+  "conciseness": {{"score": <1-10>, "feedback": "<2-3 sentences>"}},
+  "overall": {{
+    "score": <1-10 weighted: clarity 25%, accuracy 25%, structure 20%, completeness 15%, conciseness 15%>,
+    "grade": "<A+ to F>",
+    "summary": "<2-3 sentence overall assessment>",
+    "strengths": ["<strength 1>", "<strength 2>"],
+    "improvements": ["<improvement 1>", "<improvement 2>"]
+  }}{model_field}
+}}"""
+
+
+# Rendered once per process so the cached prefix is byte-identical across requests.
+# Keyed by (band, whether the response includes a model explanation).
+RUBRICS = {(band, m): _render_rubric(band, m) for band in TIME_BANDS for m in (True, False)}
+
+
+def scoring_rubric(timer_duration: int, model_explanation: bool = True) -> str:
+    """Static system block (guidelines, dimensions, JSON schema) for this timer band."""
+    return RUBRICS[time_band(timer_duration), model_explanation]
+
+
+def build_scoring_prompt(
+    prompt: str,
+    explanation: str,
+    topic: str,
+    audience: str,
+    timer_duration: int,
+    time_used: int,
+    anchor: dict | None = None,
+) -> str:
+    """Render the per-attempt part of the scoring prompt (the user message).
+
+    ``anchor`` is the result of a very similar earlier attempt to keep scores consistent with.
+    """
+    word_count = len(explanation.split())
+    time_context = TIME_BANDS[time_band(timer_duration)][0]
+
+    scoring_prompt = f"""## Context
+- **Prompt given**: "{prompt}"
+- **Topic**: {topic}
+- **Target audience**: {audience}
+  ⚠️ IMPORTANT: The explanation must be tailored specifically for "{audience}". Evaluate clarity and appropriateness based on this exact audience persona.
+- **Total time budget**: {timer_duration} seconds ({time_context})
+- **Time the user actually spent**: {time_used} seconds out of {timer_duration} seconds ({timer_duration - time_used} seconds remaining when submitted)
+- **Word count**: {word_count} words
+
+## The Explanation
+\"\"\"
+{explanation}
+\"\"\"
+"""
+    if anchor is not None:
+        scoring_prompt += f"""
+## Reference
+A very similar earlier explanation of this prompt scored {anchor["overall"]["score"]}/10 overall ({anchor["overall"]["grade"]}). Keep your scores consistent with it unless the differences in this explanation justify a change.
+"""
+    return scoring_prompt
+
+
+def attempt_from_record(record: dict) -> dict:
+    """Normalize an exported attempt record into ``build_scoring_prompt`` keyword arguments."""
+    return {
+        "prompt": record["prompt"],
+        "explanation": record["explanation"],
+        "topic": record.get("topic", ""),
+        "audience": record.get("audience", ""),
+        "timer_duration": int(record.get("timer", record.get("timer_duration", 60))),
+        "time_used": int(record.get("time_used", 0)),
+    }
+
+
+def build_request(scoring_prompt: str, timer_duration: int, model: str = MODEL, max_tokens: int = MAX_TOKENS,
+                  model_explanation: bool = True) -> dict:
+    """Keyword arguments for ``client.messages.create`` / ``.stream``.
+
+    The band rubric goes in a system block marked for prompt caching; only the
+    short per-attempt user message is billed at the full input rate on a hit.
+    The API ignores cache_control on prefixes below the model's minimum
+    cacheable length, so check ``cache_read_input_tokens`` in the recorded usage.
+    Without ``model_explanation`` the response leaves out the reference answer
+    (the caller already has one from the reference cache).
+    """
+    rubric = scoring_rubric(timer_duration, model_explanation)
+    return {
+        "model": model,
+        "max_tokens": max_tokens,
+        "system": [{"type": "text", "text": rubric, "cache_control": {"type": "ephemeral"}}],
+        "messages": [{"role": "user", "content": scoring_prompt}],
+    }
+
+
+def request_cache_key(request: dict) -> str:
+    """Score-cache key covering the model, system blocks and user message of a request."""
+    system = "".join(block["text"] for block in request.get("system", []))
+    return cache_key(request["model"], system + "\0" + request["messages"][-1]["content"])
+
+
+# Kept here for callers that only need the result dict (ValueError if unusable)
+parse_score = score_parser.parse_score
+
+
+def _parse(text: str, reference: str | None = None) -> score_parser.ParsedScore:
+    with metrics.PARSE_SECONDS.time():
+        return score_parser.parse(text, reference)
+
+
+def _repaired(parsed, text: str, repair, message, started: float) -> tuple[dict, dict]:
+    """Result and timing of a repair call; ValueError if the result is still unusable."""
+    fixed = score_parser.apply_repair(parsed, text, repair, message.content[0].text)
+    if fixed.result is None:
+        raise ValueError(f"scorer output still unusable after {repair.kind} repair")
+    timing = {"total_s": time.perf_counter() - started, "usage": usage_dict(message.usage)}
+    return fixed.result.to_dict(), timing
+
+
+def _complete(client, request: dict, text: str, timing: dict, reference: str | None = None) -> tuple[dict, dict]:
+    """Validated result for a large-route response, repairing it with one follow-up call if needed."""
+    parsed = _parse(text, reference)
+    repair = score_parser.repair_request(request, text, parsed)
+    if repair is None:
+        return parsed.result.to_dict(), timing
+    started = time.perf_counter()
+    result, repair_timing = _repaired(parsed, text, repair, client.messages.create(**repair.request), started)
+    return result, {**_merge_timing(timing, repair_timing), "repair": repair.kind}
+
+
+async def _acomplete(client, request: dict, text: str, timing: dict,
+                     reference: str | None = None) -> tuple[dict, dict]:
+    """Async ``_complete``."""
+    parsed = _parse(text, reference)
+    repair = score_parser.repair_request(request, text, parsed)
+    if repair is None:
+        return parsed.result.to_dict(), timing
+    started = time.perf_counter()
+    result, repair_timing = _repaired(parsed, text, repair, await client.messages.create(**repair.request), started)
+    return result, {**_merge_timing(timing, repair_timing), "repair": repair.kind}
+
+
+def _small_verdict(text: str, reference: str | None = None) -> tuple[dict | None, str | None]:
+    """Parse a small-route response. Returns (result, escalation reason)."""
+    parsed = _parse(text, reference)
+    if not parsed.complete:
+        return parsed.result.to_dict() if parsed.result else None, "invalid"
+    result = parsed.result.to_dict()
+    return result, needs_escalation(result)
+
+
+def _near_duplicate(concept: str, audience: str, timer_duration: int, explanation: str,
+                    use_cache: bool, user: str) -> tuple[dict | None, dict | None, dict]:
+    """Look an attempt up in the dedup index. Returns (result to reuse, result to anchor on, ``dedup`` info).
+
+    Only ``user``'s own earlier attempts are reused, and none if ``user`` is empty; anyone's can be
+    anchored on.
+    """
+    index = dedup.get_dedup_index()
+    if index is None:
+        return None, None, {}
+    match = index.lookup(concept, audience, time_band(timer_duration), explanation, user)
+    info = {}
+    if match["model_similarity"] >= dedup.COPY_THRESHOLD:
+        info["copied_model_explanation"] = round(match["model_similarity"], 3)
+        metrics.DEDUP.inc(outcome="copied")
+    if not use_cache:
+        return None, None, info
+    if match["result"] is not None and match["similarity"] >= dedup.REUSE_THRESHOLD:
+        metrics.DEDUP.inc(outcome="reused")
+        return match["result"], None, {**info, "reused": round(match["similarity"], 3)}
+    if match["anchor"] is not None and match["anchor_similarity"] >= dedup.ANCHOR_THRESHOLD:
+        metrics.DEDUP.inc(outcome="anchored")
+        return None, match["anchor"], {**info, "anchored": round(match["anchor_similarity"], 3)}
+    return None, None, info
+
+
+def _remember(concept: str, audience: str, timer_duration: int, explanation: str, result: dict, user: str):
+    index = dedup.get_dedup_index()
+    if index is not None:
+        index.add(concept, audience, time_band(timer_duration), explanation, result, user)
+
+
+def _cached_reference(concept: str, audience: str, timer_duration: int) -> str | None:
+    """The stored model explanation for this concept, audience and timer band, if any."""
+    references = get_reference_cache()
+    return references.get(concept, audience, time_band(timer_duration)) if references is not None else None
+
+
+def _store_reference(client, concept: str, audience: str, timer_duration: int, result: dict):
+    """Keep a freshly generated model explanation so later scores of the same triple can skip it."""
+    references = get_reference_cache()
+    if references is not None and result.get("model_explanation") and stores_from(client):
+        references.set(concept, audience, time_band(timer_duration), result["model_explanation"])
+
+
+def _with_dedup(result: dict, info: dict) -> dict:
+    return {**result, "dedup": info} if info else result
+
+
+def _rater_request(rater: consensus.Rater, scoring_prompt: str, timer_duration: int, reference: str | None) -> dict:
+    request = build_request(scoring_prompt, timer_duration, rater.model, rater.max_tokens,
+                            model_explanation=reference is None)
+    if rater.temperature is not None:
+        request["temperature"] = rater.temperature
+    return request
+
+
+def _consensus(client, raters: list[consensus.Rater], scoring_prompt: str, timer_duration: int,
+               reference: str | None) -> tuple[dict, dict]:
+    """Score with every rater in parallel on the shared rater pool and combine them (``consensus.run``)."""
+    def rate(rater, cancelled):
+        if cancelled.is_set():
+            return None
+
+        def stop_if_cancelled(event):
+            if cancelled.is_set():
+                raise consensus.Cancelled
+
+        request = _rater_request(rater, scoring_prompt, timer_duration, reference)
+        try:
+            text, timing = stream_score(client, on_event=stop_if_cancelled, **request)
+        except consensus.Cancelled:
+            return None
+        if rater.route is not None:
+            ROUTE_STATS.record_call(rater.route, timing["total_s"], timing.get("usage"))
+        return _complete(client, request, text, timing, reference)
+
+    return consensus.run(rate, raters)
+
+
+async def _aconsensus(client, raters: list[consensus.Rater], scoring_prompt: str, timer_duration: int,
+                      reference: str | None) -> tuple[dict, dict]:
+    """Async ``_consensus``."""
+    async def rate(rater):
+        request = _rater_request(rater, scoring_prompt, timer_duration, reference)
+        started = time.perf_counter()
+        message = await client.messages.create(**request)
+        timing = {"total_s": time.perf_counter() - started, "usage": usage_dict(message.usage)}
+        if rater.route is not None:
+            ROUTE_STATS.record_call(rater.route, timing["total_s"], timing["usage"])
+        return await _acomplete(client, request, message.content[0].text, timing, reference)
+
+    return await consensus.arun(rate, raters)
+
+
+def _recorded(fn):
+    """Record the outcome of every call to a scoring function in ``metrics``."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            result, timing = fn(*args, **kwargs)
+        except Exception as e:
+            metrics.record_error(e)
+            raise
+        metrics.record_score(timing)
+        return result, timing
+    return wrapper
+
+
+def _arecorded(fn):
+    """Async ``_recorded``."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            result, timing = await fn(*args, **kwargs)
+        except Exception as e:
+            metrics.record_error(e)
+            raise
+        metrics.record_score(timing)
+        return result, timing
+    return wrapper
+
+
+def _merge_timing(first: dict, second: dict) -> dict:
+    """Timing for two calls made one after the other (an escalation or a repair)."""
+    usage = {
+        k: first.get("usage", {}).get(k, 0) + second.get("usage", {}).get(k, 0)
+        for k in set(first.get("usage", {})) | set(second.get("usage", {}))
+    }
+    merged = {**first, "total_s": first["total_s"] + second["total_s"], "usage": usage}
+    if "repair" in second:
+        merged["repair"] = second["repair"]
+    return merged
+
+
+@dataclass
+class _Plan:
+    """An attempt ready for the model: its request, its score-cache key and what to record afterwards."""
+    concept: str
+    audience: str
+    timer_duration: int
+    explanation: str
+    user: str
+    scoring_prompt: str
+    route: str  # a ROUTES name, or "consensus"
+    reference: str | None
+    request: dict
+    key: str
+    raters: list[consensus.Rater]
+    dedup: dict
+    cache: ScoreCache | None
+
+    def large_request(self) -> dict:
+        return build_request(self.scoring_prompt, self.timer_duration, **ROUTES["large"],
+                             model_explanation=self.reference is None)
+
+
+def _plan(prompt: str, explanation: str, topic: str, audience: str, timer_duration: int, time_used: int,
+          use_cache: bool, concept: str, raters: list[consensus.Rater] | None,
+          user: str) -> tuple[_Plan | None, tuple[dict, dict] | None]:
+    """Everything before the model call. Returns (plan, None), or (None, (result, timing)) when the
+    attempt is prescored, reuses a near-duplicate's score or is in the score cache."""
+    local = prescore(explanation, concept, prompt)
+    if local is not None:
+        return None, (local, {"total_s": 0.0, "prescored": True})
+    concept = concept or prompt
+    reuse, anchor, info = _near_duplicate(concept, audience, timer_duration, explanation, use_cache, user)
+    if reuse is not None:
+        return None, (_with_dedup(reuse, info), {"total_s": 0.0, "reused": True})
+
+    scoring_prompt = build_scoring_prompt(
+        prompt, explanation, topic, audience, timer_duration, time_used, anchor)
+    route = choose_route(timer_duration, len(explanation.split()))
+    reference = _cached_reference(concept, audience, timer_duration)
+    request = build_request(scoring_prompt, timer_duration, **ROUTES[route], model_explanation=reference is None)
+    cache = get_score_cache()
+    key = request_cache_key(request)
+    raters = consensus.RATERS if raters is None else raters
+    if raters:
+        route, key = "consensus", cache_key(consensus.signature(raters), key)
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return None, (_with_dedup(cached, info), {"total_s": 0.0, "cached": True, "route": route})
+    return _Plan(concept, audience, timer_duration, explanation, user, scoring_prompt, route, reference,
+                 request, key, raters, info, cache), None
+
+
+def _escalate(result: dict | None, reason: str | None, timing: dict, large: dict,
+              large_timing: dict) -> tuple[dict, dict]:
+    """Compare a small-route result with the large route's, and take the latter if the small one was rejected."""
+    if result is not None:
+        ROUTE_STATS.record_comparison(result, large)
+    if reason is not None:
+        ROUTE_STATS.record_escalation(reason)
+        return large, _merge_timing(timing, large_timing)
+    return result, timing
+
+
+def _finish(client, plan: _Plan, result: dict, timing: dict, reason: str | None) -> tuple[dict, dict]:
+    """Record a model-scored attempt: its reference explanation, score-cache entry and dedup index entry."""
+    timing.update(route=plan.route, escalated=reason, reference_cached=plan.reference is not None)
+    if plan.reference is None and (plan.route != "small" or reason is not None):
+        # Small-model references aren't kept; the others are served for every later attempt
+        _store_reference(client, plan.concept, plan.audience, plan.timer_duration, result)
+    if plan.cache is not None:
+        # Stored under the first route's key, so a repeat skips straight to the accepted result
+        plan.cache.set(plan.key, result)
+    _remember(plan.concept, plan.audience, plan.timer_duration, plan.explanation, result, plan.user)
+    return _with_dedup(result, plan.dedup), timing
+
+
+def _call(client, route: str, request: dict, on_event=None) -> tuple[str, dict]:
+    text, timing = stream_score(client, on_event=on_event, **request)
+    ROUTE_STATS.record_call(route, timing["total_s"], timing.get("usage"))
+    return text, timing
+
+
+async def _acall(client, route: str, request: dict) -> tuple[str, dict]:
+    started = time.perf_counter()
+    message = await client.messages.create(**request)
+    timing = {"total_s": time.perf_counter() - started, "usage": usage_dict(message.usage)}
+    ROUTE_STATS.record_call(route, timing["total_s"], timing["usage"])
+    return message.content[0].text, timing
+
+
+@_recorded
+def score_explanation(
+    client,
+    prompt: str,
+    explanation: str,
+    topic: str,
+    audience: str,
+    timer_duration: int,
+    time_used: int,
+    on_event=None,
+    use_cache: bool = True,
+    concept: str = "",
+    raters: list[consensus.Rater] | None = None,
+    user: str = "",
+) -> tuple[dict, dict]:
+    """Score one explanation with a streaming request. Returns (result, timing).
+
+    Obviously failing attempts are scored locally by ``prescore``. Identical
+    scoring prompts are served from the score cache unless ``use_cache`` is False.
+    Short attempts go to the small model first and are re-scored by the large
+    one (streaming into the same ``on_event``) if ``routing`` rejects the result.
+    A truncated or incomplete large-model response gets one targeted repair
+    call (``score_parser.repair_request``) rather than a full re-score.
+
+    When ``reference_cache`` has a model explanation for the concept, audience
+    and timer band, the request asks for the scores only and the stored one is
+    returned; otherwise the one generated here is stored for next time.
+
+    Near-duplicates of an earlier attempt at the same concept, audience and
+    timer band (``dedup``) reuse its score if it was ``user``'s own, or anchor
+    the model on it when merely similar or someone else's; ``use_cache=False``
+    skips both. Explanations copied from
+    an earlier ``model_explanation`` are flagged in ``result["dedup"]``.
+
+    With consensus ``raters`` (by default ``CONSENSUS_RATERS``; pass ``[]``
+    for a single call) the attempt is scored by all of them in parallel
+    instead of being routed, and the combined result has a ``consensus``
+    entry with the per-score variance (see ``consensus``). Nothing is
+    streamed to ``on_event`` then.
+    """
+    plan, done = _plan(prompt, explanation, topic, audience, timer_duration, time_used, use_cache, concept,
+                       raters, user)
+    if done is not None:
+        result, timing = done
+        return result, {"first_score_s": 0.0, **timing}
+
+    reason = None
+    if plan.route == "consensus":
+        result, timing = _consensus(client, plan.raters, plan.scoring_prompt, plan.timer_duration, plan.reference)
+    else:
+        text, timing = _call(client, plan.route, plan.request, on_event)
+        if plan.route == "large":
+            result, timing = _complete(client, plan.request, text, timing, plan.reference)
+        else:
+            result, reason = _small_verdict(text, plan.reference)
+        if plan.route == "small" and (reason is not None or should_shadow()):
+            large_request = plan.large_request()
+            large_text, large_timing = _call(client, "large", large_request, on_event if reason else None)
+            large, large_timing = _complete(client, large_request, large_text, large_timing, plan.reference)
+            result, timing = _escalate(result, reason, timing, large, large_timing)
+    return _finish(client, plan, result, timing, reason)
+
+
+@_arecorded
+async def ascore_explanation(
+    client,
+    prompt: str,
+    explanation: str,
+    topic: str,
+    audience: str,
+    timer_duration: int,
+    time_used: int,
+    use_cache: bool = True,
+    concept: str = "",
+    raters: list[consensus.Rater] | None = None,
+    user: str = "",
+) -> tuple[dict, dict]:
+    """Async, non-streaming variant for ``anthropic.AsyncAnthropic``. Returns (result, timing)."""
+    plan, done = _plan(prompt, explanation, topic, audience, timer_duration, time_used, use_cache, concept,
+                       raters, user)
+    if done is not None:
+        return done
+
+    reason = None
+    if plan.route == "consensus":
+        result, timing = await _aconsensus(
+            client, plan.raters, plan.scoring_prompt, plan.timer_duration, plan.reference)
+    else:
+        text, timing = await _acall(client, plan.route, plan.request)
+        if plan.route == "large":
+            result, timing = await _acomplete(client, plan.request, text, timing, plan.reference)
+        else:
+            result, reason = _small_verdict(text, plan.reference)
+        if plan.route == "small" and (reason is not None or should_shadow()):
+            large_request = plan.large_request()
+            large_text, large_timing = await _acall(client, "large", large_request)
+            large, large_timing = await _acomplete(client, large_request, large_text, large_timing, plan.reference)
+            result, timing = _escalate(result, reason, timing, large, large_timing)
+    return _finish(client, plan, result, timing, reason)
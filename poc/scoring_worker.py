@@ -0,0 +1,115 @@
+"""Scoring worker service: N processes draining the SQLite job queue.
+
+    ANTHROPIC_API_KEY=... python scoring_worker.py --workers 4
+
+Start the app with ``SCORING_MODE=worker`` and the same ``JOB_QUEUE_DB`` to
+send scoring here instead of running it in the Streamlit process. Workers are
+stateless; set ``SCORE_CACHE=sqlite`` to share the score cache between them.
+A worker that exits is restarted by the supervisor.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from job_queue import JOB_QUEUE_DB, JobQueue
+
+POLL_INTERVAL = float(os.environ.get("WORKER_POLL_S", "0.2"))
+
+
+@contextmanager
+def heartbeat(queue: JobQueue, job_id: str, worker: str):
+    """Renew ``worker``'s lease on a job every third of the lease while the block runs."""
+    done = threading.Event()
+
+    def renew():
+        while not done.wait(queue.lease_s / 3) and queue.renew(job_id, worker):
+            pass
+
+    thread = threading.Thread(target=renew, name=f"lease-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+def run_worker(name: str, queue_path: str, api_key: str, poll_interval: float = POLL_INTERVAL):
+    """Claim and score jobs until terminated."""
+    # Imported in the child so the supervisor stays light
+    import metrics
+    import scoring
+    from batch_score import is_retryable
+    from client_pool import get_client
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # Use METRICS_FILE with {pid} here; only one worker could bind METRICS_PORT
+    metrics.start_exporters(port=0)
+    queue = JobQueue(queue_path)
+    client = get_client(api_key)
+    while True:
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            with heartbeat(queue, job["id"], name):
+                result, timing = scoring.score_explanation(client, **job["payload"]["attempt"])
+        except Exception as e:
+            queue.fail(job["id"], name, f"{type(e).__name__}: {e}", retry=is_retryable(e))
+            continue
+        # False if the lease was lost and another worker has the job now; its result is the one kept
+        queue.complete(job["id"], name, {"result": result, "timing": timing})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scoring worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    parser.add_argument("--queue", default=JOB_QUEUE_DB, help="Job queue SQLite file")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="Idle poll interval in seconds")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY") or ("fake-key" if os.environ.get("ANTHROPIC_BASE_URL") else "")
+    if not api_key:
+        parser.error("Set ANTHROPIC_API_KEY (or ANTHROPIC_BASE_URL for a fake server)")
+    JobQueue(args.queue)  # create the schema before the workers race for it
+
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    procs: dict[str, multiprocessing.Process] = {}
+
+    def start(name: str):
+        proc = multiprocessing.Process(target=run_worker, args=(name, args.queue, api_key, args.poll), daemon=True)
+        proc.start()
+        procs[name] = proc
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for i in range(args.workers):
+        start(f"{prefix}-{i}")
+    print(f"{args.workers} scoring workers on {args.queue}", file=sys.stderr)
+    while not stopping:
+        time.sleep(1)
+        for name, proc in list(procs.items()):
+            if not proc.is_alive() and not stopping:
+                print(f"worker {name} exited ({proc.exitcode}); restarting", file=sys.stderr)
+                start(name)
+    for proc in procs.values():
+        proc.terminate()
+    for proc in procs.values():
+        proc.join(5)
+
+
+if __name__ == "__main__":
+    main()
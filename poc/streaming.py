@@ -0,0 +1,158 @@
+"""Streaming scoring: incremental JSON parsing of the scorer's response.
+
+The scorer returns one JSON object whose top-level keys are the score
+dimensions, ``overall`` and ``model_explanation``. ``ScoreStreamParser`` is fed
+text deltas as they arrive and reports each dimension as soon as its object
+closes, and the ``model_explanation`` string as it grows.
+"""
+import json
+import time
+
+DIMENSIONS = ["clarity", "accuracy", "structure", "completeness", "conciseness"]
+
+
+class ScoreStreamParser:
+    """Single-pass scanner over a streamed JSON object.
+
+    ``feed`` returns a list of events:
+      ("field", key, value)   a top-level value finished parsing
+      ("text", key, delta)    more of a top-level string value arrived
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key = None           # current top-level key
+        self.expect_key = False   # next depth-1 string is a key
+        self.key_start = None
+        self.value_start = None   # buffer offset where the current top-level value starts
+        self.string_value = False
+        self.emitted_text = 0
+        self.fields: dict = {}
+
+    def feed(self, chunk: str) -> list:
+        self.buf += chunk
+        events = []
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            c = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key_start is not None:
+                        self.key = json.loads(buf[self.key_start:i + 1])
+                        self.key_start = None
+                    elif self.depth == 1 and self.string_value:
+                        self._finish(buf[self.value_start:i + 1], events)
+            elif c == '"':
+                self.in_string = True
+                if self.depth == 1 and self.expect_key:
+                    self.key_start = i
+                    self.expect_key = False
+                elif self.depth == 1 and self.value_start is None and self.key is not None:
+                    self.value_start = i
+                    self.string_value = True
+                    self.emitted_text = 0
+            elif c == "{" or c == "[":
+                if self.depth == 0:
+                    self.expect_key = True
+                elif self.depth == 1 and self.value_start is None:
+                    self.value_start = i
+                self.depth += 1
+            elif c == "}" or c == "]":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start is not None:
+                    self._finish(buf[self.value_start:i + 1], events)
+                elif self.depth == 0:
+                    self._finish_scalar(buf[:i], events)
+            elif c == "," and self.depth == 1:
+                self._finish_scalar(buf[:i], events)
+                self.expect_key = True
+            elif self.depth == 1 and self.value_start is None and self.key is not None and c not in " \t\r\n:":
+                self.value_start = i
+            i += 1
+        self.pos = i
+        if self.in_string and self.string_value and self.depth == 1:
+            delta = self._partial_text(buf[self.value_start + 1:])
+            if delta:
+                events.append(("text", self.key, delta))
+        return events
+
+    def _finish(self, raw: str, events: list):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = None
+        if value is not None:
+            if self.string_value:
+                delta = value[self.emitted_text:]
+                if delta:
+                    events.append(("text", self.key, delta))
+            self.fields[self.key] = value
+            events.append(("field", self.key, value))
+        self.key = None
+        self.value_start = None
+        self.string_value = False
+
+    def _finish_scalar(self, buf: str, events: list):
+        """Close a bare number/bool/null value at depth 1."""
+        if self.value_start is not None and self.key is not None:
+            self._finish(buf[self.value_start:].strip(), events)
+
+    def _partial_text(self, raw: str) -> str:
+        """Decode the complete prefix of an unterminated JSON string; return the new part."""
+        # Drop a trailing partial escape sequence so json.loads sees a valid string.
+        cut = raw.rfind("\\")
+        if cut != -1 and len(raw) - cut < 6:
+            raw = raw[:cut]
+        try:
+            text = json.loads('"' + raw + '"')
+        except ValueError:
+            return ""
+        delta = text[self.emitted_text:]
+        self.emitted_text = len(text)
+        return delta
+
+
+def usage_dict(usage) -> dict:
+    """Token counts from a response ``usage`` object, including prompt-cache reads and writes."""
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+    }
+
+
+def stream_score(client, on_event=None, **create_kwargs) -> tuple[str, dict]:
+    """Stream a scoring request. Returns (full_text, timing).
+
+    ``on_event`` is called with each parser event as it arrives. ``timing`` has
+    ``first_score_s`` (time until the first dimension completed), ``total_s``
+    and the response ``usage`` token counts.
+    """
+    parser = ScoreStreamParser()
+    started = time.perf_counter()
+    first_score = None
+    parts = []
+    with client.messages.stream(**create_kwargs) as stream:
+        for delta in stream.text_stream:
+            parts.append(delta)
+            for event in parser.feed(delta):
+                if first_score is None and event[0] == "field" and (event[1] in DIMENSIONS or event[1] == "overall"):
+                    first_score = time.perf_counter() - started
+                if on_event:
+                    on_event(event)
+        usage = stream.get_final_message().usage
+    total = time.perf_counter() - started
+    return "".join(parts), {"first_score_s": first_score, "total_s": total, "usage": usage_dict(usage)}
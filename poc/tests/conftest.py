@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Keep every store out of the working directory; set before the modules read their config
+_stores = tempfile.TemporaryDirectory(prefix="thinkfast-tests-")
+for name in ("HISTORY_DB", "REVIEW_DB", "JOB_QUEUE_DB", "REFERENCE_DB", "SCORE_CACHE_PATH"):
+    os.environ.setdefault(name, os.path.join(_stores.name, f"{name.lower()}.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+import asyncio
+import io
+import json
+
+import anthropic
+
+import batch_score
+from fake_anthropic import FakeConfig, serve_in_thread
+
+EXPLANATION = ("A hash table stores values in an array of buckets and uses a hash of the key to pick the "
+               "bucket, so a lookup only looks at one bucket instead of scanning every entry.")
+
+
+def test_anonymous_near_duplicates_are_each_scored_by_the_model():
+    config = FakeConfig(seed=0)
+    server, url = serve_in_thread(config)
+    records = [
+        {"prompt": "Hash tables", "explanation": EXPLANATION, "topic": "Data structures", "timer": 60},
+        {"prompt": "Hash tables", "explanation": EXPLANATION.replace("every entry", "every entry."),
+         "topic": "Data structures", "timer": 60},
+    ]
+
+    async def run():
+        client = anthropic.AsyncAnthropic(api_key="fake", base_url=url, max_retries=0)
+        try:
+            return await batch_score.run_batch(records, out, client, concurrency=1)
+        finally:
+            await client.close()
+
+    out = io.StringIO()
+    try:
+        stats = asyncio.run(run())
+    finally:
+        server.shutdown()
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert stats["ok"] == 2
+    assert config.requests == 2
+    for row in rows:
+        assert row["usage"]
+        assert "reused" not in row["result"].get("dedup", {})
@@ -0,0 +1,26 @@
+from prescore import prescore
+
+
+def reason(explanation: str, concept: str = "TCP", prompt: str = "Explain TCP") -> str | None:
+    result = prescore(explanation, concept, prompt)
+    return result["prescore"]["reason"] if result is not None else None
+
+
+def test_terse_valid_answer_goes_to_the_model():
+    assert reason("Reliable, ordered byte stream.") is None
+    assert reason("Keys hash to buckets", "Hash tables", "Explain hash tables") is None
+
+
+def test_empty_or_single_word_answer_fails_locally():
+    assert reason("") == "too_short"
+    assert reason("   ") == "too_short"
+    assert reason("TCP") == "too_short"
+
+
+def test_keyboard_mash_fails_locally():
+    assert reason("sdfghjkl qwrtpsdf xcvbnmlk zxcvbnmq wrtplkjh") == "gibberish"
+
+
+def test_non_latin_and_acronym_answers_go_to_the_model():
+    assert reason("TCP是一种面向连接的、可靠的传输层协议") is None
+    assert reason("TCP over IPv4 uses SYN, SYN-ACK, ACK") is None
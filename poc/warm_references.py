@@ -0,0 +1,125 @@
+"""Pre-generate model explanations into the reference cache.
+
+Walks every concept of the concept bank × every default audience × every
+timer band and generates the missing references with a short plain-text
+request, a few at a time. Already cached triples are skipped, so the job can
+be stopped and rerun freely.
+
+    ANTHROPIC_API_KEY=... python warm_references.py --concurrency 4
+    python warm_references.py --topics Python "Machine Learning" --limit 200
+
+The app runs the same job in a background thread when ``REFERENCE_WARM=1``.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from client_pool import get_client
+from prompts import AUDIENCE_LABELS, default_presets
+from reference_cache import ReferenceCache, get_reference_cache, stores_from
+from scoring import MODEL, TIME_BANDS
+
+REFERENCE_MAX_TOKENS = 700
+REFERENCE_SYSTEM = (
+    "You are an expert communication coach writing model answers for a timed explanation exercise. "
+    "Reply with the explanation text only: no title, preamble or closing remarks."
+)
+
+
+def build_reference_request(concept: str, topic: str, audience: str, band: str, model: str = MODEL) -> dict:
+    """Keyword arguments for ``client.messages.create`` that generate one reference explanation."""
+    return {
+        "model": model,
+        "max_tokens": REFERENCE_MAX_TOKENS,
+        "system": [{"type": "text", "text": REFERENCE_SYSTEM}],
+        "messages": [{"role": "user", "content": (
+            f"Explain {concept} ({topic}) to {audience}.\n"
+            f"Time budget: {TIME_BANDS[band][0]}.\n"
+            "Write a concise, well-structured explanation that could realistically be typed within the time "
+            "budget, demonstrating ideal clarity, accuracy and structure for this audience."
+        )}],
+    }
+
+
+def warm_jobs(bank=None, topics: list[str] | None = None, audiences=AUDIENCE_LABELS,
+              bands=tuple(TIME_BANDS)) -> list[tuple[str, str, str, str]]:
+    """Every (concept, audience, band, topic) to generate, in bank order."""
+    bank = bank or default_presets()
+    return [
+        (concept, audience, band, topic)
+        for topic in (topics or bank.topics)
+        for concept in bank.get(topic)
+        for audience in audiences
+        for band in bands
+    ]
+
+
+def warm(client, jobs: list[tuple[str, str, str, str]], cache: ReferenceCache, concurrency: int = 4,
+         limit: int | None = None, stop: threading.Event | None = None) -> dict:
+    """Generate and store the references of ``jobs`` that are not cached yet. Returns counts."""
+    missing = set(cache.missing([job[:3] for job in jobs]))
+    todo = [job for job in jobs if job[:3] in missing]
+    counts = {"cached": len(jobs) - len(todo), "generated": 0, "failed": 0}
+    todo = todo[:limit]
+    lock = threading.Lock()
+
+    def generate(job):
+        if stop is not None and stop.is_set():
+            return
+        concept, audience, band, topic = job
+        try:
+            message = client.messages.create(**build_reference_request(concept, topic, audience, band))
+            text = message.content[0].text.strip()
+            if not text:
+                raise ValueError("empty reference")
+        except Exception:
+            with lock:
+                counts["failed"] += 1
+            return
+        cache.set(concept, audience, band, text)
+        with lock:
+            counts["generated"] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="warm-ref") as ex:
+        list(ex.map(generate, todo))
+    return counts
+
+
+def start_background_warm(client, limit: int | None = None, concurrency: int = 2) -> threading.Thread | None:
+    """Run ``warm`` over the default bank in a daemon thread (None if the reference cache is off,
+    or ``client`` isn't a ``REFERENCE_HOSTS`` API)."""
+    cache = get_reference_cache()
+    if cache is None or not stores_from(client):
+        return None
+    thread = threading.Thread(
+        target=warm, args=(client, warm_jobs(), cache, concurrency, limit), daemon=True, name="warm-references",
+    )
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate model explanations into the reference cache")
+    parser.add_argument("--topics", nargs="*", help="Only these topics (default: every topic in the bank)")
+    parser.add_argument("--limit", type=int, help="Generate at most this many references")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY") or ("fake-key" if os.environ.get("ANTHROPIC_BASE_URL") else "")
+    if not api_key:
+        parser.error("Set ANTHROPIC_API_KEY (or ANTHROPIC_BASE_URL for a fake server)")
+    cache = get_reference_cache()
+    if cache is None:
+        parser.error("REFERENCE_CACHE is off")
+    client = get_client(api_key)
+    if not stores_from(client):
+        parser.error(f"{client.base_url.host} is not in REFERENCE_HOSTS; its references wouldn't be stored")
+    counts = warm(client, warm_jobs(topics=args.topics), cache, args.concurrency, args.limit)
+    print(json.dumps({**counts, "size": len(cache)}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()